@@ -1,14 +1,36 @@
 from __future__ import annotations
 
-import json
+import threading
+import time
+from contextlib import closing
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 import numpy as np
 
 from runtime import register_map as rm
-from runtime.np_kernels import KVCache, attention_decode_step, gemm_int8w_int16a_acc32, requantize_int16
+from runtime.kv_paging import PagedBatchView, PagedKVCache, PagedSeqView
+from runtime.kv_swap import SWAP_TIERS, KvSwapSpace, SwapEntry
+from runtime.model import PackedModel, load_pack
+from runtime.plan import DecodePlan, StackPlan, compile_plan
+from runtime.prefix_cache import PrefixCache
+from runtime.np_kernels import (
+    SOFTMAX_MODES,
+    BatchedKVCache,
+    BatchedKVSlot,
+    KVCache,
+    attention_decode_batch,
+    gemm_int16a_packed_acc32,
+    requantize_fixed_int16,
+    kv_width,
+    sample_tokens,
+    split_qkv,
+    validate_sampling,
+)
 from runtime.rtl_backend import RtlBackend
+from runtime.stream import TokenEvent
+from runtime.tensor_parallel import TensorParallelGroup
 
 
 @dataclass
@@ -21,6 +43,37 @@ class RuntimeConfig:
     token_overhead_cycles: int = 12
     cycle_calib_scale: float = 1.0
     cycle_calib_bias: float = 0.0
+    gemm_kernel: str = "auto"
+    prefill_chunk: int = 256
+    kv_layout: str = "contiguous"
+    kv_block_size: int = 16
+    kv_num_blocks: int = 0
+    kv_dtype: str = "float32"
+    kv_window: int = 0
+    kv_sink: int = 0
+    prefix_cache_bytes: int = 0
+    prefix_block_tokens: int = 16
+    attention_kernel: str = "full"
+    attention_tile: int = 0
+    softmax_mode: str = "exact"
+    num_heads: int = 1
+    # 0 -> same as num_heads (plain multi-head); fewer KV heads -> grouped-query attention.
+    num_kv_heads: int = 0
+    attn_head_lanes: int = 0
+    vec_lanes: int = 16
+    rsqrt_latency: int = 6
+    # Token sampling for packs with a vocabulary; temperature 0 is greedy.
+    temperature: float = 0.0
+    top_k: int = 0
+    top_p: float = 1.0
+    seed: int = 0
+    lm_head_chunk: int = 4096
+    # Spill tier for preempted step-API sequences: "" (off), "host" or "mmap"; 0 blocks -> one per pool block.
+    kv_swap: str = ""
+    kv_swap_blocks: int = 0
+    kv_swap_path: str = ""
+    # Run the stacked GEMMs on the shard processes laid out in the pack's meta["tensor_parallel"].
+    tensor_parallel: bool = False
 
 
 class BoardlessNpuRuntime:
@@ -29,6 +82,9 @@ class BoardlessNpuRuntime:
     - init()
     - load(pack_dir)
     - run(prompt_tokens, gen_len)
+    - run_stream(prompt_tokens, gen_len)
+    - submit(prompt_tokens, gen_len) / wait(); mmio_write(REG_CONTROL, CTRL_RESET) cancels
+    - run_batch(prompts, gen_len)
     - poll()
     """
 
@@ -36,9 +92,30 @@ class BoardlessNpuRuntime:
         self.config = config or RuntimeConfig()
         self.regs: dict[int, int] = {}
         self.weights: dict[str, np.ndarray] = {}
-        self.cache = KVCache(max_seq=self.config.max_seq, dim=self.config.dim)
+        self.kv_dim = kv_width(self.config.dim, self.config.num_heads, self._num_kv_heads())
+        self.cache = self._new_kv_cache()
+        self.batch_cache: BatchedKVCache | PagedBatchView | None = None
+        self.kv_pool: PagedKVCache | None = None
+        self.kv_swap: KvSwapSpace | None = None
+        self.tp: TensorParallelGroup | None = None
+        self.prefix_cache: PrefixCache | None = None
+        self.plan: DecodePlan | StackPlan | None = None
+        self.model: PackedModel | None = None
+        # One KV cache per decoder layer; caches[0] is self.cache.
+        self.caches: list[KVCache] = [self.cache]
+        self.requant: tuple[int, int, str] = (1, 1, "half_up")
+        if self.config.prefix_cache_bytes > 0:
+            self.prefix_cache = PrefixCache(self.config.prefix_block_tokens, self.config.prefix_cache_bytes)
+        self.rng = np.random.default_rng(self.config.seed)
         self.generated: list[np.ndarray] = []
+        self.seq_done_tokens: list[int] = []
+        self.token_attn_tiles: list[int] = []
         self.last_error = ""
+        # Background job started by submit(); at most one at a time.
+        self._job: threading.Thread | None = None
+        self._job_cancel = threading.Event()
+        self._job_output: np.ndarray | None = None
+        self._job_error: Exception | None = None
         self._rtl_backend: RtlBackend | None = None
         if self.config.backend == "rtl":
             self._rtl_backend = RtlBackend(
@@ -49,16 +126,54 @@ class BoardlessNpuRuntime:
                 token_overhead_cycles=self.config.token_overhead_cycles,
                 cycle_calib_scale=self.config.cycle_calib_scale,
                 cycle_calib_bias=self.config.cycle_calib_bias,
+                gemm_kernel=self.config.gemm_kernel,
+                prefill_chunk=self.config.prefill_chunk,
+                kv_dtype=self.config.kv_dtype,
+                kv_window=self.config.kv_window,
+                kv_sink=self.config.kv_sink,
+                attention_kernel=self.config.attention_kernel,
+                attention_tile=self.config.attention_tile,
+                softmax_mode=self.config.softmax_mode,
+                num_heads=self.config.num_heads,
+                num_kv_heads=self._num_kv_heads(),
+                attn_head_lanes=self.config.attn_head_lanes,
+                vec_lanes=self.config.vec_lanes,
+                rsqrt_latency=self.config.rsqrt_latency,
+                temperature=self.config.temperature,
+                top_k=self.config.top_k,
+                top_p=self.config.top_p,
+                seed=self.config.seed,
+                lm_head_chunk=self.config.lm_head_chunk,
             )
         elif self.config.backend != "numpy":
             raise ValueError(f"unsupported backend: {self.config.backend}")
+        if self.config.attention_kernel not in ("full", "tiled"):
+            raise ValueError(f"unsupported attention_kernel: {self.config.attention_kernel}")
+        if self.config.attention_kernel == "tiled" and self.config.num_heads != 1:
+            raise ValueError("tiled attention_kernel supports num_heads == 1 only")
+        validate_sampling(self.config.temperature, self.config.top_k, self.config.top_p)
+        if self.config.softmax_mode not in SOFTMAX_MODES:
+            raise ValueError(f"unsupported softmax_mode: {self.config.softmax_mode}")
+        if self.config.kv_layout not in ("contiguous", "paged"):
+            raise ValueError(f"unsupported kv_layout: {self.config.kv_layout}")
+        if self.config.kv_layout == "paged" and self._rtl_backend is not None:
+            raise ValueError("paged kv_layout requires the numpy backend")
+        if self.prefix_cache is not None and (self._rtl_backend is not None or self.config.kv_window):
+            raise ValueError("prefix cache requires the numpy backend and a full-length kv cache")
+        if self.config.tensor_parallel and self._rtl_backend is not None:
+            raise ValueError("tensor_parallel requires the numpy backend")
+        if self.config.kv_swap and (self.config.kv_swap not in SWAP_TIERS or self.config.kv_layout != "paged"):
+            raise ValueError(f"kv_swap must be one of {SWAP_TIERS} with kv_layout='paged'")
+        if self.config.kv_layout == "paged" and (self.config.kv_dtype != "float32" or self.config.kv_window):
+            raise ValueError("paged kv_layout supports float32 full-length sequences only")
 
     def init(self) -> None:
+        self._require_idle()
         if self._rtl_backend is not None:
             self._rtl_backend.init()
             self.regs = self._rtl_backend.regs
             self.generated = []
-            self.cache = KVCache(max_seq=self.config.max_seq, dim=self.config.dim)
+            self.cache = self._new_kv_cache()
             self.last_error = ""
             return
 
@@ -74,26 +189,82 @@ class BoardlessNpuRuntime:
             rm.REG_PERF_STALL_IN: 0,
             rm.REG_PERF_STALL_OUT: 0,
             rm.REG_CFG_K_TILE: 16,
+            rm.REG_PERF_PREFILL_CYCLES: 0,
+            rm.REG_PERF_ATTN_TILES: 0,
+            rm.REG_BATCH_SIZE: 0,
         }
         self.generated = []
-        self.cache = KVCache(max_seq=self.config.max_seq, dim=self.config.dim)
+        self.seq_done_tokens = []
+        self.token_attn_tiles = []
+        self.batch_cache = None
+        self.rng = np.random.default_rng(self.config.seed)
+        self.cache = self._new_kv_cache()
+        self.caches = [self.cache] + [self._new_kv_cache() for _ in self.caches[1:]]
+        if self.config.kv_layout == "paged":
+            num_blocks, block_size = self._paged_geometry()
+            self.kv_pool = PagedKVCache(num_blocks=num_blocks, block_size=block_size, dim=self.kv_dim)
+            if self.config.kv_swap:
+                self.kv_swap = KvSwapSpace(
+                    self.kv_pool,
+                    self.config.kv_swap_blocks or num_blocks,
+                    self.config.kv_swap,
+                    self.config.kv_swap_path or None,
+                )
         self.last_error = ""
 
     def load(self, pack_dir: Path | str) -> None:
+        self._require_idle()
         if self._rtl_backend is not None:
             self._rtl_backend.load(pack_dir)
             return
 
-        p = Path(pack_dir)
-        meta = json.loads((p / "meta.json").read_text(encoding="utf-8"))
-        if int(meta["dim"]) != self.config.dim:
-            raise ValueError("pack dim mismatch")
-        self.weights["w_q"] = np.load(p / "w_q_int8.npy")
-        self.weights["w_k"] = np.load(p / "w_k_int8.npy")
-        self.weights["w_v"] = np.load(p / "w_v_int8.npy")
-        self.weights["dequant_scale"] = np.array([meta["dequant_scale"]], dtype=np.float32)
+        self.load_model(
+            load_pack(
+                pack_dir, self.config.dim, self.kv_dim, self.config.gemm_kernel, lm_head_chunk=self.config.lm_head_chunk
+            )
+        )
+
+    def load_model(self, model: PackedModel) -> None:
+        # An already packed model, e.g. read-only views attached from a worker pool's shared memory.
+        self._require_idle()
+        if self._rtl_backend is not None:
+            raise ValueError("load_model requires the numpy backend")
+        if model.stacked and (self.kv_pool is not None or self.prefix_cache is not None):
+            raise ValueError("stacked packs support the contiguous kv layout without prefix cache")
+        self.model = model
+        self.weights = model.weights
+        self.requant = model.layers[0].attn_requant
+        self.caches = [self.cache] + [self._new_kv_cache() for _ in range(model.num_layers - 1)]
+        self.plan = compile_plan(
+            model,
+            self.config.dim,
+            self._kv_capacity(),
+            kv_quantized=self.config.kv_dtype != "float32",
+            attention_kernel=self.config.attention_kernel,
+            attention_tile=self.config.attention_tile or self.config.cfg_k_tile,
+            softmax_lut=self.config.softmax_mode == "lut",
+            prefill_chunk=self.config.prefill_chunk,
+            num_heads=self.config.num_heads,
+            num_kv_heads=self._num_kv_heads(),
+        )
+        if isinstance(self.plan, StackPlan):
+            self.plan.sampler = self._sample
+        if self.tp is not None:
+            self.tp.close()
+            self.tp = None
+        if self.config.tensor_parallel:
+            if not isinstance(self.plan, StackPlan):
+                raise ValueError("tensor_parallel needs a stacked pack")
+            # Stacks prefill one prefill_chunk of rows at a time (a windowed prompt may exceed max_seq)
+            # and decode one row, so no GEMM sends the shards more rows than that.
+            self.tp = TensorParallelGroup(model, self.kv_dim, self.plan.prefill_chunk)
+            self.plan.shard(self.tp)
+        if self.prefix_cache is not None:
+            # Cached K/V belong to the previous weights.
+            self.prefix_cache.clear()
 
     def run(self, prompt_tokens: np.ndarray, gen_len: int) -> np.ndarray:
+        self._require_idle()
         if self._rtl_backend is not None:
             out = self._rtl_backend.run(prompt_tokens=prompt_tokens, gen_len=gen_len)
             self.regs = self._rtl_backend.regs
@@ -101,54 +272,377 @@ class BoardlessNpuRuntime:
             return out
 
         try:
-            self.regs[rm.REG_CONTROL] = rm.CTRL_START
-            self.regs[rm.REG_STATUS] = rm.STATUS_BUSY
-            self.regs[rm.REG_PROMPT_LEN] = int(prompt_tokens.shape[0])
-            self.regs[rm.REG_GEN_LEN] = int(gen_len)
-            self.regs[rm.REG_DONE_TOKENS] = 0
-            self.regs[rm.REG_PERF_CYCLES] = 0
-            self.regs[rm.REG_PERF_TOKENS] = 0
-            self.regs[rm.REG_PERF_STALL_IN] = 0
-            self.regs[rm.REG_PERF_STALL_OUT] = 0
-            self.regs[rm.REG_LAST_ERROR] = 0
-
-            if prompt_tokens.ndim != 2 or prompt_tokens.shape[1] != self.config.dim:
-                raise ValueError("prompt shape must be [T, D]")
-
-            x_t = prompt_tokens[-1].astype(np.int16)
-            scale = float(self.weights["dequant_scale"][0])
-
-            outputs = []
-            for _ in range(gen_len):
-                q = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_q"]).reshape(-1).astype(np.float32)
-                k = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_k"]).reshape(-1).astype(np.float32)
-                v = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_v"]).reshape(-1).astype(np.float32)
-
-                self.cache.append(k, v)
-                k_all, v_all = self.cache.get()
-                y = attention_decode_step(q, k_all, v_all)
-
-                y_int16 = requantize_int16(np.round(y).astype(np.int32), scale=scale)
-                outputs.append(y_int16.copy())
-                x_t = y_int16
-                self.regs[rm.REG_DONE_TOKENS] += 1
-                self.regs[rm.REG_PERF_TOKENS] += 1
-                # Numpy backend keeps perf counters minimal and deterministic.
-                self.regs[rm.REG_PERF_CYCLES] += int(max(1, self.config.dim // 2))
-
-            out = np.stack(outputs, axis=0)
-            self.generated = [o for o in outputs]
+            self._start_run(int(prompt_tokens.shape[0]), gen_len, 1)
+            self.token_attn_tiles = []
+
+            prompt_rows = self.model.prompt_rows(prompt_tokens, self.config.dim)
+            if gen_len <= 0:
+                raise ValueError("gen_len must be > 0")
+
+            token_cycles = int(max(1, self.config.dim // 2))
+
+            # Each run is a fresh sequence: the prompt is the whole context.
+            cache = self._open_seq_cache()
+            y, rows = self._prefill_seq(prompt_rows, cache)
+            out = self.plan.execute(cache, y, gen_len)
+
+            # Counters are folded in once per run rather than per token.
+            # The last prompt row is charged to the first generated token.
+            self.regs[rm.REG_PERF_PREFILL_CYCLES] = token_cycles * (rows - 1)
+            self.regs[rm.REG_DONE_TOKENS] = gen_len
+            self.regs[rm.REG_PERF_TOKENS] = gen_len
+            # Numpy backend keeps perf counters minimal and deterministic.
+            self.regs[rm.REG_PERF_CYCLES] = token_cycles * gen_len
+            self.regs[rm.REG_PERF_ATTN_TILES] = int(self.plan.tiles.sum())
+            self.seq_done_tokens = [gen_len]
+            # Token 0 comes out of prefill and uses no decode attention tiles.
+            self.token_attn_tiles = self.plan.tiles.tolist()
+            self.generated = list(out)
+            self.regs[rm.REG_STATUS] = rm.STATUS_DONE
+            return out
+        except Exception as exc:  # noqa: BLE001
+            self.last_error = str(exc)
+            self.regs[rm.REG_STATUS] = rm.STATUS_ERROR
+            raise
+        finally:
+            self._release_paged()
+
+    def run_stream(self, prompt_tokens: np.ndarray, gen_len: int) -> Iterator[TokenEvent]:
+        """
+        run() as a generator: each token is yielded as soon as it exists, with
+        a perf_counter timestamp and a poll() snapshot. REG_DONE_TOKENS and the
+        perf registers advance per token instead of once at the end.
+        """
+        self._require_idle()
+        if self._rtl_backend is not None:
+            self.generated = []
+            for event in self._rtl_backend.run_stream(prompt_tokens, gen_len):
+                self.regs = self._rtl_backend.regs
+                self.generated.append(event.token)
+                yield event
+            return
+
+        try:
+            self._start_run(int(prompt_tokens.shape[0]), gen_len, 1)
+            self.token_attn_tiles = []
+            self.generated = []
+            prompt_rows = self.model.prompt_rows(prompt_tokens, self.config.dim)
+            if gen_len <= 0:
+                raise ValueError("gen_len must be > 0")
+
+            token_cycles = int(max(1, self.config.dim // 2))
+            cache = self._open_seq_cache()
+            y, rows = self._prefill_seq(prompt_rows, cache)
+            self.regs[rm.REG_PERF_PREFILL_CYCLES] = token_cycles * (rows - 1)
+            for i in self.plan.stream(cache, y, gen_len):
+                tiles = int(self.plan.tiles[i])
+                self.regs[rm.REG_DONE_TOKENS] = i + 1
+                self.regs[rm.REG_PERF_TOKENS] = i + 1
+                self.regs[rm.REG_PERF_CYCLES] += token_cycles
+                self.regs[rm.REG_PERF_ATTN_TILES] += tiles
+                self.seq_done_tokens = [i + 1]
+                self.token_attn_tiles.append(tiles)
+                token = self.plan.tokens[i]
+                self.generated.append(token)
+                yield TokenEvent(i, token, time.perf_counter(), self.poll())
+            self.regs[rm.REG_STATUS] = rm.STATUS_DONE
+        except Exception as exc:  # noqa: BLE001
+            self.last_error = str(exc)
+            self.regs[rm.REG_STATUS] = rm.STATUS_ERROR
+            raise
+        finally:
+            self._release_paged()
+
+    def submit(self, prompt_tokens: np.ndarray, gen_len: int) -> None:
+        """
+        Start run_stream() on a background thread and return immediately.
+        poll() shows STATUS_BUSY and a rising done_tokens while it runs;
+        wait() joins it and returns the output.
+        """
+        self._require_idle()
+        self._job_cancel.clear()
+        self._job_output = None
+        self._job_error = None
+        self._job = threading.Thread(target=self._run_job, args=(prompt_tokens, gen_len), daemon=True)
+        self._job.start()
+
+    def wait(self, timeout: float | None = None) -> np.ndarray | None:
+        # None while the job is still running after `timeout` seconds, or after a cancel.
+        if self._job is not None:
+            self._job.join(timeout)
+            if self._job.is_alive():
+                return None
+            self._job = None
+        if self._job_error is not None:
+            raise self._job_error
+        return self._job_output
+
+    def _run_job(self, prompt_tokens: np.ndarray, gen_len: int) -> None:
+        try:
+            # Cancellation is checked between tokens; closing the stream releases its KV blocks.
+            with closing(self.run_stream(prompt_tokens, gen_len)) as stream:
+                for _ in stream:
+                    if self._job_cancel.is_set():
+                        return
+            self._job_output = np.asarray(self.generated)
+        except Exception as exc:  # noqa: BLE001
+            self._job_error = exc
+
+    def _require_idle(self) -> None:
+        if self._job is not None and self._job.is_alive() and threading.current_thread() is not self._job:
+            raise ValueError("a submitted job is still running")
+
+    def mmio_write(self, addr: int, value: int) -> None:
+        if addr == rm.REG_CONTROL and value & rm.CTRL_RESET:
+            # Reset cancels a submitted job within one token, then clears device state.
+            self._job_cancel.set()
+            if self._job is not None:
+                self._job.join()
+                self._job = None
+            self._job_output = None
+            self._job_error = None
+            self.init()
+            return
+        if self._rtl_backend is not None:
+            self._rtl_backend.mmio_write(addr, value)
+        elif addr in self.regs:
+            self.regs[addr] = int(value) & 0xFFFFFFFF
+
+    def mmio_read(self, addr: int) -> int:
+        return int(self.regs.get(addr, 0))
+
+    def run_batch(self, prompts: list[np.ndarray], gen_len: int) -> np.ndarray:
+        """
+        Decode B sequences in lock-step; returns [B, gen_len, D].
+        Each prompt is prefilled into its row of a [B, max_seq, D] cache, then
+        every step projects all sequences with one [B, D] x [D, D + 2*Dkv] GEMM.
+        """
+        self._require_idle()
+        if self._rtl_backend is not None:
+            raise ValueError("run_batch requires the numpy backend")
+        if self.config.kv_dtype != "float32" or self.config.kv_window:
+            raise ValueError("run_batch supports float32 full-length kv only")
+        if self.config.attention_kernel != "full":
+            raise ValueError("run_batch uses the full attention kernel")
+        if isinstance(self.plan, StackPlan):
+            raise ValueError("run_batch supports single-layer attention packs only")
+
+        try:
+            batch = len(prompts)
+            self._start_run(int(sum(int(p.shape[0]) for p in prompts)), gen_len, batch)
+
+            if batch == 0:
+                raise ValueError("run_batch needs at least one prompt")
+            for p in prompts:
+                if p.ndim != 2 or p.shape[1] != self.config.dim or p.shape[0] == 0:
+                    raise ValueError("prompt shape must be [T, D]")
+            if gen_len <= 0:
+                raise ValueError("gen_len must be > 0")
+
+            dim = self.config.dim
+            token_cycles = int(max(1, dim // 2))
+
+            if self.kv_pool is not None:
+                self.batch_cache = PagedBatchView(self.kv_pool, [self.kv_pool.add_seq() for _ in range(batch)])
+            else:
+                self.batch_cache = BatchedKVCache(batch=batch, max_seq=self.config.max_seq, dim=self.kv_dim)
+            y = np.empty((batch, dim), dtype=np.float32)
+            for b, p in enumerate(prompts):
+                y[b], rows = self._prefill_seq(p.astype(np.int16), self.batch_cache.seq(b))
+                self.regs[rm.REG_PERF_PREFILL_CYCLES] += token_cycles * (rows - 1)
+
+            out = np.empty((batch, gen_len, dim), dtype=np.int16)
+            for i in range(gen_len):
+                if i > 0:
+                    y = self._decode_step(self.batch_cache, x_b)
+
+                x_b = requantize_fixed_int16(np.rint(y), *self.requant)
+                out[:, i] = x_b
+                self.regs[rm.REG_DONE_TOKENS] += batch
+                self.regs[rm.REG_PERF_TOKENS] += batch
+                self.seq_done_tokens = [n + 1 for n in self.seq_done_tokens]
+                # One batched pass per step regardless of B.
+                self.regs[rm.REG_PERF_CYCLES] += token_cycles
+
+            self.generated = [o for o in out]
             self.regs[rm.REG_STATUS] = rm.STATUS_DONE
             return out
         except Exception as exc:  # noqa: BLE001
             self.last_error = str(exc)
             self.regs[rm.REG_STATUS] = rm.STATUS_ERROR
             raise
+        finally:
+            self._release_paged()
+
+    def _decode_step(self, batch_cache: BatchedKVCache | PagedBatchView, x_b: np.ndarray) -> np.ndarray:
+        # One [B, D] x [D, D + 2*Dkv] GEMM, KV append and batched attention; returns float y [B, D].
+        qkv = gemm_int16a_packed_acc32(x_b, self.weights["w_qkv"]).astype(np.float32)
+        q, k, v = split_qkv(qkv, self.config.dim, self.kv_dim)
+        batch_cache.append(k, v)
+        k_all, v_all, lengths = batch_cache.get()
+        return attention_decode_batch(
+            q,
+            k_all,
+            v_all,
+            lengths,
+            self.config.softmax_mode == "lut",
+            self.config.num_heads,
+            self._num_kv_heads(),
+        )
+
+    # Step API for schedulers: sequences come and go between decode iterations.
+    # open_seq() allocates a paged sequence, prefill_seq() feeds it prompt rows,
+    # decode_batch() advances any set of open sequences by one token with one GEMM,
+    # and close_seq() hands its KV blocks back. Registers accumulate across calls.
+
+    def open_seq(self) -> int:
+        self._require_idle()
+        if self._rtl_backend is not None or self.kv_pool is None:
+            raise ValueError("the step API needs the numpy backend with kv_layout='paged'")
+        if self.config.attention_kernel != "full":
+            raise ValueError("the step API uses the full attention kernel")
+        if not isinstance(self.plan, DecodePlan):
+            raise ValueError("the step API supports loaded single-layer attention packs only")
+        self.regs[rm.REG_STATUS] = rm.STATUS_BUSY
+        return self.kv_pool.add_seq()
+
+    def prefill_seq(self, seq_id: int, rows: np.ndarray, last: bool = True) -> np.ndarray | None:
+        # Appends prompt rows [T, D] to the sequence; the last piece returns token 0 (int16 [D]).
+        if rows.ndim != 2 or rows.shape[1] != self.config.dim:
+            raise ValueError("prompt shape must be [T, D]")
+        y = self.plan.prefill(rows.astype(np.int16), self.kv_pool.seq(seq_id))
+        token_cycles = int(max(1, self.config.dim // 2))
+        self.regs[rm.REG_PROMPT_LEN] += int(rows.shape[0])
+        # As in run(), the last prompt row is charged to the first generated token.
+        self.regs[rm.REG_PERF_PREFILL_CYCLES] += token_cycles * (int(rows.shape[0]) - int(last))
+        if not last:
+            return None
+        self.regs[rm.REG_PERF_CYCLES] += token_cycles
+        self.regs[rm.REG_DONE_TOKENS] += 1
+        self.regs[rm.REG_PERF_TOKENS] += 1
+        return requantize_fixed_int16(np.rint(y), *self.requant)
+
+    def decode_batch(self, seq_ids: list[int], x_b: np.ndarray) -> np.ndarray:
+        # x_b: each sequence's previous token [B, D] -> next tokens [B, D].
+        y = self._decode_step(PagedBatchView(self.kv_pool, seq_ids), x_b.astype(np.int16))
+        batch = len(seq_ids)
+        self.regs[rm.REG_BATCH_SIZE] = batch
+        self.regs[rm.REG_DONE_TOKENS] += batch
+        self.regs[rm.REG_PERF_TOKENS] += batch
+        self.regs[rm.REG_PERF_CYCLES] += int(max(1, self.config.dim // 2))
+        return requantize_fixed_int16(np.rint(y), *self.requant)
+
+    def swap_out_seq(self, seq_id: int, state: dict | None = None) -> int:
+        # Preempts an open sequence: its KV blocks and caller state go to the spill tier. The done/perf registers
+        # are device-wide totals over all sequences, so they keep counting and are not snapshotted.
+        if self.kv_swap is None:
+            raise ValueError("kv swap is disabled (RuntimeConfig.kv_swap)")
+        return self.kv_swap.swap_out(seq_id, state or {})
+
+    def swap_in_seq(self, handle: int) -> tuple[int, SwapEntry]:
+        # Reopens a swapped-out sequence under a new seq id with its KV rows restored bit for bit.
+        if self.kv_swap is None:
+            raise ValueError("kv swap is disabled (RuntimeConfig.kv_swap)")
+        seq_id, entry = self.kv_swap.swap_in(handle)
+        self.regs[rm.REG_STATUS] = rm.STATUS_BUSY
+        return seq_id, entry
+
+    def close_seq(self, seq_id: int) -> None:
+        self.kv_pool.free_seq(seq_id)
+        if not self.kv_pool.block_tables:
+            self.regs[rm.REG_STATUS] = rm.STATUS_DONE
+
+    def _start_run(self, prompt_len: int, gen_len: int, batch: int) -> None:
+        self.regs[rm.REG_CONTROL] = rm.CTRL_START
+        self.regs[rm.REG_STATUS] = rm.STATUS_BUSY
+        self.regs[rm.REG_PROMPT_LEN] = prompt_len
+        self.regs[rm.REG_GEN_LEN] = int(gen_len)
+        self.regs[rm.REG_DONE_TOKENS] = 0
+        self.regs[rm.REG_PERF_CYCLES] = 0
+        self.regs[rm.REG_PERF_TOKENS] = 0
+        self.regs[rm.REG_PERF_STALL_IN] = 0
+        self.regs[rm.REG_PERF_STALL_OUT] = 0
+        self.regs[rm.REG_PERF_PREFILL_CYCLES] = 0
+        self.regs[rm.REG_PERF_ATTN_TILES] = 0
+        self.regs[rm.REG_BATCH_SIZE] = batch
+        self.regs[rm.REG_LAST_ERROR] = 0
+        self.seq_done_tokens = [0] * batch
+
+    def _sample(self, logits: np.ndarray) -> np.ndarray:
+        return sample_tokens(logits, self.rng, self.config.temperature, self.config.top_k, self.config.top_p)
+
+    def _prefill_seq(
+        self, prompt_int16: np.ndarray, cache: KVCache | BatchedKVSlot | PagedSeqView
+    ) -> tuple[np.ndarray, int]:
+        # Returns (last-position attention output, prompt rows actually computed).
+        if self.prefix_cache is None:
+            y = self.plan.prefill(prompt_int16, cache)
+            return y, int(prompt_int16.shape[0])
+
+        # Keep at least one suffix row: its attention output seeds decode.
+        n, k_pre, v_pre = self.prefix_cache.lookup(prompt_int16[:-1])
+        if n:
+            cache.extend(k_pre, v_pre)
+        y = self.plan.prefill(prompt_int16[n:], cache)
+        k_all, v_all = cache.get_dequant() if isinstance(cache, KVCache) else cache.get()
+        self.prefix_cache.insert(prompt_int16, k_all, v_all)
+        return y, int(prompt_int16.shape[0]) - n
+
+    def _paged_geometry(self) -> tuple[int, int]:
+        block_size = max(1, int(self.config.kv_block_size))
+        num_blocks = int(self.config.kv_num_blocks) or -(-self.config.max_seq // block_size)
+        return num_blocks, block_size
+
+    def _kv_capacity(self) -> int:
+        # Longest prefix one sequence can attend over; sizes the score scratch.
+        if self.config.kv_layout == "paged":
+            num_blocks, block_size = self._paged_geometry()
+            return num_blocks * block_size
+        return self.cache.max_seq
+
+    def _num_kv_heads(self) -> int:
+        return self.config.num_kv_heads or self.config.num_heads
+
+    def _new_kv_cache(self) -> KVCache:
+        return KVCache(
+            max_seq=self.config.max_seq,
+            dim=self.kv_dim,
+            kv_dtype=self.config.kv_dtype,
+            window=self.config.kv_window,
+            sink=self.config.kv_sink,
+        )
+
+    def _open_seq_cache(self) -> KVCache | PagedSeqView | list[KVCache]:
+        if isinstance(self.plan, StackPlan):
+            for cache in self.caches:
+                cache.reset()
+            return self.caches
+        if self.kv_pool is None:
+            self.cache.reset()
+            return self.cache
+        return self.kv_pool.seq(self.kv_pool.add_seq())
+
+    def _release_paged(self) -> None:
+        # Paged sequences hand their blocks back to the pool as soon as they finish.
+        if self.kv_pool is None:
+            return
+        for seq_id in list(self.kv_pool.block_tables):
+            self.kv_pool.free_seq(seq_id)
+
+    def _kv_bytes_reserved(self) -> int:
+        if self.kv_pool is not None:
+            return self.kv_pool.peak_blocks_used * self.kv_pool.bytes_per_block
+        total = sum(cache.nbytes for cache in self.caches)
+        if isinstance(self.batch_cache, BatchedKVCache):
+            total += self.batch_cache.k.nbytes + self.batch_cache.v.nbytes
+        return int(total)
 
-    def poll(self) -> dict[str, int | str]:
+    def poll(self) -> dict[str, int | str | list[int]]:
         if self._rtl_backend is not None:
             return self._rtl_backend.poll()
 
+        head = self.model.embedding if self.model is not None else None
+        swap = self.kv_swap
         return {
             "status": self.regs.get(rm.REG_STATUS, 0),
             "done_tokens": self.regs.get(rm.REG_DONE_TOKENS, 0),
@@ -158,5 +652,25 @@ class BoardlessNpuRuntime:
             "perf_tokens": self.regs.get(rm.REG_PERF_TOKENS, 0),
             "perf_stall_in": self.regs.get(rm.REG_PERF_STALL_IN, 0),
             "perf_stall_out": self.regs.get(rm.REG_PERF_STALL_OUT, 0),
+            "prefill_cycles": self.regs.get(rm.REG_PERF_PREFILL_CYCLES, 0),
+            "batch_size": self.regs.get(rm.REG_BATCH_SIZE, 0),
+            "seq_done_tokens": list(self.seq_done_tokens),
+            "kv_bytes_reserved": self._kv_bytes_reserved(),
+            "prefix_hits": self.prefix_cache.hits if self.prefix_cache is not None else 0,
+            "prefix_misses": self.prefix_cache.misses if self.prefix_cache is not None else 0,
+            "prefix_evictions": self.prefix_cache.evictions if self.prefix_cache is not None else 0,
+            "prefix_bytes": self.prefix_cache.bytes_used if self.prefix_cache is not None else 0,
+            "attn_tiles": self.regs.get(rm.REG_PERF_ATTN_TILES, 0),
+            "attn_tiles_per_token": list(self.token_attn_tiles),
+            "swap_outs": swap.swap_outs if swap is not None else 0,
+            "swap_ins": swap.swap_ins if swap is not None else 0,
+            "swap_out_bytes": swap.out_bytes if swap is not None else 0,
+            "swap_in_bytes": swap.in_bytes if swap is not None else 0,
+            "swap_out_ms": swap.out_sec * 1e3 if swap is not None else 0.0,
+            "swap_in_ms": swap.in_sec * 1e3 if swap is not None else 0.0,
+            "swap_peak_bytes": swap.peak_bytes if swap is not None else 0,
+            "vocab_size": head.vocab_size if head is not None else 0,
+            "tp_shards": self.tp.shards if self.tp is not None else 0,
+            "lm_head_bytes_reserved": head.nbytes if head is not None else 0,
             "backend": "numpy",
         }
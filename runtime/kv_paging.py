@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+class BlockAllocator:
+    def __init__(self, num_blocks: int) -> None:
+        if num_blocks <= 0:
+            raise ValueError("num_blocks must be > 0")
+        self.num_blocks = num_blocks
+        # Pop from the end so low block ids are handed out first.
+        self._free = list(range(num_blocks - 1, -1, -1))
+
+    @property
+    def num_free(self) -> int:
+        return len(self._free)
+
+    def alloc(self) -> int:
+        if not self._free:
+            raise ValueError("kv overflow: block pool exhausted")
+        return self._free.pop()
+
+    def free(self, blocks: list[int]) -> None:
+        self._free.extend(reversed(blocks))
+
+
+def gather_blocks(pool: np.ndarray, block_table: np.ndarray, length: int) -> np.ndarray:
+    # pool: [num_blocks, block_size, D] -> contiguous [length, D] for one sequence.
+    block_size = pool.shape[1]
+    n_blocks = -(-length // block_size)
+    return pool[block_table[:n_blocks]].reshape(-1, pool.shape[2])[:length]
+
+
+class PagedKVCache:
+    """
+    Shared pool of fixed-size KV blocks.
+    Layout: pool [num_blocks, block_size, dim], one block table per sequence.
+    """
+
+    def __init__(self, num_blocks: int, block_size: int, dim: int) -> None:
+        if block_size <= 0:
+            raise ValueError("block_size must be > 0")
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        self.dim = dim
+        self.k_pool = np.zeros((num_blocks, block_size, dim), dtype=np.float32)
+        self.v_pool = np.zeros((num_blocks, block_size, dim), dtype=np.float32)
+        self.allocator = BlockAllocator(num_blocks)
+        self.block_tables: dict[int, list[int]] = {}
+        self.lengths: dict[int, int] = {}
+        self.peak_blocks_used = 0
+        self._next_seq_id = 0
+
+    @property
+    def blocks_used(self) -> int:
+        return self.num_blocks - self.allocator.num_free
+
+    @property
+    def bytes_per_block(self) -> int:
+        return 2 * self.block_size * self.dim * self.k_pool.itemsize
+
+    def add_seq(self) -> int:
+        seq_id = self._next_seq_id
+        self._next_seq_id += 1
+        self.block_tables[seq_id] = []
+        self.lengths[seq_id] = 0
+        return seq_id
+
+    def free_seq(self, seq_id: int) -> None:
+        self.allocator.free(self.block_tables.pop(seq_id))
+        del self.lengths[seq_id]
+
+    def _reserve(self, seq_id: int, new_length: int) -> None:
+        table = self.block_tables[seq_id]
+        need = -(-new_length // self.block_size)
+        while len(table) < need:
+            table.append(self.allocator.alloc())
+        self.peak_blocks_used = max(self.peak_blocks_used, self.blocks_used)
+
+    def extend(self, seq_id: int, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        n = int(k_rows.shape[0])
+        if k_rows.shape != (n, self.dim) or v_rows.shape != (n, self.dim):
+            raise ValueError("kv shape mismatch")
+        start = self.lengths[seq_id]
+        self._reserve(seq_id, start + n)
+        table = self.block_tables[seq_id]
+        pos = start
+        while pos < start + n:
+            blk, off = divmod(pos, self.block_size)
+            take = min(self.block_size - off, start + n - pos)
+            src = slice(pos - start, pos - start + take)
+            self.k_pool[table[blk], off : off + take] = k_rows[src]
+            self.v_pool[table[blk], off : off + take] = v_rows[src]
+            pos += take
+        self.lengths[seq_id] = start + n
+
+    def append(self, seq_id: int, k_t: np.ndarray, v_t: np.ndarray) -> None:
+        self.extend(seq_id, k_t.reshape(1, -1), v_t.reshape(1, -1))
+
+    def append_batch(self, seq_ids: list[int], k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        # One new row per sequence, scattered into each sequence's tail block.
+        for seq_id in seq_ids:
+            self._reserve(seq_id, self.lengths[seq_id] + 1)
+        pos = np.array([self.lengths[s] for s in seq_ids], dtype=np.int64)
+        blocks = np.array([self.block_tables[s][p // self.block_size] for s, p in zip(seq_ids, pos)], dtype=np.int64)
+        self.k_pool[blocks, pos % self.block_size] = k_rows
+        self.v_pool[blocks, pos % self.block_size] = v_rows
+        for seq_id in seq_ids:
+            self.lengths[seq_id] += 1
+
+    def load_blocks(self, seq_id: int, k_blocks: np.ndarray, v_blocks: np.ndarray, length: int) -> None:
+        # Whole-block restore of an empty sequence (swap-in): [n_blocks, block_size, dim] each.
+        if self.lengths[seq_id]:
+            raise ValueError("load_blocks needs an empty sequence")
+        self._reserve(seq_id, length)
+        table = self.block_tables[seq_id]
+        self.k_pool[table] = k_blocks
+        self.v_pool[table] = v_blocks
+        self.lengths[seq_id] = length
+
+    def get(self, seq_id: int) -> tuple[np.ndarray, np.ndarray]:
+        table = np.asarray(self.block_tables[seq_id], dtype=np.int64)
+        length = self.lengths[seq_id]
+        return gather_blocks(self.k_pool, table, length), gather_blocks(self.v_pool, table, length)
+
+    def get_batch(self, seq_ids: list[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Padded block tables -> [B, T, D] gathered prefix plus per-sequence lengths.
+        lengths = np.array([self.lengths[s] for s in seq_ids], dtype=np.int64)
+        n_blocks = -(-int(lengths.max(initial=0)) // self.block_size)
+        tables = np.zeros((len(seq_ids), n_blocks), dtype=np.int64)
+        for i, s in enumerate(seq_ids):
+            t = self.block_tables[s][:n_blocks]
+            tables[i, : len(t)] = t
+        t_max = n_blocks * self.block_size
+        k_all = self.k_pool[tables].reshape(len(seq_ids), t_max, self.dim)
+        v_all = self.v_pool[tables].reshape(len(seq_ids), t_max, self.dim)
+        return k_all, v_all, lengths
+
+    def seq(self, seq_id: int) -> PagedSeqView:
+        return PagedSeqView(self, seq_id)
+
+
+class PagedSeqView:
+    # KVCache-compatible handle on one sequence of a PagedKVCache.
+    def __init__(self, owner: PagedKVCache, seq_id: int) -> None:
+        self.owner = owner
+        self.seq_id = seq_id
+        self.dim = owner.dim
+
+    @property
+    def length(self) -> int:
+        return self.owner.lengths[self.seq_id]
+
+    def append(self, k_t: np.ndarray, v_t: np.ndarray) -> None:
+        self.owner.append(self.seq_id, k_t, v_t)
+
+    def extend(self, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        self.owner.extend(self.seq_id, k_rows, v_rows)
+
+    def get(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.owner.get(self.seq_id)
+
+    def get_scales(self) -> tuple[None, None]:
+        return None, None
+
+
+class PagedBatchView:
+    # BatchedKVCache-compatible handle on a set of sequences of a PagedKVCache.
+    def __init__(self, owner: PagedKVCache, seq_ids: list[int]) -> None:
+        self.owner = owner
+        self.seq_ids = list(seq_ids)
+        self.batch = len(seq_ids)
+        self.dim = owner.dim
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.array([self.owner.lengths[s] for s in self.seq_ids], dtype=np.int64)
+
+    def append(self, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        if k_rows.shape != (self.batch, self.dim) or v_rows.shape != (self.batch, self.dim):
+            raise ValueError("kv shape mismatch")
+        self.owner.append_batch(self.seq_ids, k_rows, v_rows)
+
+    def get(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.owner.get_batch(self.seq_ids)
+
+    def seq(self, b: int) -> PagedSeqView:
+        return self.owner.seq(self.seq_ids[b])
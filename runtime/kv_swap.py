@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from runtime.kv_paging import BlockAllocator, PagedKVCache
+
+SWAP_TIERS = ("host", "mmap")
+
+
+@dataclass
+class SwapEntry:
+    slots: list[int]
+    length: int
+    # Caller-owned decode state (e.g. prompt progress, last token). Registers are not part of it: the step API's
+    # counters accumulate over every open sequence, so restoring a snapshot would roll back the others' progress.
+    state: dict
+
+
+class KvSwapSpace:
+    """
+    Spill tier for preempted sequences of a PagedKVCache.
+    - "host": a numpy array in RAM; "mmap": a np.memmap'd spill file.
+    - Slots mirror the pool's block geometry [slots, 2 (k/v), block_size, dim]
+      and come from their own BlockAllocator, so swapping is a block gather
+      or scatter rather than a per-row copy.
+    - Counters cover bytes and seconds in each direction plus resident and
+      peak bytes, for sizing the spill tier.
+    """
+
+    def __init__(self, pool: PagedKVCache, num_slots: int, tier: str = "host", path: Path | str | None = None) -> None:
+        if tier not in SWAP_TIERS:
+            raise ValueError(f"unsupported kv swap tier: {tier}")
+        self.pool = pool
+        self.tier = tier
+        shape = (num_slots, 2, pool.block_size, pool.dim)
+        if tier == "host":
+            self.store = np.zeros(shape, dtype=np.float32)
+        else:
+            if not path:
+                self._tmp = tempfile.NamedTemporaryFile(prefix="kv_swap_", suffix=".bin")
+                path = self._tmp.name
+            self.path = Path(path)
+            self.store = np.memmap(self.path, dtype=np.float32, mode="w+", shape=shape)
+        self.allocator = BlockAllocator(num_slots)
+        self.entries: dict[int, SwapEntry] = {}
+        self._next_handle = 0
+        self.swap_outs = 0
+        self.swap_ins = 0
+        self.out_bytes = 0
+        self.in_bytes = 0
+        self.out_sec = 0.0
+        self.in_sec = 0.0
+        self.peak_bytes = 0
+
+    @property
+    def bytes_per_slot(self) -> int:
+        return self.pool.bytes_per_block
+
+    @property
+    def resident_bytes(self) -> int:
+        return (self.allocator.num_blocks - self.allocator.num_free) * self.bytes_per_slot
+
+    def can_hold(self, seq_id: int) -> bool:
+        return len(self.pool.block_tables[seq_id]) <= self.allocator.num_free
+
+    def swap_out(self, seq_id: int, state: dict) -> int:
+        # Moves the sequence's blocks out of the pool and frees them there; returns a handle for swap_in().
+        t0 = time.perf_counter()
+        table = self.pool.block_tables[seq_id]
+        if len(table) > self.allocator.num_free:
+            raise ValueError("kv swap space exhausted")
+        slots = [self.allocator.alloc() for _ in table]
+        self.store[slots, 0] = self.pool.k_pool[table]
+        self.store[slots, 1] = self.pool.v_pool[table]
+        handle = self._next_handle
+        self._next_handle += 1
+        self.entries[handle] = SwapEntry(slots, self.pool.lengths[seq_id], dict(state))
+        self.pool.free_seq(seq_id)
+        self.swap_outs += 1
+        self.out_bytes += len(slots) * self.bytes_per_slot
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        self.out_sec += time.perf_counter() - t0
+        return handle
+
+    def swap_in(self, handle: int) -> tuple[int, SwapEntry]:
+        # Restores into a fresh pool sequence; raises (leaving the entry in place) if the pool is short of blocks.
+        t0 = time.perf_counter()
+        entry = self.entries[handle]
+        if len(entry.slots) > self.pool.allocator.num_free:
+            raise ValueError("kv overflow: block pool exhausted")
+        seq_id = self.pool.add_seq()
+        self.pool.load_blocks(seq_id, self.store[entry.slots, 0], self.store[entry.slots, 1], entry.length)
+        del self.entries[handle]
+        self.allocator.free(entry.slots)
+        self.swap_ins += 1
+        self.in_bytes += len(entry.slots) * self.bytes_per_slot
+        self.in_sec += time.perf_counter() - t0
+        return seq_id, entry
+
+    def discard(self, handle: int) -> None:
+        # Drops a swapped-out sequence that will never resume.
+        self.allocator.free(self.entries.pop(handle).slots)
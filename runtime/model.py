@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from runtime.np_kernels import (
+    fuse_qkv_weights,
+    lm_head_logits,
+    pack_gemm_weight,
+    requant_params_from_meta,
+    requantize_fixed_int16,
+)
+
+# Per-layer int8 weights; stacked packs store them as layer{i}_{name}_int8.npy.
+LAYER_WEIGHTS = ("w_q", "w_k", "w_v", "w_o", "w_up", "w_down")
+
+
+@dataclass
+class DecoderLayer:
+    """
+    One decoder layer on the int8-weight GEMM path.
+    Legacy packs hold a single attention-only layer: out-projection and FFN
+    fields stay None and the attention output is the layer output.
+    """
+
+    w_qkv: np.ndarray
+    attn_requant: tuple[int, int, str]
+    w_o: np.ndarray | None = None
+    out_requant: tuple[int, int, str] | None = None
+    w_up: np.ndarray | None = None
+    up_requant: tuple[int, int, str] | None = None
+    w_down: np.ndarray | None = None
+    down_requant: tuple[int, int, str] | None = None
+
+    @property
+    def has_mlp(self) -> bool:
+        return self.w_o is not None
+
+
+class TokenEmbedding:
+    """
+    Tied int8 token table [V, D] used at both ends of a stacked model.
+    - embed(): rows requantized into the Q(act_frac_bits) activation format.
+    - logits(): LM head over the same table, widened `chunk` vocab rows at a
+      time into a scratch buffer allocated once here.
+    """
+
+    def __init__(self, table: np.ndarray, embed_requant: tuple[int, int, str], logit_scale: float, chunk: int) -> None:
+        self.table = table
+        self.embed_requant = embed_requant
+        # Real-valued logit per unit of the exact int dot product.
+        self.logit_scale = logit_scale
+        self.chunk = max(1, min(int(chunk), table.shape[0]))
+        self.scratch = np.empty((self.chunk, table.shape[1]), dtype=np.float64)
+
+    @property
+    def vocab_size(self) -> int:
+        return int(self.table.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        # Working memory beyond the int8 table itself.
+        return int(self.scratch.nbytes)
+
+    def embed(self, ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size and (ids.min() < 0 or ids.max() >= self.vocab_size):
+            raise ValueError("token id out of vocabulary range")
+        return requantize_fixed_int16(self.table[ids].astype(np.int64), *self.embed_requant)
+
+    def logits(self, h_int16: np.ndarray) -> np.ndarray:
+        out = lm_head_logits(h_int16, self.table, self.chunk, self.scratch)
+        out *= self.logit_scale
+        return out
+
+
+@dataclass
+class PackedModel:
+    meta: dict
+    weights: dict[str, np.ndarray]
+    layers: list[DecoderLayer]
+    # Q-format of int16 activations between layers (LayerNorm/GELU outputs).
+    act_frac_bits: int = 0
+    ffn_dim: int = 0
+    embedding: TokenEmbedding | None = None
+
+    @property
+    def num_layers(self) -> int:
+        return len(self.layers)
+
+    @property
+    def stacked(self) -> bool:
+        return self.layers[0].has_mlp
+
+    def prompt_rows(self, prompt: np.ndarray, dim: int) -> np.ndarray:
+        # Token-id prompts [T] are embedded when the pack has a vocabulary; otherwise rows are [T, D].
+        if self.embedding is not None and prompt.ndim == 1:
+            return self.embedding.embed(prompt)
+        if prompt.ndim != 2 or prompt.shape[1] != dim:
+            raise ValueError("prompt shape must be [T, D]")
+        return prompt.astype(np.int16)
+
+
+def load_pack(
+    pack_dir: Path | str, dim: int, kv_dim: int, gemm_kernel: str = "auto", lm_head_chunk: int = 4096
+) -> PackedModel:
+    """
+    Read a pack written by sw/pack_weights.py.
+    - Legacy layout: w_{q,k,v}_int8.npy + one requant in meta.
+    - Stacked layout (meta num_layers): layer{i}_w_{q,k,v,o,up,down}_int8.npy
+      with per-stage requant entries under meta["layers"][i], plus an
+      optional tied embedding_int8.npy [V, D] when meta has vocab_size.
+    """
+    p = Path(pack_dir)
+    meta = json.loads((p / "meta.json").read_text(encoding="utf-8"))
+    if int(meta["dim"]) != dim:
+        raise ValueError("pack dim mismatch")
+    weights: dict[str, np.ndarray] = {}
+    if "num_layers" not in meta:
+        for name in LAYER_WEIGHTS[:3]:
+            weights[name] = np.load(p / f"{name}_int8.npy")
+        _check_qkv(weights, dim, kv_dim)
+        weights["w_qkv"] = pack_gemm_weight(
+            fuse_qkv_weights(weights["w_q"], weights["w_k"], weights["w_v"]), kernel=gemm_kernel
+        )
+        weights["dequant_scale"] = np.array([meta["dequant_scale"]], dtype=np.float32)
+        return PackedModel(meta, weights, [DecoderLayer(weights["w_qkv"], requant_params_from_meta(meta))])
+
+    ffn_dim = int(meta["ffn_dim"])
+    layers: list[DecoderLayer] = []
+    for i, stages in enumerate(meta["layers"]):
+        w = {name: np.load(p / f"layer{i}_{name}_int8.npy") for name in LAYER_WEIGHTS}
+        _check_qkv(w, dim, kv_dim)
+        if w["w_o"].shape != (dim, dim) or w["w_up"].shape != (dim, ffn_dim) or w["w_down"].shape != (ffn_dim, dim):
+            raise ValueError(f"layer {i} projection/ffn shape mismatch")
+        weights.update({f"layer{i}_{name}": arr for name, arr in w.items()})
+        layers.append(
+            DecoderLayer(
+                w_qkv=pack_gemm_weight(fuse_qkv_weights(w["w_q"], w["w_k"], w["w_v"]), kernel=gemm_kernel),
+                attn_requant=requant_params_from_meta(stages["attn"]),
+                w_o=pack_gemm_weight(w["w_o"], kernel=gemm_kernel),
+                out_requant=requant_params_from_meta(stages["out"]),
+                w_up=pack_gemm_weight(w["w_up"], kernel=gemm_kernel),
+                up_requant=requant_params_from_meta(stages["up"]),
+                w_down=pack_gemm_weight(w["w_down"], kernel=gemm_kernel),
+                down_requant=requant_params_from_meta(stages["down"]),
+            )
+        )
+    if not layers or len(layers) != int(meta["num_layers"]):
+        raise ValueError("pack num_layers does not match its layer entries")
+    embedding = None
+    if "vocab_size" in meta:
+        table = np.load(p / "embedding_int8.npy")
+        if table.shape != (int(meta["vocab_size"]), dim):
+            raise ValueError("embedding shape mismatch")
+        weights["embedding"] = table
+        embedding = TokenEmbedding(
+            table, requant_params_from_meta(meta["embed"]), float(meta["logit_scale"]), lm_head_chunk
+        )
+    return PackedModel(
+        meta, weights, layers, act_frac_bits=int(meta["act_frac_bits"]), ffn_dim=ffn_dim, embedding=embedding
+    )
+
+
+def _check_qkv(w: dict[str, np.ndarray], dim: int, kv_dim: int) -> None:
+    if w["w_k"].shape != (dim, kv_dim):
+        raise ValueError("pack kv width does not match num_heads/num_kv_heads")
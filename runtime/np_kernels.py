@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import functools
+import math
+from typing import Callable
+
 import numpy as np
 
 
@@ -11,43 +15,861 @@ def gemm_int8w_int16a_acc32(a_int16: np.ndarray, b_int8: np.ndarray) -> np.ndarr
     return (a_int16.astype(np.int32) @ b_int8.astype(np.int32)).astype(np.int32)
 
 
+def fuse_qkv_weights(w_q: np.ndarray, w_k: np.ndarray, w_v: np.ndarray) -> np.ndarray:
+    # [D, D] + [D, Dkv] x2 -> [D, D + 2 Dkv] so one projection produces q|k|v per token.
+    # Dkv < D when fewer KV heads than query heads (GQA/MQA).
+    if w_q.ndim != 2 or w_k.shape != w_v.shape or w_k.ndim != 2 or w_q.shape[0] != w_k.shape[0]:
+        raise ValueError("qkv weight shape mismatch")
+    return np.concatenate([w_q, w_k, w_v], axis=1)
+
+
+# float64 holds every integer below 2**53 exactly, so BLAS accumulation of
+# int16 x int8 products is bit-exact while K * max|a| * max|b| stays under it.
+F64_EXACT_LIMIT = 2**53
+GEMM_KERNELS = ("auto", "int32", "f64")
+
+
+def blas_gemm_is_exact(k: int, a_abs_max: int, b_abs_max: int) -> bool:
+    return int(k) * int(a_abs_max) * int(b_abs_max) < F64_EXACT_LIMIT
+
+
+def _int_abs_max(x: np.ndarray) -> int:
+    if x.size == 0:
+        return 0
+    return int(np.max(np.abs(x.astype(np.int64))))
+
+
+def gemm_int8w_int16a_acc32_f64(a_int16: np.ndarray, b_f64: np.ndarray) -> np.ndarray:
+    # Exact sums from BLAS, then the same two's-complement wrap as int32 accumulation.
+    if a_int16.ndim != 2 or b_f64.ndim != 2:
+        raise ValueError("a_int16 and b_f64 must be 2D")
+    if a_int16.shape[1] != b_f64.shape[0]:
+        raise ValueError("gemm shape mismatch")
+    return (a_int16.astype(np.float64) @ b_f64).astype(np.int64).astype(np.int32)
+
+
+def pack_gemm_weight(b_int8: np.ndarray, kernel: str = "auto") -> np.ndarray:
+    """
+    Load-time operand conversion so the decode loop never re-casts weights.
+    - "f64": float64 operand for the BLAS path
+    - "int32": int32 operand for the integer matmul loop
+    - "auto": f64 when exact for any int16 activation, else int32
+    """
+    if b_int8.ndim != 2:
+        raise ValueError("b_int8 must be 2D")
+    if kernel not in GEMM_KERNELS:
+        raise ValueError(f"unsupported gemm kernel: {kernel}")
+    if kernel == "auto":
+        exact = blas_gemm_is_exact(b_int8.shape[0], 2**15, _int_abs_max(b_int8))
+        kernel = "f64" if exact else "int32"
+    dtype = np.float64 if kernel == "f64" else np.int32
+    return np.ascontiguousarray(b_int8, dtype=dtype)
+
+
+def gemm_int16a_packed_acc32(a_int16: np.ndarray, b_packed: np.ndarray) -> np.ndarray:
+    if a_int16.ndim != 2 or b_packed.ndim != 2:
+        raise ValueError("a_int16 and b_packed must be 2D")
+    if a_int16.shape[1] != b_packed.shape[0]:
+        raise ValueError("gemm shape mismatch")
+    if b_packed.dtype != np.float64:
+        return a_int16.astype(np.int32) @ b_packed
+    if a_int16.dtype.itemsize > 2:
+        # Wider activations than the packing assumed: re-check the bound on data.
+        k = a_int16.shape[1]
+        if not blas_gemm_is_exact(k, _int_abs_max(a_int16), _int_abs_max(b_packed)):
+            return a_int16.astype(np.int32) @ b_packed.astype(np.int32)
+    return gemm_int8w_int16a_acc32_f64(a_int16, b_packed)
+
+
+def gemm_packed_acc32_into(a: np.ndarray, b_packed: np.ndarray, out: np.ndarray, tmp: np.ndarray) -> np.ndarray:
+    """
+    Allocation-free gemm_int16a_packed_acc32 for the decode workspace.
+    a, out and tmp are preallocated in b_packed's dtype; out receives the
+    int32-wrapped sums (as exact floats on the f64 path).
+    """
+    np.matmul(a, b_packed, out=out)
+    if b_packed.dtype == np.float64:
+        # s - 2**32 * floor((s + 2**31) / 2**32) is exact for |s| < 2**53.
+        np.add(out, 2.0**31, out=tmp)
+        np.floor_divide(tmp, 2.0**32, out=tmp)
+        tmp *= 2.0**32
+        out -= tmp
+    return out
+
+
+def split_qkv(qkv: np.ndarray, dim: int, kv_dim: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Views into the fused projection output; no copies.
+    kv_dim = dim if kv_dim is None else kv_dim
+    if qkv.shape[-1] != dim + 2 * kv_dim:
+        raise ValueError("qkv width mismatch")
+    return qkv[..., :dim], qkv[..., dim : dim + kv_dim], qkv[..., dim + kv_dim :]
+
+
+def kv_width(dim: int, num_heads: int, num_kv_heads: int) -> int:
+    # Width of one K or V row: num_kv_heads heads of dim // num_heads.
+    if num_heads <= 0 or num_kv_heads <= 0 or dim % num_heads or num_heads % num_kv_heads:
+        raise ValueError("dim must split into num_heads, and num_heads into num_kv_heads groups")
+    return dim // num_heads * num_kv_heads
+
+
 def requantize_int16(x_int32: np.ndarray, scale: float) -> np.ndarray:
     out = np.round(x_int32.astype(np.float64) * scale)
     out = np.clip(out, -32768, 32767)
     return out.astype(np.int16)
 
 
+REQUANT_ROUNDING = ("half_up", "half_even", "floor")
+
+
+def quantize_multiplier(scale: float, bits: int = 31) -> tuple[int, int]:
+    # scale ~= multiplier * 2**-shift with multiplier in [2**(bits-1), 2**bits).
+    if not scale > 0.0:
+        raise ValueError("requant scale must be positive")
+    mant, exp = math.frexp(scale)
+    multiplier = int(round(mant * (1 << bits)))
+    shift = bits - exp
+    if multiplier == 1 << bits:
+        multiplier >>= 1
+        shift -= 1
+    if not 1 <= shift <= 62:
+        raise ValueError(f"requant scale out of range: {scale}")
+    return multiplier, shift
+
+
+def requant_meta(scale: float) -> dict[str, int | str]:
+    # The pack meta fields for a dequant scale; requant_params_from_meta() reads them back.
+    multiplier, shift = quantize_multiplier(scale)
+    return {"requant_multiplier": multiplier, "requant_shift": shift, "requant_rounding": "half_up"}
+
+
+def requant_params_from_meta(meta: dict) -> tuple[int, int, str]:
+    # Packs predating fixed-point requant only carry the float dequant_scale.
+    if "requant_multiplier" not in meta:
+        return (*quantize_multiplier(float(meta["dequant_scale"])), "half_up")
+    rounding = str(meta.get("requant_rounding", "half_up"))
+    if rounding not in REQUANT_ROUNDING:
+        raise ValueError(f"unsupported requant rounding: {rounding}")
+    return int(meta["requant_multiplier"]), int(meta["requant_shift"]), rounding
+
+
+def requantize_fixed_int16(
+    x: np.ndarray,
+    multiplier: int,
+    shift: int,
+    rounding: str = "half_up",
+    out: np.ndarray | None = None,
+    tmp: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    RTL requant: sat16(round((x * multiplier) >> shift)) in int64, no float
+    temporaries. x holds int32-range integers (float inputs must already be
+    rounded); tmp is an optional int64 scratch shaped like x.
+    """
+    if tmp is None:
+        tmp = x.astype(np.int64)
+    else:
+        np.copyto(tmp, x, casting="unsafe")
+    if out is None:
+        out = np.empty(x.shape, dtype=np.int16)
+    tmp *= multiplier
+    if rounding == "half_up":
+        tmp += 1 << (shift - 1)
+        tmp >>= shift
+    elif rounding == "floor":
+        tmp >>= shift
+    elif rounding == "half_even":
+        rem = tmp & ((1 << shift) - 1)
+        tmp >>= shift
+        half = 1 << (shift - 1)
+        tmp += (rem > half) | ((rem == half) & (tmp & 1).astype(bool))
+    else:
+        raise ValueError(f"unsupported requant rounding: {rounding}")
+    np.minimum(tmp, 32767, out=tmp)
+    np.maximum(tmp, -32768, out=tmp)
+    np.copyto(out, tmp, casting="unsafe")
+    return out
+
+
+def residual_add_int16(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return np.clip(x.astype(np.int32) + y, -32768, 32767).astype(np.int16)
+
+
+def bit_length_int64(n: np.ndarray) -> np.ndarray:
+    # Elementwise int.bit_length() for n >= 0 by binary search on shifts.
+    n = n.astype(np.int64)
+    bits = np.zeros_like(n)
+    for s in (32, 16, 8, 4, 2, 1):
+        hi = (n >> s) > 0
+        bits += hi * s
+        n = np.where(hi, n >> s, n)
+    return bits + (n > 0)
+
+
+def isqrt_int64(n: np.ndarray) -> np.ndarray:
+    # Elementwise floor(sqrt(n)) for 0 <= n < 2**62: integer Newton from a power-of-two upper bound.
+    n = n.astype(np.int64)
+    m = np.maximum(n, 1)
+    x = np.left_shift(np.int64(1), (bit_length_int64(m) + 1) // 2)
+    while True:
+        y = (x + m // x) >> 1
+        if np.all(y >= x):
+            return np.where(n > 0, x, 0)
+        x = np.minimum(x, y)
+
+
+# Integer LayerNorm normalizes the row variance to [2**27, 2**29) by an even
+# shift, so one isqrt(2**60 // var) gives ~16-bit rsqrt precision at any scale.
+LN_RSQRT_BITS = 30
+
+
+def layer_norm_int16(x_int16: np.ndarray, frac_bits: int) -> np.ndarray:
+    """
+    Row-wise integer LayerNorm without affine terms; output is Q(frac_bits).
+    xc = D*x - sum(x) carries the mean exactly, var = sum(xc^2) // D is
+    D^2 times the variance, and rsqrt comes from one Newton isqrt per row.
+    Exact in int64 for D <= 1024 at full int16 range.
+    """
+    x = x_int16.astype(np.int64)
+    d = x.shape[-1]
+    xc = x * d - x.sum(axis=-1, keepdims=True)
+    var = np.maximum((xc * xc).sum(axis=-1, keepdims=True) // d, 1)
+    shift = bit_length_int64(var) - (LN_RSQRT_BITS - 1)
+    shift += shift & 1
+    var_n = np.where(shift >= 0, var >> np.maximum(shift, 0), var << np.maximum(-shift, 0))
+    inv = isqrt_int64((1 << (2 * LN_RSQRT_BITS)) // var_n)
+    t = LN_RSQRT_BITS + shift // 2 - frac_bits
+    y = (xc * inv + (np.int64(1) << (t - 1))) >> t
+    return np.clip(y, -32768, 32767).astype(np.int16)
+
+
+# GELU LUT: breakpoints every 2**-GELU_LUT_STEP_BITS over [-GELU_LUT_RANGE, GELU_LUT_RANGE]
+# with linear interpolation in between; identity above the range, 0 below it.
+GELU_LUT_RANGE = 4
+GELU_LUT_STEP_BITS = 3
+GELU_LUT_SIZE = 2 * GELU_LUT_RANGE * (1 << GELU_LUT_STEP_BITS) + 1
+
+
+@functools.lru_cache(maxsize=None)
+def gelu_lut_table(frac_bits: int) -> np.ndarray:
+    # Q(frac_bits) GELU values at the breakpoints, built once per activation format.
+    if not GELU_LUT_STEP_BITS <= frac_bits <= 14:
+        raise ValueError(f"gelu LUT needs {GELU_LUT_STEP_BITS} <= frac_bits <= 14")
+    step = 1.0 / (1 << GELU_LUT_STEP_BITS)
+    xs = [-GELU_LUT_RANGE + i * step for i in range(GELU_LUT_SIZE)]
+    ys = [round(v * 0.5 * (1.0 + math.erf(v / math.sqrt(2.0))) * (1 << frac_bits)) for v in xs]
+    return np.array(ys, dtype=np.int64)
+
+
+def gelu_int16(x_int16: np.ndarray, frac_bits: int) -> np.ndarray:
+    # Piecewise-linear GELU LUT on Q(frac_bits) int16 activations, integer ops only.
+    table = gelu_lut_table(frac_bits)
+    s = frac_bits - GELU_LUT_STEP_BITS
+    lo = GELU_LUT_RANGE << frac_bits
+    x = x_int16.astype(np.int64)
+    u = np.clip(x, -lo, lo) + lo
+    idx = u >> s
+    idx1 = np.minimum(idx + 1, GELU_LUT_SIZE - 1)
+    frac = u & ((1 << s) - 1)
+    half = (1 << s) >> 1
+    y = table[idx] + (((table[idx1] - table[idx]) * frac + half) >> s)
+    return np.where(x > lo, x, y).astype(np.int16)
+
+
+def lm_head_logits(
+    h_int16: np.ndarray,
+    table_int8: np.ndarray,
+    chunk: int = 4096,
+    scratch: np.ndarray | None = None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Tied LM head: logits[b, v] = h[b] . table[v] for h [B, D], table [V, D].
+    Sums are exact in float64 (no int32 wrap). The int8 table is widened
+    `chunk` vocab rows at a time into scratch [chunk, D], so the extra memory
+    is chunk * D * 8 bytes instead of a float64 copy of the whole vocabulary.
+    """
+    vocab, dim = table_int8.shape
+    chunk = max(1, min(int(chunk), vocab))
+    if scratch is None:
+        scratch = np.empty((chunk, dim), dtype=np.float64)
+    if out is None:
+        out = np.empty((h_int16.shape[0], vocab), dtype=np.float64)
+    h = h_int16.astype(np.float64)
+    for start in range(0, vocab, chunk):
+        stop = min(start + chunk, vocab)
+        w = scratch[: stop - start]
+        np.copyto(w, table_int8[start:stop], casting="unsafe")
+        np.matmul(h, w.T, out=out[:, start:stop])
+    return out
+
+
+def sample_tokens(
+    logits: np.ndarray,
+    rng: np.random.Generator | None = None,
+    temperature: float = 0.0,
+    top_k: int = 0,
+    top_p: float = 1.0,
+) -> np.ndarray:
+    """
+    Next-token ids [B] from logits [B, V], vectorized over the batch.
+    - temperature 0 (or top_k 1) is greedy argmax.
+    - top_k > 0 keeps the k largest logits per row via argpartition.
+    - top_p < 1 keeps the smallest prefix of the sorted candidates whose
+      probability mass reaches top_p (nucleus); then one inverse-CDF draw.
+    """
+    if temperature <= 0.0 or top_k == 1:
+        return np.argmax(logits, axis=-1)
+    if rng is None:
+        raise ValueError("sampling with temperature > 0 needs an rng")
+    batch, vocab = logits.shape
+    if 0 < top_k < vocab:
+        cand = np.argpartition(-logits, top_k - 1, axis=-1)[:, :top_k]
+    else:
+        cand = np.broadcast_to(np.arange(vocab), (batch, vocab))
+    vals = np.take_along_axis(logits, cand, axis=-1) / temperature
+    order = np.argsort(-vals, axis=-1, kind="stable")
+    cand = np.take_along_axis(cand, order, axis=-1)
+    vals = np.take_along_axis(vals, order, axis=-1)
+    p = np.exp(vals - vals[:, :1])
+    p /= p.sum(axis=-1, keepdims=True)
+    if top_p < 1.0:
+        p = np.where(np.cumsum(p, axis=-1) - p < top_p, p, 0.0)
+    cdf = np.cumsum(p, axis=-1)
+    u = rng.random(batch) * cdf[:, -1]
+    pick = np.minimum((cdf <= u[:, None]).sum(axis=-1), cdf.shape[1] - 1)
+    return cand[np.arange(batch), pick]
+
+
+def validate_sampling(temperature: float, top_k: int, top_p: float) -> None:
+    if temperature < 0.0:
+        raise ValueError("temperature must be >= 0")
+    if top_k < 0:
+        raise ValueError("top_k must be >= 0")
+    if not 0.0 < top_p <= 1.0:
+        raise ValueError("top_p must be in (0, 1]")
+
+
+# KV storage modes: name -> (storage dtype, per-row quantization max or 0 for raw).
+KV_DTYPES: dict[str, tuple[type, int]] = {
+    "float32": (np.float32, 0),
+    "int16": (np.int16, 32767),
+    "int8": (np.int8, 127),
+}
+
+
+def quantize_rows(x: np.ndarray, qmax: int, dtype: type) -> tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-row quantization: x[r] ~= q[r] * scale[r].
+    x2 = x.reshape(-1, x.shape[-1])
+    amax = np.max(np.abs(x2), axis=1)
+    scale = np.where(amax > 0, amax / float(qmax), 1.0).astype(np.float32)
+    q = np.clip(np.round(x2 / scale[:, None]), -qmax, qmax).astype(dtype)
+    return q, scale
+
+
+class DecodeWorkspace:
+    """
+    Per-token scratch for single-sequence decode, sized once at load().
+    Kernels write into these buffers via out= so a float32-KV decode step
+    creates no new arrays. acc_dtype follows the packed QKV weight.
+    """
+
+    def __init__(
+        self, dim: int, max_seq: int, acc_dtype: np.dtype | type = np.float64, kv_dim: int | None = None
+    ) -> None:
+        self.dim = dim
+        self.kv_dim = dim if kv_dim is None else kv_dim
+        width = dim + 2 * self.kv_dim
+        self.x = np.zeros((1, dim), dtype=acc_dtype)
+        self.acc = np.zeros((1, width), dtype=acc_dtype)
+        self.tmp = np.zeros((1, width), dtype=acc_dtype)
+        self.qkv = np.zeros(width, dtype=np.float32)
+        self.score = np.zeros(max_seq, dtype=np.float32)
+        self.y = np.zeros(dim, dtype=np.float32)
+        self.y_i64 = np.zeros(dim, dtype=np.int64)
+
+    def project_qkv(self, x_int16: np.ndarray, w_qkv: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # x_int16: [D] -> q, k, v float32 views into self.qkv.
+        np.copyto(self.x[0], x_int16)
+        gemm_packed_acc32_into(self.x, w_qkv, self.acc, self.tmp)
+        np.copyto(self.qkv, self.acc[0], casting="same_kind")
+        return split_qkv(self.qkv, self.dim, self.kv_dim)
+
+
 class KVCache:
-    def __init__(self, max_seq: int, dim: int) -> None:
-        self.max_seq = max_seq
+    """
+    Single-sequence KV cache.
+    Layout: [max_seq, dim] per K/V, stored as float32, or as int16/int8 words
+    with one float32 scale per token row (int16 matches kv_cache.sv width).
+
+    window > 0 turns it into a ring buffer of `sink` pinned rows plus the
+    latest `window` rows, so generation runs past max_seq in constant memory.
+    Slots are then not in position order; `pos` holds each slot's position.
+    """
+
+    def __init__(self, max_seq: int, dim: int, kv_dtype: str = "float32", window: int = 0, sink: int = 0) -> None:
+        if kv_dtype not in KV_DTYPES:
+            raise ValueError(f"unsupported kv_dtype: {kv_dtype}")
+        if window < 0 or sink < 0 or (sink and not window):
+            raise ValueError("kv sink requires a positive window")
+        self.window = int(window)
+        self.sink = int(sink)
+        self.max_seq = self.sink + self.window if self.window else max_seq
         self.dim = dim
-        self.k = np.zeros((max_seq, dim), dtype=np.float32)
-        self.v = np.zeros((max_seq, dim), dtype=np.float32)
+        self.kv_dtype = kv_dtype
+        dtype, self._qmax = KV_DTYPES[kv_dtype]
+        self.k = np.zeros((self.max_seq, dim), dtype=dtype)
+        self.v = np.zeros((self.max_seq, dim), dtype=dtype)
+        self.k_scale: np.ndarray | None = None
+        self.v_scale: np.ndarray | None = None
+        if self._qmax:
+            self.k_scale = np.zeros(self.max_seq, dtype=np.float32)
+            self.v_scale = np.zeros(self.max_seq, dtype=np.float32)
+        self.pos = np.zeros(self.max_seq, dtype=np.int64)
         self.length = 0
+        self.seen = 0
+
+    @property
+    def nbytes(self) -> int:
+        total = self.k.nbytes + self.v.nbytes
+        if self.k_scale is not None and self.v_scale is not None:
+            total += self.k_scale.nbytes + self.v_scale.nbytes
+        return int(total)
+
+    def _store(self, idx: slice | np.ndarray, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        if not self._qmax:
+            self.k[idx] = k_rows
+            self.v[idx] = v_rows
+            return
+        self.k[idx], self.k_scale[idx] = quantize_rows(k_rows, self._qmax, self.k.dtype)
+        self.v[idx], self.v_scale[idx] = quantize_rows(v_rows, self._qmax, self.v.dtype)
 
     def append(self, k_t: np.ndarray, v_t: np.ndarray) -> None:
-        if self.length >= self.max_seq:
-            raise ValueError("kv overflow")
         if k_t.shape != (self.dim,) or v_t.shape != (self.dim,):
             raise ValueError("kv shape mismatch")
+        if self.window or self._qmax or self.length >= self.max_seq:
+            self.extend(k_t.reshape(1, -1), v_t.reshape(1, -1))
+            return
+        # Single float32 row: skip extend's slice/position bookkeeping.
         self.k[self.length] = k_t
         self.v[self.length] = v_t
+        self.pos[self.length] = self.seen
         self.length += 1
+        self.seen += 1
+
+    def extend(self, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        n = int(k_rows.shape[0])
+        if k_rows.shape != (n, self.dim) or v_rows.shape != (n, self.dim):
+            raise ValueError("kv shape mismatch")
+        if not self.window:
+            if self.length + n > self.max_seq:
+                raise ValueError("kv overflow")
+            self._store(slice(self.length, self.length + n), k_rows, v_rows)
+            self.pos[self.length : self.length + n] = self.seen + np.arange(n)
+            self.length += n
+            self.seen += n
+            return
+
+        # Only sink rows and the newest `window` rows survive this write.
+        p = self.seen + np.arange(n)
+        keep = (p < self.sink) | (p >= self.seen + n - self.window)
+        p = p[keep]
+        slots = np.where(p < self.sink, p, self.sink + (p - self.sink) % self.window)
+        self._store(slots, k_rows[keep], v_rows[keep])
+        self.pos[slots] = p
+        self.seen += n
+        self.length = min(self.seen, self.max_seq)
+
+    def reset(self) -> None:
+        self.length = 0
+        self.seen = 0
 
     def get(self) -> tuple[np.ndarray, np.ndarray]:
+        # Raw stored words; pair with get_scales() for the quantized modes.
         return self.k[: self.length], self.v[: self.length]
 
+    def get_scales(self) -> tuple[np.ndarray | None, np.ndarray | None]:
+        if self.k_scale is None or self.v_scale is None:
+            return None, None
+        return self.k_scale[: self.length], self.v_scale[: self.length]
+
+    def get_dequant(self) -> tuple[np.ndarray, np.ndarray]:
+        k_all, v_all = self.get()
+        k_scale, v_scale = self.get_scales()
+        if k_scale is None or v_scale is None:
+            return k_all, v_all
+        return k_all * k_scale[:, None], v_all * v_scale[:, None]
+
+
+class BatchedKVCache:
+    """
+    KV cache for B sequences decoded in lock-step.
+    Layout: [batch, max_seq, dim] with per-sequence lengths.
+    """
+
+    def __init__(self, batch: int, max_seq: int, dim: int) -> None:
+        self.batch = batch
+        self.max_seq = max_seq
+        self.dim = dim
+        self.k = np.zeros((batch, max_seq, dim), dtype=np.float32)
+        self.v = np.zeros((batch, max_seq, dim), dtype=np.float32)
+        self.lengths = np.zeros(batch, dtype=np.int64)
+
+    def append(self, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        # One new row per sequence.
+        if k_rows.shape != (self.batch, self.dim) or v_rows.shape != (self.batch, self.dim):
+            raise ValueError("kv shape mismatch")
+        if int(self.lengths.max(initial=0)) >= self.max_seq:
+            raise ValueError("kv overflow")
+        rows = np.arange(self.batch)
+        self.k[rows, self.lengths] = k_rows
+        self.v[rows, self.lengths] = v_rows
+        self.lengths += 1
+
+    def extend_seq(self, b: int, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        n = int(k_rows.shape[0])
+        start = int(self.lengths[b])
+        if start + n > self.max_seq:
+            raise ValueError("kv overflow")
+        if k_rows.shape != (n, self.dim) or v_rows.shape != (n, self.dim):
+            raise ValueError("kv shape mismatch")
+        self.k[b, start : start + n] = k_rows
+        self.v[b, start : start + n] = v_rows
+        self.lengths[b] = start + n
+
+    def get_seq(self, b: int) -> tuple[np.ndarray, np.ndarray]:
+        n = int(self.lengths[b])
+        return self.k[b, :n], self.v[b, :n]
+
+    def get(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Prefix up to the longest sequence; shorter ones are masked by length.
+        n = int(self.lengths.max(initial=0))
+        return self.k[:, :n], self.v[:, :n], self.lengths
+
+    def seq(self, b: int) -> "BatchedKVSlot":
+        return BatchedKVSlot(self, b)
+
 
-def softmax(x: np.ndarray, axis: int = -1) -> np.ndarray:
+class BatchedKVSlot:
+    # Single-sequence KVCache view so prefill can fill one batch row.
+    def __init__(self, owner: BatchedKVCache, b: int) -> None:
+        self.owner = owner
+        self.b = b
+        self.dim = owner.dim
+
+    @property
+    def length(self) -> int:
+        return int(self.owner.lengths[self.b])
+
+    def extend(self, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        self.owner.extend_seq(self.b, k_rows, v_rows)
+
+    def get(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.owner.get_seq(self.b)
+
+    def get_scales(self) -> tuple[None, None]:
+        return None, None
+
+
+SOFTMAX_MODES = ("exact", "lut")
+
+# Softmax unit exp table: 257 points on [-8, 0] (1/32 fixed-point grid), built once.
+EXP_LUT_SIZE = 257
+EXP_LUT_X = np.linspace(-8.0, 0.0, EXP_LUT_SIZE, dtype=np.float32)
+EXP_LUT_Y = np.exp(EXP_LUT_X)
+
+
+def exp_lut(x: np.ndarray) -> np.ndarray:
+    # Piecewise-linear exp over the cached table; bit-exact with golden exp_approx_piecewise.
+    x_clip = np.clip(x, -8.0, 0.0)
+    pos = ((x_clip + 8.0) / 8.0) * (EXP_LUT_SIZE - 1)
+    idx0 = np.floor(pos).astype(np.int32)
+    idx1 = np.minimum(idx0 + 1, EXP_LUT_SIZE - 1)
+    frac = pos - idx0
+    return EXP_LUT_Y[idx0] * (1.0 - frac) + EXP_LUT_Y[idx1] * frac
+
+
+def softmax(x: np.ndarray, axis: int = -1, lut: bool = False) -> np.ndarray:
     x_max = np.max(x, axis=axis, keepdims=True)
-    e = np.exp(x - x_max)
+    if not lut:
+        e = np.exp(x - x_max)
+    else:
+        # Same floor as golden softmax_approx; -inf (masked) entries stay at zero.
+        d = x - x_max
+        e = np.where(np.isneginf(d), 0.0, np.maximum(exp_lut(d), 1e-8))
     return e / np.sum(e, axis=axis, keepdims=True)
 
 
-def attention_decode_step(q_t: np.ndarray, k_all: np.ndarray, v_all: np.ndarray) -> np.ndarray:
-    # q_t: [D], k_all/v_all: [T, D]
+def attention_heads(
+    q_rows: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    num_heads: int,
+    num_kv_heads: int,
+    mask: np.ndarray | None = None,
+    k_scale: np.ndarray | None = None,
+    v_scale: np.ndarray | None = None,
+    softmax_lut: bool = False,
+) -> np.ndarray:
+    """
+    Head-batched attention: q_rows [..., Tq, H*hd], k_all/v_all [..., Tk, Hkv*hd].
+    Each KV head serves H // Hkv query heads (GQA; Hkv == 1 is MQA), and
+    all heads (and any leading batch dims) go through one batched matmul
+    per side.
+    mask [..., Tq, Tk] is True where a key is hidden; row scales [Tk] cover
+    every head of a quantized row.
+    """
+    lead = q_rows.shape[:-2]
+    n = len(lead)
+    b = tuple(range(n))
+    tq, tk = q_rows.shape[-2], k_all.shape[-2]
+    hd = q_rows.shape[-1] // num_heads
+    group = num_heads // num_kv_heads
+    q = q_rows.reshape(*lead, tq, num_kv_heads, group, hd).transpose(*b, n + 1, n + 2, n, n + 3)  # [.., Hkv, G, Tq, hd]
+    k = k_all.reshape(*lead, tk, num_kv_heads, 1, hd).transpose(*b, n + 1, n + 2, n + 3, n)  # [.., Hkv, 1, hd, Tk]
+    v = v_all.reshape(*lead, tk, num_kv_heads, 1, hd).transpose(*b, n + 1, n + 2, n, n + 3)  # [.., Hkv, 1, Tk, hd]
+    score = np.matmul(q, k) * np.float32(1.0 / np.sqrt(float(hd)))
+    if k_scale is not None:
+        score *= k_scale
+    if mask is not None:
+        # Broadcast over the head axes.
+        score[np.broadcast_to(mask[..., None, None, :, :], score.shape)] = -np.inf
+    prob = softmax(score, axis=-1, lut=softmax_lut)
+    if v_scale is not None:
+        prob = prob * v_scale
+    out = np.matmul(prob, v)  # [.., Hkv, G, Tq, hd]
+    return out.transpose(*b, n + 2, n, n + 1, n + 3).reshape(*lead, tq, -1).astype(np.float32)
+
+
+def attention_decode_step(
+    q_t: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    k_scale: np.ndarray | None = None,
+    v_scale: np.ndarray | None = None,
+    tile: int = 64,
+    softmax_lut: bool = False,
+    out: np.ndarray | None = None,
+    score_out: np.ndarray | None = None,
+    num_heads: int = 1,
+    num_kv_heads: int = 1,
+) -> np.ndarray:
+    # q_t: [D], k_all/v_all: [T, Dkv] float32, or int words with per-row scales [T]
+    # out ([D] float32) and score_out ([>= T] float32) are optional workspace buffers.
+    if num_heads > 1:
+        y = attention_heads(q_t[None], k_all, v_all, num_heads, num_kv_heads, None, k_scale, v_scale, softmax_lut)[0]
+        if out is None:
+            return y
+        np.copyto(out, y)
+        return out
     scale = 1.0 / np.sqrt(float(q_t.shape[0]))
-    score = (k_all @ q_t) * scale  # [T]
-    prob = softmax(score.reshape(1, -1), axis=-1).reshape(-1)
+    t = k_all.shape[0]
+    if k_scale is None or v_scale is None:
+        if out is None or score_out is None or softmax_lut:
+            score = (k_all @ q_t) * scale  # [T]
+            prob = softmax(score.reshape(1, -1), axis=-1, lut=softmax_lut).reshape(-1)
+            return (prob @ v_all).astype(np.float32)
+        score = np.matmul(k_all, q_t, out=score_out[:t])
+        score *= np.float32(scale)
+        score -= score.max()
+        np.exp(score, out=score)
+        score /= score.sum()
+        return np.matmul(score, v_all, out=out)
+
+    # Row scales fold into the score/probability vectors, and the int words are
+    # widened one tile at a time, so no float copy of the whole prefix exists.
+    score = np.empty(t, dtype=np.float32) if score_out is None else score_out[:t]
+    for s in range(0, t, tile):
+        np.dot(k_all[s : s + tile], q_t, out=score[s : s + tile])
+    score *= k_scale * np.float32(scale)
+    prob = softmax(score.reshape(1, -1), axis=-1, lut=softmax_lut).reshape(-1) * v_scale
+    if out is None:
+        out = np.zeros(q_t.shape[0], dtype=np.float32)
+    else:
+        out[...] = 0.0
+    for s in range(0, t, tile):
+        out += prob[s : s + tile] @ v_all[s : s + tile]
+    return out
+
+
+def attention_decode_tiled(
+    q_t: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    tile: int,
+    k_scale: np.ndarray | None = None,
+    v_scale: np.ndarray | None = None,
+    softmax_lut: bool = False,
+) -> tuple[np.ndarray, int]:
+    """
+    Streaming decode attention over K tiles (attention_core.sv dataflow).
+    Keeps a running max / sum and rescales the accumulator per tile, so
+    scratch is O(tile) regardless of T. Returns (output [D], tiles used).
+    The LUT exp does not compose (exp_lut(a) * exp_lut(b) != exp_lut(a + b)
+    under its [-8, 0] clip, interpolation and 1e-8 floor), so with
+    softmax_lut a first pass over the tiles finds the final max and every
+    tile is then exponentiated against it, as softmax(lut=True) does.
+    """
+    tile = max(1, int(tile))
+    scale = np.float32(1.0 / np.sqrt(float(q_t.shape[0])))
+
+    def scores(s: int) -> np.ndarray:
+        score = (k_all[s : s + tile] @ q_t) * scale
+        if k_scale is not None:
+            score *= k_scale[s : s + tile]
+        return score
+
+    starts = range(0, k_all.shape[0], tile)
+    m = max(float(np.max(scores(s))) for s in starts) if softmax_lut else -np.inf
+    denom = 0.0
+    acc = np.zeros(q_t.shape[0], dtype=np.float64 if softmax_lut else np.float32)
+    n_tiles = 0
+    for s in starts:
+        score = scores(s)
+        if softmax_lut:
+            alpha = np.float32(1.0)
+            p = np.maximum(exp_lut(score - np.float32(m)), 1e-8)
+            m_new = m
+        else:
+            m_new = max(m, float(np.max(score)))
+            alpha = np.float32(np.exp(m - m_new))
+            p = np.exp(score - np.float32(m_new))
+        denom = denom * float(alpha) + float(np.sum(p))
+        if v_scale is not None:
+            p *= v_scale[s : s + tile]
+        acc *= alpha
+        acc += p @ v_all[s : s + tile]
+        m = m_new
+        n_tiles += 1
+    return (acc / denom).astype(np.float32), n_tiles
+
+
+def attention_decode_batch(
+    q_rows: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    lengths: np.ndarray,
+    softmax_lut: bool = False,
+    num_heads: int = 1,
+    num_kv_heads: int = 1,
+) -> np.ndarray:
+    # q_rows: [B, D], k_all/v_all: [B, T, Dkv], lengths: [B] valid rows per sequence
+    pad = np.arange(k_all.shape[1])[None, :] >= lengths[:, None]  # [B, T]
+    if num_heads > 1:
+        y = attention_heads(
+            q_rows[:, None, :], k_all, v_all, num_heads, num_kv_heads, pad[:, None, :], softmax_lut=softmax_lut
+        )
+        return y[:, 0]
+    scale = 1.0 / np.sqrt(float(q_rows.shape[1]))
+    score = np.matmul(k_all, q_rows[:, :, None])[:, :, 0] * scale  # [B, T]
+    score[pad] = -np.inf
+    prob = softmax(score, axis=-1, lut=softmax_lut)
+    out = np.matmul(prob[:, None, :], v_all)[:, 0, :]
+    return out.astype(np.float32)
+
+
+def attention_prefill(
+    q_rows: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    start_pos: int,
+    k_scale: np.ndarray | None = None,
+    v_scale: np.ndarray | None = None,
+    softmax_lut: bool = False,
+    num_heads: int = 1,
+    num_kv_heads: int = 1,
+) -> np.ndarray:
+    # q_rows: [T, D] at positions start_pos.., k_all/v_all: [start_pos + T, Dkv]
+    t = q_rows.shape[0]
+    if k_all.shape[0] != start_pos + t:
+        raise ValueError("prefill kv length mismatch")
+    causal = np.arange(k_all.shape[0])[None, :] > (start_pos + np.arange(t))[:, None]
+    if num_heads > 1:
+        return attention_heads(q_rows, k_all, v_all, num_heads, num_kv_heads, causal, k_scale, v_scale, softmax_lut)
+    scale = 1.0 / np.sqrt(float(q_rows.shape[1]))
+    score = (q_rows @ k_all.T) * scale  # [T, start_pos + T]
+    if k_scale is not None:
+        score *= k_scale[None, :]
+    score[causal] = -np.inf
+    prob = softmax(score, axis=-1, lut=softmax_lut)
+    if v_scale is not None:
+        prob *= v_scale[None, :]
     out = prob @ v_all
     return out.astype(np.float32)
+
+
+def attention_prefill_window(
+    q_rows: np.ndarray,
+    k_all: np.ndarray,
+    v_all: np.ndarray,
+    key_pos: np.ndarray,
+    start_pos: int,
+    window: int,
+    sink: int,
+    softmax_lut: bool = False,
+    num_heads: int = 1,
+    num_kv_heads: int = 1,
+) -> np.ndarray:
+    # Sliding-window causal attention: row at position p sees sink rows and positions (p - window, p].
+    t = q_rows.shape[0]
+    q_pos = (start_pos + np.arange(t))[:, None]
+    kp = key_pos[None, :]
+    hidden = ~((kp <= q_pos) & ((kp < sink) | (kp > q_pos - window)))
+    if num_heads > 1:
+        return attention_heads(q_rows, k_all, v_all, num_heads, num_kv_heads, hidden, softmax_lut=softmax_lut)
+    scale = 1.0 / np.sqrt(float(q_rows.shape[1]))
+    score = (q_rows @ k_all.T) * scale
+    score[hidden] = -np.inf
+    prob = softmax(score, axis=-1, lut=softmax_lut)
+    out = prob @ v_all
+    return out.astype(np.float32)
+
+
+def prefill_into_cache(
+    x_int16: np.ndarray,
+    w_qkv: np.ndarray,
+    cache: KVCache | BatchedKVSlot,
+    chunk: int,
+    softmax_lut: bool = False,
+    num_heads: int = 1,
+    num_kv_heads: int = 1,
+    all_rows: bool = False,
+    project: Callable[[np.ndarray], np.ndarray] | None = None,
+) -> np.ndarray:
+    """
+    Project the prompt [T, D] chunk by chunk (one GEMM per chunk, or
+    `project` when the QKV GEMM runs elsewhere, e.g. sharded), bulk-write
+    K/V rows into the cache and run masked causal attention per chunk.
+    Returns the attention output of the last prompt position, or of every
+    position ([T, D]) with all_rows for layers stacked on top.
+    `cache` may be any KVCache-like view (batch slot, paged sequence); its
+    dim is the K/V row width, which is narrower than D under GQA.
+    """
+    if x_int16.ndim != 2 or x_int16.shape[0] == 0:
+        raise ValueError("prefill input must be non-empty [T, D]")
+    chunk = max(1, int(chunk))
+    ring = isinstance(cache, KVCache) and cache.window > 0
+    heads = {"softmax_lut": softmax_lut, "num_heads": num_heads, "num_kv_heads": num_kv_heads}
+    dim = x_int16.shape[1]
+    y = np.zeros((0, dim), dtype=np.float32)
+    ys: list[np.ndarray] = []
+    for start in range(0, x_int16.shape[0], chunk):
+        rows = x_int16[start : start + chunk]
+        qkv = (gemm_int16a_packed_acc32(rows, w_qkv) if project is None else project(rows)).astype(np.float32)
+        q, k, v = split_qkv(qkv, dim, cache.dim)
+        if ring:
+            # Attend before writing: the chunk may evict rows its early positions still see.
+            pos = cache.seen
+            k_prev, v_prev = cache.get_dequant()
+            key_pos = np.concatenate([cache.pos[: cache.length], pos + np.arange(q.shape[0])])
+            k_all = np.concatenate([k_prev, k])
+            v_all = np.concatenate([v_prev, v])
+            y = attention_prefill_window(q, k_all, v_all, key_pos, pos, cache.window, cache.sink, **heads)
+            cache.extend(k, v)
+            ys.append(y)
+            continue
+        pos = cache.length
+        cache.extend(k, v)
+        k_all, v_all = cache.get()
+        y = attention_prefill(q, k_all, v_all, pos, *cache.get_scales(), **heads)
+        ys.append(y)
+    return np.concatenate(ys) if all_rows else y[-1]
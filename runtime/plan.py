@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import numpy as np
+
+from runtime.np_kernels import (
+    DecodeWorkspace,
+    KVCache,
+    attention_decode_step,
+    attention_decode_tiled,
+    gelu_int16,
+    gemm_int16a_packed_acc32,
+    gemm_packed_acc32_into,
+    kv_width,
+    layer_norm_int16,
+    prefill_into_cache,
+    requantize_fixed_int16,
+    residual_add_int16,
+    sample_tokens,
+    split_qkv,
+)
+from runtime.model import DecoderLayer, PackedModel, TokenEmbedding
+
+if TYPE_CHECKING:
+    from runtime.tensor_parallel import TensorParallelGroup
+
+
+class DecodePlan:
+    """
+    Decode graph compiled once at load() and shared by both backends.
+    - Weights, fixed-point requant parameters, workspace buffers, head
+      layout and the attention variant are resolved up front; q/k/v are
+      fixed views into the workspace.
+    - execute() walks `steps` per token and records per-token counters in
+      arrays, so callers fold them into registers once after the run.
+    - stream() is the same loop as a generator that yields each token index
+      as soon as its row is in `out`.
+    """
+
+    def __init__(
+        self,
+        w_qkv: np.ndarray,
+        requant: tuple[int, int, str],
+        dim: int,
+        kv_capacity: int,
+        *,
+        kv_quantized: bool = False,
+        attention_kernel: str = "full",
+        attention_tile: int = 16,
+        softmax_lut: bool = False,
+        prefill_chunk: int = 256,
+        num_heads: int = 1,
+        num_kv_heads: int = 1,
+    ) -> None:
+        self.w_qkv = w_qkv
+        self.multiplier, self.shift, self.rounding = requant
+        self.dim = dim
+        self.kv_quantized = kv_quantized
+        self.attn_tile = max(1, int(attention_tile))
+        self.softmax_lut = softmax_lut
+        self.prefill_chunk = max(1, int(prefill_chunk))
+        self.num_heads = num_heads
+        self.num_kv_heads = num_kv_heads
+        self.kv_dim = kv_width(dim, num_heads, num_kv_heads)
+        self.ws = DecodeWorkspace(dim, kv_capacity, w_qkv.dtype, self.kv_dim)
+        self.q, self.k, self.v = split_qkv(self.ws.qkv, dim, self.kv_dim)
+        self._x_row = self.ws.x[0]
+        self._acc_row = self.ws.acc[0]
+
+        if attention_kernel == "tiled":
+            attend = self._attend_tiled
+        elif softmax_lut or kv_quantized or num_heads > 1:
+            attend = self._attend_generic
+        else:
+            attend = self._attend_full
+        self._attend = attend
+        self.steps: list[Callable[[int], None]] = [self._project, self._append, attend, self._requant]
+        # QKV GEMM override: int16 [M, D] -> int32-wrapped [M, D + 2 Dkv] (tensor-parallel shards).
+        self.project: Callable[[np.ndarray], np.ndarray] | None = None
+
+        self.cache: KVCache | None = None
+        self.out = np.zeros((0, dim), dtype=np.int16)
+        self.tiles = np.zeros(0, dtype=np.int64)
+        self.kv_len = np.zeros(0, dtype=np.int64)
+
+    def prefill(self, prompt_int16: np.ndarray, cache: KVCache) -> np.ndarray:
+        return prefill_into_cache(
+            prompt_int16,
+            self.w_qkv,
+            cache,
+            self.prefill_chunk,
+            self.softmax_lut,
+            self.num_heads,
+            self.num_kv_heads,
+            project=self.project,
+        )
+
+    def execute(self, cache: KVCache, y0: np.ndarray, gen_len: int) -> np.ndarray:
+        # y0: attention output of the last prompt row, which yields token 0.
+        for _ in self.stream(cache, y0, gen_len):
+            pass
+        return self.tokens
+
+    @property
+    def tokens(self) -> np.ndarray:
+        return self.out
+
+    def stream(self, cache: KVCache, y0: np.ndarray, gen_len: int) -> Iterator[int]:
+        self.begin(cache, gen_len)
+        self.out = np.empty((gen_len, self.dim), dtype=np.int16)
+        np.copyto(self.ws.y, y0)
+        self._requant(0)
+        yield 0
+        steps = self.steps
+        for i in range(1, gen_len):
+            for step in steps:
+                step(i)
+            yield i
+
+    def begin(self, cache: KVCache, gen_len: int) -> None:
+        # Counters for a caller that drives tokens through forward() itself.
+        self.cache = cache
+        self.tiles = np.zeros(gen_len, dtype=np.int64)
+        self.kv_len = np.empty(gen_len, dtype=np.int64)
+        self.kv_len[0] = cache.length
+
+    def forward(self, x_row: np.ndarray, out_row: np.ndarray, i: int) -> None:
+        # Token i through this layer's attention: int16 x_row -> requantized int16 out_row.
+        self._project_row(x_row)
+        self._append(i)
+        self._attend(i)
+        np.rint(self.ws.y, out=self.ws.y)
+        requantize_fixed_int16(self.ws.y, self.multiplier, self.shift, self.rounding, out=out_row, tmp=self.ws.y_i64)
+
+    def _project_row(self, x_row: np.ndarray) -> None:
+        # DecodeWorkspace.project_qkv with the row views pre-resolved.
+        if self.project is not None:
+            np.copyto(self.ws.qkv, self.project(x_row.reshape(1, -1))[0], casting="same_kind")
+            return
+        np.copyto(self._x_row, x_row)
+        gemm_packed_acc32_into(self.ws.x, self.w_qkv, self.ws.acc, self.ws.tmp)
+        np.copyto(self.ws.qkv, self._acc_row, casting="same_kind")
+
+    def _project(self, i: int) -> None:
+        self._project_row(self.out[i - 1])
+
+    def _append(self, i: int) -> None:
+        self.cache.append(self.k, self.v)
+        self.kv_len[i] = self.cache.length
+
+    def _attend_full(self, i: int) -> None:
+        k_all, v_all = self.cache.get()
+        attention_decode_step(self.q, k_all, v_all, out=self.ws.y, score_out=self.ws.score)
+
+    def _attend_generic(self, i: int) -> None:
+        k_all, v_all = self.cache.get()
+        k_scale, v_scale = self.cache.get_scales()
+        y = attention_decode_step(
+            self.q,
+            k_all,
+            v_all,
+            k_scale,
+            v_scale,
+            softmax_lut=self.softmax_lut,
+            out=self.ws.y,
+            score_out=self.ws.score,
+            num_heads=self.num_heads,
+            num_kv_heads=self.num_kv_heads,
+        )
+        np.copyto(self.ws.y, y)
+
+    def _attend_tiled(self, i: int) -> None:
+        k_all, v_all = self.cache.get()
+        y, self.tiles[i] = attention_decode_tiled(
+            self.q, k_all, v_all, self.attn_tile, *self.cache.get_scales(), softmax_lut=self.softmax_lut
+        )
+        np.copyto(self.ws.y, y)
+
+    def _requant(self, i: int) -> None:
+        np.rint(self.ws.y, out=self.ws.y)
+        requantize_fixed_int16(
+            self.ws.y, self.multiplier, self.shift, self.rounding, out=self.out[i], tmp=self.ws.y_i64
+        )
+
+
+class StackPlan:
+    """
+    N pre-norm decoder layers compiled from a stacked pack:
+        x += W_o attn(norm(x));  x += W_down gelu(W_up norm(x));  token = norm(x)
+    - Each layer's QKV projection, KV append and attention is its own
+      DecodePlan; the stack threads the int16 residual stream between them.
+    - Out-projection and FFN GEMMs run on the int8 path with per-stage
+      fixed-point requant; activations are Q(act_frac_bits) int16.
+    - prefill()/execute()/stream() mirror DecodePlan but take one KV cache per layer.
+    - With a token embedding, each emitted hidden row goes through the LM
+      head and a sampler, and the sampled id's embedding is the next input.
+    - shard() routes the QKV, out-projection and FFN GEMMs through a
+      tensor-parallel group; everything between them stays here.
+    """
+
+    def __init__(
+        self,
+        layers: list[DecoderLayer],
+        dim: int,
+        kv_capacity: int,
+        *,
+        act_frac_bits: int,
+        embedding: TokenEmbedding | None = None,
+        **attn,
+    ) -> None:
+        self.layers = layers
+        self.embedding = embedding
+        self.dim = dim
+        self.frac_bits = act_frac_bits
+        self.prefill_chunk = max(1, int(attn.get("prefill_chunk", 256)))
+        self.attn = [DecodePlan(layer.w_qkv, layer.attn_requant, dim, kv_capacity, **attn) for layer in layers]
+        self._ctx = np.zeros(dim, dtype=np.int16)
+        self.out = np.zeros((0, dim), dtype=np.int16)
+        self.ids = np.zeros(0, dtype=np.int64)
+        # logits [B, V] -> ids [B]; runtimes install their configured sampler.
+        self.sampler: Callable[[np.ndarray], np.ndarray] = sample_tokens
+        self.tp: TensorParallelGroup | None = None
+
+    def shard(self, group: TensorParallelGroup | None) -> None:
+        self.tp = group
+        for i, plan in enumerate(self.attn):
+            plan.project = None if group is None else functools.partial(group.qkv, i)
+
+    @property
+    def attn_tile(self) -> int:
+        return self.attn[0].attn_tile
+
+    @attn_tile.setter
+    def attn_tile(self, tile: int) -> None:
+        for plan in self.attn:
+            plan.attn_tile = tile
+
+    @property
+    def tiles(self) -> np.ndarray:
+        return np.sum([plan.tiles for plan in self.attn], axis=0)
+
+    @property
+    def kv_len(self) -> np.ndarray:
+        return self.attn[0].kv_len
+
+    def _mlp(self, x: np.ndarray, ctx: np.ndarray, li: int) -> np.ndarray:
+        # Residual stream update after attention for rows x [M, D] and their attention outputs ctx [M, D].
+        layer, tp = self.layers[li], self.tp
+        out = gemm_int16a_packed_acc32(ctx, layer.w_o) if tp is None else tp.out_proj(li, ctx)
+        x = residual_add_int16(x, requantize_fixed_int16(out, *layer.out_requant))
+        x_norm = layer_norm_int16(x, self.frac_bits)
+        if tp is not None:
+            return residual_add_int16(x, requantize_fixed_int16(tp.ffn(li, x_norm), *layer.down_requant))
+        h = requantize_fixed_int16(gemm_int16a_packed_acc32(x_norm, layer.w_up), *layer.up_requant)
+        h = gelu_int16(h, self.frac_bits)
+        return residual_add_int16(x, requantize_fixed_int16(gemm_int16a_packed_acc32(h, layer.w_down), *layer.down_requant))
+
+    def prefill(self, prompt_int16: np.ndarray, caches: list[KVCache]) -> np.ndarray:
+        # prefill_chunk prompt rows at a time through every layer, so no intermediate (the [rows, ffn_dim]
+        # FFN activation included) grows with the prompt; every op is row-wise or causal, so results are
+        # identical to whole-prompt layers. Returns token 0 (int16 [D]).
+        if prompt_int16.ndim != 2 or prompt_int16.shape[0] == 0:
+            raise ValueError("prefill input must be non-empty [T, D]")
+        for start in range(0, prompt_int16.shape[0], self.prefill_chunk):
+            x = prompt_int16[start : start + self.prefill_chunk]
+            for li, (plan, layer, cache) in enumerate(zip(self.attn, self.layers, caches)):
+                y = prefill_into_cache(
+                    layer_norm_int16(x, self.frac_bits),
+                    layer.w_qkv,
+                    cache,
+                    self.prefill_chunk,
+                    plan.softmax_lut,
+                    plan.num_heads,
+                    plan.num_kv_heads,
+                    all_rows=True,
+                    project=plan.project,
+                )
+                x = self._mlp(x, requantize_fixed_int16(np.rint(y), *layer.attn_requant), li)
+        return layer_norm_int16(x[-1], self.frac_bits)
+
+    def execute(self, caches: list[KVCache], x0: np.ndarray, gen_len: int) -> np.ndarray:
+        # Returns hidden rows [gen_len, D], or token ids [gen_len] when the pack has an embedding.
+        for _ in self.stream(caches, x0, gen_len):
+            pass
+        return self.tokens
+
+    @property
+    def tokens(self) -> np.ndarray:
+        return self.out if self.embedding is None else self.ids
+
+    def stream(self, caches: list[KVCache], x0: np.ndarray, gen_len: int) -> Iterator[int]:
+        head = self.embedding
+        sampler = self.sampler
+        self.out = np.empty((gen_len, self.dim), dtype=np.int16)
+        self.out[0] = x0
+        if head is not None:
+            self.ids = np.empty(gen_len, dtype=np.int64)
+            self.ids[0] = sampler(head.logits(self.out[:1]))[0]
+        for plan, cache in zip(self.attn, caches):
+            plan.begin(cache, gen_len)
+        yield 0
+        ctx = self._ctx
+        for i in range(1, gen_len):
+            x = self.out[i - 1 : i] if head is None else head.embed(self.ids[i - 1 : i])
+            for li, plan in enumerate(self.attn):
+                plan.forward(layer_norm_int16(x, self.frac_bits)[0], ctx, i)
+                x = self._mlp(x, ctx.reshape(1, -1), li)
+            self.out[i] = layer_norm_int16(x, self.frac_bits)[0]
+            if head is not None:
+                self.ids[i] = sampler(head.logits(self.out[i : i + 1]))[0]
+            yield i
+
+
+def compile_plan(model: PackedModel, dim: int, kv_capacity: int, **attn) -> DecodePlan | StackPlan:
+    # Legacy attention-only packs keep the single-layer DecodePlan fast path.
+    if model.stacked:
+        return StackPlan(
+            model.layers, dim, kv_capacity, act_frac_bits=model.act_frac_bits, embedding=model.embedding, **attn
+        )
+    layer = model.layers[0]
+    return DecodePlan(layer.w_qkv, layer.attn_requant, dim, kv_capacity, **attn)
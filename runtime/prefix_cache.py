@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PrefixCache:
+    """
+    Prompt-prefix KV reuse at block granularity.
+    - Block i is keyed by a hash chained over prompt blocks 0..i, so a hit
+      implies the whole prefix up to that block matches.
+    - Entries hold the K/V rows of one block; LRU eviction keeps the total
+      under budget_bytes.
+    - A chain is touched tail first, so every block is more recent than
+      its cached descendants and eviction always takes a chain's tail: a
+      cached block is never left behind a missing one it chains from.
+    """
+
+    def __init__(self, block_tokens: int, budget_bytes: int) -> None:
+        if block_tokens <= 0:
+            raise ValueError("block_tokens must be > 0")
+        self.block_tokens = block_tokens
+        self.budget_bytes = budget_bytes
+        self.entries: OrderedDict[bytes, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _block_keys(self, tokens: np.ndarray) -> list[bytes]:
+        keys: list[bytes] = []
+        prev = b""
+        for start in range(0, tokens.shape[0] - self.block_tokens + 1, self.block_tokens):
+            h = hashlib.blake2b(prev, digest_size=16)
+            h.update(np.ascontiguousarray(tokens[start : start + self.block_tokens]).tobytes())
+            prev = h.digest()
+            keys.append(prev)
+        return keys
+
+    def lookup(self, tokens: np.ndarray) -> tuple[int, np.ndarray | None, np.ndarray | None]:
+        # Longest cached prefix of `tokens` in whole blocks -> (n_tokens, k_rows, v_rows).
+        keys = self._block_keys(tokens)
+        k_parts: list[np.ndarray] = []
+        v_parts: list[np.ndarray] = []
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                break
+            k_parts.append(entry[0])
+            v_parts.append(entry[1])
+        self._touch(keys[: len(k_parts)])
+        self.hits += len(k_parts)
+        self.misses += len(keys) - len(k_parts)
+        if not k_parts:
+            return 0, None, None
+        return len(k_parts) * self.block_tokens, np.concatenate(k_parts), np.concatenate(v_parts)
+
+    def insert(self, tokens: np.ndarray, k_rows: np.ndarray, v_rows: np.ndarray) -> None:
+        # k_rows/v_rows: [T, D] for the same tokens; only whole blocks are kept.
+        keys = self._block_keys(tokens)
+        stored = 0
+        while stored < len(keys) and keys[stored] in self.entries:
+            stored += 1
+        # The cached head of the chain becomes the newest, so making room below never evicts it.
+        self._touch(keys[:stored])
+        chain_bytes = sum(k.nbytes + v.nbytes for k, v in (self.entries[key] for key in keys[:stored]))
+        for i in range(stored, len(keys)):
+            rows = slice(i * self.block_tokens, (i + 1) * self.block_tokens)
+            entry = (k_rows[rows].astype(np.float32), v_rows[rows].astype(np.float32))
+            size = entry[0].nbytes + entry[1].nbytes
+            if chain_bytes + size > self.budget_bytes:
+                break
+            while self.bytes_used + size > self.budget_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.bytes_used -= old[0].nbytes + old[1].nbytes
+                self.evictions += 1
+            self.entries[keys[i]] = entry
+            self.bytes_used += size
+            chain_bytes += size
+            stored += 1
+        self._touch(keys[:stored])
+
+    def _touch(self, keys: list[bytes]) -> None:
+        # Most recent last: the chain head ends up newest, its tail oldest.
+        for key in reversed(keys):
+            self.entries.move_to_end(key)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes_used = 0
@@ -12,6 +12,12 @@ REG_PERF_TOKENS = 0x1C
 REG_PERF_STALL_IN = 0x20
 REG_PERF_STALL_OUT = 0x24
 REG_CFG_K_TILE = 0x28
+REG_PERF_PREFILL_CYCLES = 0x2C
+REG_BATCH_SIZE = 0x30
+REG_PERF_ATTN_TILES = 0x34
+REG_PERF_NORM_CYCLES = 0x38
+REG_PERF_ACT_CYCLES = 0x3C
+REG_PERF_LM_HEAD_CYCLES = 0x40
 
 CTRL_START = 1 << 0
 CTRL_RESET = 1 << 1
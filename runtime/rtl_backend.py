@@ -1,12 +1,16 @@
 from __future__ import annotations
 
-import json
+import time
 from pathlib import Path
+from typing import Iterator
 
 import numpy as np
 
 from runtime import register_map as rm
-from runtime.np_kernels import KVCache, attention_decode_step, gemm_int8w_int16a_acc32, requantize_int16
+from runtime.model import PackedModel, load_pack
+from runtime.np_kernels import KVCache, kv_width, sample_tokens, validate_sampling
+from runtime.plan import DecodePlan, StackPlan, compile_plan
+from runtime.stream import TokenEvent
 
 
 def _pack_error_code(text: str) -> int:
@@ -33,7 +37,26 @@ class RtlBackend:
         token_overhead_cycles: int = 12,
         cycle_calib_scale: float = 1.0,
         cycle_calib_bias: float = 0.0,
+        gemm_kernel: str = "auto",
+        prefill_chunk: int = 256,
+        kv_dtype: str = "float32",
+        kv_window: int = 0,
+        kv_sink: int = 0,
+        attention_kernel: str = "full",
+        attention_tile: int = 0,
+        softmax_mode: str = "exact",
+        num_heads: int = 1,
+        num_kv_heads: int = 0,
+        attn_head_lanes: int = 0,
+        vec_lanes: int = 16,
+        rsqrt_latency: int = 6,
+        temperature: float = 0.0,
+        top_k: int = 0,
+        top_p: float = 1.0,
+        seed: int = 0,
+        lm_head_chunk: int = 4096,
     ) -> None:
+        validate_sampling(temperature, top_k, top_p)
         self.dim = dim
         self.max_seq = max_seq
         self.cfg_k_tile = max(1, int(cfg_k_tile))
@@ -41,10 +64,42 @@ class RtlBackend:
         self.token_overhead_cycles = max(1, int(token_overhead_cycles))
         self.cycle_calib_scale = float(cycle_calib_scale)
         self.cycle_calib_bias = float(cycle_calib_bias)
+        self.gemm_kernel = gemm_kernel
+        self.prefill_chunk = max(1, int(prefill_chunk))
+        self.kv_dtype = kv_dtype
+        self.kv_window = int(kv_window)
+        self.kv_sink = int(kv_sink)
+        self.attention_kernel = attention_kernel
+        self.attention_tile = max(0, int(attention_tile))
+        self.softmax_lut = softmax_mode == "lut"
+        self.num_heads = int(num_heads)
+        self.num_kv_heads = int(num_kv_heads) or self.num_heads
+        self.kv_dim = kv_width(dim, self.num_heads, self.num_kv_heads)
+        # Heads the attention core runs side by side; 0 -> all of them.
+        self.attn_head_lanes = min(self.num_heads, int(attn_head_lanes) or self.num_heads)
+        # LayerNorm/GELU vector unit: elements per cycle and isqrt latency per normalized row.
+        self.vec_lanes = max(1, int(vec_lanes))
+        self.rsqrt_latency = max(0, int(rsqrt_latency))
+        self.temperature = float(temperature)
+        self.top_k = int(top_k)
+        self.top_p = float(top_p)
+        self.seed = int(seed)
+        self.lm_head_chunk = int(lm_head_chunk)
+        self.rng = np.random.default_rng(self.seed)
+        self.token_attn_tiles: list[int] = []
 
         self.regs: dict[int, int] = {}
         self.weights: dict[str, np.ndarray] = {}
-        self.cache = KVCache(max_seq=max_seq, dim=dim)
+        self.plan: DecodePlan | StackPlan | None = None
+        self.model: PackedModel | None = None
+        self.requant: tuple[int, int, str] = (1, 1, "half_up")
+        # Per-layer work the cycle model charges; set from the pack at load().
+        self.num_layers = 1
+        self.ffn_dim = 0
+        self.vocab_size = 0
+        self.cache = self._new_kv_cache()
+        self.caches: list[KVCache] = [self.cache]
+        self.token_attn_tiles = []
         self.last_error = ""
         self.init()
 
@@ -61,19 +116,49 @@ class RtlBackend:
             rm.REG_PERF_STALL_IN: 0,
             rm.REG_PERF_STALL_OUT: 0,
             rm.REG_CFG_K_TILE: self.cfg_k_tile,
+            rm.REG_PERF_PREFILL_CYCLES: 0,
+            rm.REG_PERF_ATTN_TILES: 0,
+            rm.REG_PERF_NORM_CYCLES: 0,
+            rm.REG_PERF_ACT_CYCLES: 0,
+            rm.REG_PERF_LM_HEAD_CYCLES: 0,
         }
-        self.cache = KVCache(max_seq=self.max_seq, dim=self.dim)
+        self.rng = np.random.default_rng(self.seed)
+        self.cache = self._new_kv_cache()
+        self.caches = [self.cache] + [self._new_kv_cache() for _ in range(self.num_layers - 1)]
+        self.token_attn_tiles = []
         self.last_error = ""
 
+    def _new_kv_cache(self) -> KVCache:
+        return KVCache(
+            max_seq=self.max_seq, dim=self.kv_dim, kv_dtype=self.kv_dtype, window=self.kv_window, sink=self.kv_sink
+        )
+
     def load(self, pack_dir: Path | str) -> None:
-        p = Path(pack_dir)
-        meta = json.loads((p / "meta.json").read_text(encoding="utf-8"))
-        if int(meta["dim"]) != self.dim:
-            raise ValueError("pack dim mismatch")
-        self.weights["w_q"] = np.load(p / "w_q_int8.npy")
-        self.weights["w_k"] = np.load(p / "w_k_int8.npy")
-        self.weights["w_v"] = np.load(p / "w_v_int8.npy")
-        self.weights["dequant_scale"] = np.array([meta["dequant_scale"]], dtype=np.float32)
+        model = load_pack(pack_dir, self.dim, self.kv_dim, self.gemm_kernel, lm_head_chunk=self.lm_head_chunk)
+        self.model = model
+        self.weights = model.weights
+        self.requant = model.layers[0].attn_requant
+        self.num_layers = model.num_layers
+        self.ffn_dim = model.ffn_dim
+        self.vocab_size = model.embedding.vocab_size if model.embedding is not None else 0
+        self.caches = [self.cache] + [self._new_kv_cache() for _ in range(self.num_layers - 1)]
+        self.plan = compile_plan(
+            model,
+            self.dim,
+            self.cache.max_seq,
+            kv_quantized=self.kv_dtype != "float32",
+            attention_kernel=self.attention_kernel,
+            attention_tile=self.attention_tile or self.cfg_k_tile,
+            softmax_lut=self.softmax_lut,
+            prefill_chunk=self.prefill_chunk,
+            num_heads=self.num_heads,
+            num_kv_heads=self.num_kv_heads,
+        )
+        if isinstance(self.plan, StackPlan):
+            self.plan.sampler = self._sample
+
+    def _sample(self, logits: np.ndarray) -> np.ndarray:
+        return sample_tokens(logits, self.rng, self.temperature, self.top_k, self.top_p)
 
     def mmio_write(self, addr: int, value: int) -> None:
         if addr == rm.REG_CONTROL:
@@ -86,22 +171,85 @@ class RtlBackend:
     def mmio_read(self, addr: int) -> int:
         return int(self.regs.get(addr, 0))
 
+    def _layer_gemm_macs(self) -> int:
+        # Attention-only packs have no out-projection or FFN (ffn_dim == 0).
+        out_proj = self.dim * self.dim if self.ffn_dim else 0
+        return self.dim * (self.dim + 2 * self.kv_dim) + out_proj + 2 * self.dim * self.ffn_dim
+
+    def _norm_act_cycles(self, rows: int) -> tuple[int, int]:
+        # Stacked layers: two LayerNorms per layer plus the final one, each a sum/sum-of-squares pass,
+        # an isqrt and a scaling pass over D; GELU is one LUT pass over F per layer.
+        if not self.ffn_dim:
+            return 0, 0
+        d_pass = -(-self.dim // self.vec_lanes)
+        norm = (2 * self.num_layers + 1) * (2 * d_pass + self.rsqrt_latency)
+        act = self.num_layers * -(-self.ffn_dim // self.vec_lanes)
+        return rows * norm, rows * act
+
+    def _lm_head_cycles(self) -> int:
+        # Tied-embedding LM head: one D x V GEMM per generated token, K-tiled like the layer GEMMs.
+        k_tile = max(1, int(self.regs.get(rm.REG_CFG_K_TILE, self.cfg_k_tile)))
+        k_pass = int(np.ceil(self.dim / float(k_tile)))
+        return int(np.ceil(self.dim * self.vocab_size * k_pass / float(self.pe_mac_per_cycle)))
+
+    def _head_waves(self) -> int:
+        return -(-self.num_heads // self.attn_head_lanes)
+
     def _estimate_token_cycles(self, seq_len: int) -> tuple[int, int, int]:
         k_tile = max(1, int(self.regs.get(rm.REG_CFG_K_TILE, self.cfg_k_tile)))
         k_pass = int(np.ceil(self.dim / float(k_tile)))
 
-        # GEMM(q,k,v): 3 * D*D scaled by K-tiling pass count.
-        gemm_macs = 3 * self.dim * self.dim * k_pass
-        attn_macs = 2 * seq_len * self.dim
+        # Per layer GEMM(q,k,v) D*(D + 2*Dkv), out-proj D*D and FFN 2*D*F, scaled by K-tiling pass count.
+        gemm_macs = self._layer_gemm_macs() * k_pass * self.num_layers
+        waves = self._head_waves()
+        attn_macs = waves * 2 * seq_len * (self.dim // self.num_heads) * self.attn_head_lanes * self.num_layers
         mac_cycles = int(np.ceil((gemm_macs + attn_macs) / float(self.pe_mac_per_cycle)))
-        stall_in = max(0, seq_len // 32) + max(0, (8 - min(k_tile, 8)))
+        # KV reads scale with the KV width; each extra head wave re-arms the attention core.
+        kv_rows = seq_len * self.kv_dim // self.dim * self.num_layers
+        stall_in = max(0, kv_rows // 32) + max(0, (8 - min(k_tile, 8))) + (waves - 1) * self.num_layers
         stall_out = 1 if (seq_len % 64 == 0 and seq_len > 0) else 0
-        raw_total = self.token_overhead_cycles + mac_cycles + stall_in + stall_out
+        norm_cycles, act_cycles = self._norm_act_cycles(1)
+        raw_total = self.token_overhead_cycles + mac_cycles + norm_cycles + act_cycles + stall_in + stall_out
+        raw_total += self._lm_head_cycles()
         calibrated = int(round(raw_total * self.cycle_calib_scale + self.cycle_calib_bias))
         total = max(1, calibrated)
         return total, stall_in, stall_out
 
+    def _estimate_prefill_cycles(self, rows: int) -> int:
+        # Prompt rows stream through the GEMM array as chunked matrix passes;
+        # causal attention touches 1 + 2 + ... + rows cached rows.
+        if rows <= 0:
+            return 0
+        k_tile = max(1, int(self.regs.get(rm.REG_CFG_K_TILE, self.cfg_k_tile)))
+        k_pass = int(np.ceil(self.dim / float(k_tile)))
+        chunks = int(np.ceil(rows / float(self.prefill_chunk)))
+
+        gemm_macs = self._layer_gemm_macs() * k_pass * rows * self.num_layers
+        # Each row attends at most the resident rows (sink + window for a ring cache).
+        cap = self.cache.max_seq
+        full = min(rows, cap)
+        waves = self._head_waves()
+        head_width = waves * (self.dim // self.num_heads) * self.attn_head_lanes
+        attn_macs = 2 * head_width * (full * (full + 1) // 2 + (rows - full) * cap) * self.num_layers
+        mac_cycles = int(np.ceil((gemm_macs + attn_macs) / float(self.pe_mac_per_cycle)))
+        kv_rows = rows * self.kv_dim // self.dim * self.num_layers
+        stall_in = chunks * (max(0, kv_rows // 32) + max(0, (8 - min(k_tile, 8))) + (waves - 1) * self.num_layers)
+        raw_total = chunks * self.token_overhead_cycles + mac_cycles + sum(self._norm_act_cycles(rows)) + stall_in
+        calibrated = int(round(raw_total * self.cycle_calib_scale + self.cycle_calib_bias))
+        return max(1, calibrated)
+
     def run(self, prompt_tokens: np.ndarray, gen_len: int) -> np.ndarray:
+        for _ in self._decode(prompt_tokens, gen_len):
+            pass
+        return self.plan.tokens
+
+    def run_stream(self, prompt_tokens: np.ndarray, gen_len: int) -> Iterator[TokenEvent]:
+        # Same run as run(), yielding each token with the registers as they stand after it.
+        for i in self._decode(prompt_tokens, gen_len):
+            yield TokenEvent(i, self.plan.tokens[i], time.perf_counter(), self.poll())
+
+    def _decode(self, prompt_tokens: np.ndarray, gen_len: int) -> Iterator[int]:
+        # Registers advance per token as the cycle model replays each token's kv length.
         try:
             self.mmio_write(rm.REG_CONTROL, rm.CTRL_START)
             self.regs[rm.REG_STATUS] = rm.STATUS_BUSY
@@ -112,40 +260,48 @@ class RtlBackend:
             self.regs[rm.REG_PERF_TOKENS] = 0
             self.regs[rm.REG_PERF_STALL_IN] = 0
             self.regs[rm.REG_PERF_STALL_OUT] = 0
+            self.regs[rm.REG_PERF_PREFILL_CYCLES] = 0
+            self.regs[rm.REG_PERF_ATTN_TILES] = 0
+            self.regs[rm.REG_PERF_NORM_CYCLES] = 0
+            self.regs[rm.REG_PERF_ACT_CYCLES] = 0
+            self.regs[rm.REG_PERF_LM_HEAD_CYCLES] = 0
             self.regs[rm.REG_LAST_ERROR] = 0
 
-            if prompt_tokens.ndim != 2 or prompt_tokens.shape[1] != self.dim:
-                raise ValueError("prompt shape must be [T, D]")
+            prompt_rows = self.model.prompt_rows(prompt_tokens, self.dim)
             if gen_len <= 0:
                 raise ValueError("gen_len must be > 0")
 
-            x_t = prompt_tokens[-1].astype(np.int16)
-            scale = float(self.weights["dequant_scale"][0])
-            outputs: list[np.ndarray] = []
-
-            for _ in range(gen_len):
-                q = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_q"]).reshape(-1).astype(np.float32)
-                k = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_k"]).reshape(-1).astype(np.float32)
-                v = gemm_int8w_int16a_acc32(x_t.reshape(1, -1), self.weights["w_v"]).reshape(-1).astype(np.float32)
+            for cache in self.caches:
+                cache.reset()
+            caches = self.caches if isinstance(self.plan, StackPlan) else self.cache
+            # Tiled attention walks the prefix in cfg_k_tile steps like attention_core.sv.
+            self.plan.attn_tile = self.attention_tile or int(self.regs.get(rm.REG_CFG_K_TILE, self.cfg_k_tile))
+            y = self.plan.prefill(prompt_rows, caches)
 
-                self.cache.append(k, v)
-                k_all, v_all = self.cache.get()
-                y = attention_decode_step(q, k_all, v_all)
-                y_int16 = requantize_int16(np.round(y).astype(np.int32), scale=scale)
-
-                seq_len = int(self.cache.length)
-                cycles, stall_in, stall_out = self._estimate_token_cycles(seq_len)
+            # The last prompt row is charged to the first generated token.
+            rows = int(prompt_tokens.shape[0]) - 1
+            self.regs[rm.REG_PERF_PREFILL_CYCLES] = self._estimate_prefill_cycles(rows)
+            # Uncalibrated vector-unit and LM head shares of the prefill and decode totals.
+            norm_cycles, act_cycles = self._norm_act_cycles(rows)
+            token_norm, token_act = self._norm_act_cycles(1)
+            lm_head_cycles = self._lm_head_cycles()
+            self.token_attn_tiles = []
+            for i in self.plan.stream(caches, y, gen_len):
+                cycles, stall_in, stall_out = self._estimate_token_cycles(int(self.plan.kv_len[i]))
                 self.regs[rm.REG_PERF_CYCLES] += cycles
-                self.regs[rm.REG_PERF_TOKENS] += 1
                 self.regs[rm.REG_PERF_STALL_IN] += stall_in
                 self.regs[rm.REG_PERF_STALL_OUT] += stall_out
-                self.regs[rm.REG_DONE_TOKENS] += 1
-
-                outputs.append(y_int16.copy())
-                x_t = y_int16
+                self.regs[rm.REG_PERF_TOKENS] = i + 1
+                self.regs[rm.REG_DONE_TOKENS] = i + 1
+                tiles = int(self.plan.tiles[i])
+                self.regs[rm.REG_PERF_ATTN_TILES] += tiles
+                self.token_attn_tiles.append(tiles)
+                self.regs[rm.REG_PERF_NORM_CYCLES] = norm_cycles + (i + 1) * token_norm
+                self.regs[rm.REG_PERF_ACT_CYCLES] = act_cycles + (i + 1) * token_act
+                self.regs[rm.REG_PERF_LM_HEAD_CYCLES] = (i + 1) * lm_head_cycles
+                yield i
 
             self.regs[rm.REG_STATUS] = rm.STATUS_DONE
-            return np.stack(outputs, axis=0)
         except Exception as exc:  # noqa: BLE001
             self.last_error = str(exc)
             self.regs[rm.REG_LAST_ERROR] = _pack_error_code(self.last_error)
@@ -163,5 +319,13 @@ class RtlBackend:
             "perf_tokens": self.regs.get(rm.REG_PERF_TOKENS, 0),
             "perf_stall_in": self.regs.get(rm.REG_PERF_STALL_IN, 0),
             "perf_stall_out": self.regs.get(rm.REG_PERF_STALL_OUT, 0),
+            "prefill_cycles": self.regs.get(rm.REG_PERF_PREFILL_CYCLES, 0),
+            "kv_bytes_reserved": sum(cache.nbytes for cache in self.caches),
+            "attn_tiles": self.regs.get(rm.REG_PERF_ATTN_TILES, 0),
+            "norm_cycles": self.regs.get(rm.REG_PERF_NORM_CYCLES, 0),
+            "act_cycles": self.regs.get(rm.REG_PERF_ACT_CYCLES, 0),
+            "lm_head_cycles": self.regs.get(rm.REG_PERF_LM_HEAD_CYCLES, 0),
+            "vocab_size": self.vocab_size,
+            "attn_tiles_per_token": list(self.token_attn_tiles),
             "last_error_code": self.regs.get(rm.REG_LAST_ERROR, 0),
         }
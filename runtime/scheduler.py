@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from runtime.api import BoardlessNpuRuntime
+
+
+@dataclass
+class Request:
+    req_id: int
+    prompt: np.ndarray
+    gen_len: int
+    # Seconds after run() starts at which the request shows up.
+    arrival: float = 0.0
+    kv_blocks: int = 0
+    slo: str = "default"
+    # Seconds after run() starts by which the last token is due.
+    deadline: float = float("inf")
+    seq_id: int = -1
+    # Swap handle while preempted, else -1.
+    swap: int = -1
+    prefilled: int = 0
+    arrival_time: float = 0.0
+    finish_time: float = 0.0
+    tokens: list[np.ndarray] = field(default_factory=list)
+    token_times: list[float] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        return len(self.tokens) >= self.gen_len
+
+
+def latency_percentiles(samples_ms: list[float], qs: tuple[int, ...] = (50, 90, 99)) -> dict[str, float]:
+    if not samples_ms:
+        return {f"p{q}": 0.0 for q in qs}
+    return {f"p{q}": float(v) for q, v in zip(qs, np.percentile(np.asarray(samples_ms), qs))}
+
+
+def latency_report(reqs: list[Request]) -> dict[str, int | dict[str, float]]:
+    ttft = [(r.token_times[0] - r.arrival_time) * 1e3 for r in reqs]
+    itl = [(b - a) * 1e3 for r in reqs for a, b in zip(r.token_times, r.token_times[1:])]
+    e2e = [(r.finish_time - r.arrival_time) * 1e3 for r in reqs]
+    return {
+        "requests": len(reqs),
+        "tokens": sum(len(r.tokens) for r in reqs),
+        "ttft_ms": latency_percentiles(ttft),
+        "itl_ms": latency_percentiles(itl),
+        "e2e_ms": latency_percentiles(e2e),
+    }
+
+
+class ContinuousBatchScheduler:
+    """
+    Iteration-level (continuous) batching over the runtime's step API.
+    Every iteration:
+    - admits arrived requests while the running batch has a free slot and
+      the paged KV pool can hold prompt + gen_len (blocks reserved up front);
+    - spends up to `prefill_budget` prompt rows on sequences still in
+      prefill, in prefill_chunk-aligned pieces so tokens match run() exactly;
+    - advances every sequence that already has a token with one batched
+      decode step;
+    - retires finished sequences at once, freeing their slot and KV blocks.
+    Ordering is FIFO; _next_admission/_prefill_order/_decode_set are the
+    policy hooks.
+    """
+
+    def __init__(self, runtime: BoardlessNpuRuntime, max_batch: int = 8, prefill_budget: int = 0) -> None:
+        if runtime.kv_pool is None:
+            raise ValueError("continuous batching needs a runtime with kv_layout='paged'")
+        self.rt = runtime
+        self.max_batch = max(1, int(max_batch))
+        self.chunk = max(1, int(runtime.config.prefill_chunk))
+        self.prefill_budget = max(1, int(prefill_budget) or self.chunk)
+        self.waiting: list[Request] = []
+        self.running: list[Request] = []
+        self.finished: dict[int, Request] = {}
+        self.iterations = 0
+        self.batch_sizes: list[int] = []
+        self.reserved_blocks = 0
+        self.t_start = 0.0
+        self.t_end = 0.0
+        self._next_id = 0
+
+    def submit(self, prompt: np.ndarray, gen_len: int, arrival: float = 0.0) -> int:
+        return self._enqueue(prompt, gen_len, arrival).req_id
+
+    def _enqueue(self, prompt: np.ndarray, gen_len: int, arrival: float) -> Request:
+        if prompt.ndim != 2 or prompt.shape[0] == 0 or prompt.shape[1] != self.rt.config.dim:
+            raise ValueError("prompt shape must be [T, D]")
+        if gen_len <= 0:
+            raise ValueError("gen_len must be > 0")
+        pool = self.rt.kv_pool
+        # Token 0 comes out of prefill, so gen_len - 1 decode rows follow the prompt.
+        kv_blocks = -(-(int(prompt.shape[0]) + gen_len - 1) // pool.block_size)
+        if kv_blocks > pool.num_blocks:
+            raise ValueError("request does not fit in the kv pool")
+        req = Request(self._next_id, prompt, int(gen_len), float(arrival), kv_blocks)
+        req.arrival_time = self.t_start + req.arrival
+        self._next_id += 1
+        self.waiting.append(req)
+        self.waiting.sort(key=lambda r: r.arrival)
+        return req
+
+    def start(self) -> None:
+        # Starts the clock; arrivals count from here, also for requests submitted later.
+        self.t_start = time.perf_counter()
+        for req in self.waiting:
+            req.arrival_time = self.t_start + req.arrival
+
+    def run(self) -> dict[int, np.ndarray]:
+        # Drains every submitted request; returns req_id -> tokens [gen_len, D].
+        if not self.t_start:
+            self.start()
+        while self.waiting or self.running:
+            if not self.running and self.waiting[0].arrival_time > time.perf_counter():
+                time.sleep(self.waiting[0].arrival_time - time.perf_counter())
+            self.step()
+        self.t_end = time.perf_counter()
+        return {rid: np.stack(req.tokens) for rid, req in sorted(self.finished.items())}
+
+    def cancel(self, req_id: int) -> bool:
+        # Drops a waiting or running request and releases its KV; False once it has finished.
+        for req in self.waiting:
+            if req.req_id == req_id:
+                self.waiting.remove(req)
+                if req.swap >= 0:
+                    self.rt.kv_swap.discard(req.swap)
+                return True
+        for req in self.running:
+            if req.req_id == req_id:
+                self.rt.close_seq(req.seq_id)
+                self.reserved_blocks -= req.kv_blocks
+                self.running.remove(req)
+                return True
+        return False
+
+    def step(self) -> None:
+        self._admit(time.perf_counter())
+        decoding = self._decode_set([req for req in self.running if req.tokens])
+        self._prefill()
+        if decoding:
+            self._decode(decoding)
+        self.iterations += 1
+
+    def _next_admission(self, now: float) -> Request | None:
+        return self.waiting[0] if self.waiting and self.waiting[0].arrival_time <= now else None
+
+    def _prefill_order(self) -> Iterable[Request]:
+        return [r for r in self.running if r.prefilled < r.prompt.shape[0]]
+
+    def _decode_set(self, reqs: list[Request]) -> list[Request]:
+        return reqs
+
+    def _admit(self, now: float) -> None:
+        pool = self.rt.kv_pool
+        while len(self.running) < self.max_batch:
+            req = self._next_admission(now)
+            if req is None or self.reserved_blocks + req.kv_blocks > pool.num_blocks:
+                return
+            self.waiting.remove(req)
+            if req.swap >= 0:
+                req.seq_id, entry = self.rt.swap_in_seq(req.swap)
+                req.swap = -1
+                req.prefilled = entry.state["prefilled"]
+            else:
+                req.seq_id = self.rt.open_seq()
+            self.reserved_blocks += req.kv_blocks
+            self.running.append(req)
+
+    def _prefill(self) -> None:
+        budget = self.prefill_budget
+        for req in self._prefill_order():
+            rows = min(self.chunk, int(req.prompt.shape[0]) - req.prefilled)
+            # The first piece always runs so a budget below prefill_chunk cannot stall prefill.
+            if rows > budget and budget < self.prefill_budget:
+                return
+            end = req.prefilled + rows
+            token = self.rt.prefill_seq(req.seq_id, req.prompt[req.prefilled : end], end == req.prompt.shape[0])
+            req.prefilled = end
+            budget -= rows
+            if token is not None:
+                self._emit(req, token, time.perf_counter())
+            if budget <= 0:
+                return
+
+    def _decode(self, reqs: list[Request]) -> None:
+        out = self.rt.decode_batch([r.seq_id for r in reqs], np.stack([r.tokens[-1] for r in reqs]))
+        now = time.perf_counter()
+        self.batch_sizes.append(len(reqs))
+        for req, token in zip(reqs, out):
+            self._emit(req, token, now)
+
+    def _emit(self, req: Request, token: np.ndarray, now: float) -> None:
+        req.tokens.append(token)
+        req.token_times.append(now)
+        if req.done:
+            req.finish_time = now
+            self.rt.close_seq(req.seq_id)
+            self.reserved_blocks -= req.kv_blocks
+            self.running.remove(req)
+            self.finished[req.req_id] = req
+
+    def report(self) -> dict[str, float | int | dict[str, float]]:
+        elapsed = self.t_end - self.t_start
+        report = latency_report(list(self.finished.values()))
+        return {
+            **report,
+            "elapsed_sec": elapsed,
+            "throughput_tps": report["tokens"] / elapsed if elapsed > 0 else 0.0,
+            "iterations": self.iterations,
+            "mean_decode_batch": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+        }
+
+
+@dataclass
+class SloClass:
+    name: str
+    # Lower runs first.
+    priority: int = 0
+    # Default completion deadline, seconds after arrival.
+    deadline: float = float("inf")
+    # Sustained tokens/s for the whole class (0 = unlimited) and the bucket depth it may burst to.
+    token_rate: float = 0.0
+    burst: int = 8
+
+
+class SloScheduler(ContinuousBatchScheduler):
+    """
+    Continuous batching with SLO classes.
+    - Admission, prefill and decode all go by (class priority, deadline):
+      earliest deadline first within a priority level.
+    - `decode_limit` caps the sequences decoded per iteration, so the
+      ordering decides who decodes next when the batch is oversubscribed.
+    - Each class with a token_rate draws from a token bucket; a class that
+      is out of tokens sits the iteration out. Decode tokens are reserved
+      when the decode set is picked and a prefill's token 0 is only produced
+      while a token is left, so a bucket never goes below zero.
+    - A request misses its deadline when its last token lands after it.
+    - With RuntimeConfig.kv_swap, an arrived request that finds no free slot
+      or KV blocks preempts strictly lower-priority sequences, worst first:
+      their KV blocks move to the swap space and they requeue, resuming
+      exactly where they stopped once admitted again.
+    - A request submitted without `slo` goes to the lowest-priority class.
+    """
+
+    def __init__(
+        self,
+        runtime: BoardlessNpuRuntime,
+        classes: list[SloClass],
+        max_batch: int = 8,
+        decode_limit: int = 0,
+        prefill_budget: int = 0,
+    ) -> None:
+        super().__init__(runtime, max_batch, prefill_budget)
+        if not classes:
+            raise ValueError("at least one SLO class is required")
+        self.classes = {c.name: c for c in classes}
+        if len(self.classes) != len(classes):
+            raise ValueError("duplicate SLO class name")
+        self.decode_limit = max(1, int(decode_limit) or self.max_batch)
+        self.buckets = {c.name: float(c.burst) for c in classes}
+        self.default_slo = max(classes, key=lambda c: c.priority).name
+        self._refilled = 0.0
+        self.preemptions = 0
+
+    def submit(
+        self,
+        prompt: np.ndarray,
+        gen_len: int,
+        arrival: float = 0.0,
+        slo: str | None = None,
+        deadline: float | None = None,
+    ) -> int:
+        slo = self.default_slo if slo is None else slo
+        if slo not in self.classes:
+            raise ValueError(f"unknown SLO class: {slo}")
+        req = self._enqueue(prompt, gen_len, arrival)
+        req.slo = slo
+        req.deadline = req.arrival + self.classes[slo].deadline if deadline is None else float(deadline)
+        return req.req_id
+
+    def _key(self, req: Request) -> tuple[int, float, int]:
+        return self.classes[req.slo].priority, req.deadline, req.req_id
+
+    def _has_tokens(self, req: Request) -> bool:
+        return not self.classes[req.slo].token_rate or self.buckets[req.slo] >= 1.0
+
+    def step(self) -> None:
+        now = time.perf_counter()
+        self._refill(now)
+        done = self._progress()
+        super().step()
+        if self._progress() == done and self.running:
+            # Every runnable class is throttled: wait for the first bucket to refill.
+            time.sleep(self._refill_wait())
+
+    def _progress(self) -> int:
+        return sum(len(r.tokens) for r in self.running + self.waiting) + len(self.finished)
+
+    def _refill(self, now: float) -> None:
+        dt = now - self._refilled if self._refilled else 0.0
+        self._refilled = now
+        for c in self.classes.values():
+            if c.token_rate:
+                self.buckets[c.name] = min(float(c.burst), self.buckets[c.name] + dt * c.token_rate)
+
+    def _refill_wait(self) -> float:
+        throttled = {r.slo for r in self.running if not self._has_tokens(r)}
+        waits = [(1.0 - self.buckets[name]) / self.classes[name].token_rate for name in throttled]
+        return max(0.0, min(waits, default=0.0))
+
+    def _next_admission(self, now: float) -> Request | None:
+        arrived = [r for r in self.waiting if r.arrival_time <= now]
+        return min(arrived, key=self._key, default=None)
+
+    def _admit(self, now: float) -> None:
+        super()._admit(now)
+        if self.rt.kv_swap is None:
+            return
+        while (req := self._next_admission(now)) is not None:
+            victims = self._victims(req)
+            if not victims:
+                return
+            for victim in victims:
+                self._preempt(victim)
+            super()._admit(now)
+
+    def _victims(self, req: Request) -> list[Request]:
+        # Fewest worst-first lower-priority sequences whose eviction makes room for req and fits in the swap space.
+        pool = self.rt.kv_pool
+        need_slot = len(self.running) >= self.max_batch
+        need_blocks = self.reserved_blocks + req.kv_blocks - pool.num_blocks
+        free = self.rt.kv_swap.allocator.num_free
+        priority = self.classes[req.slo].priority
+        victims = []
+        for r in sorted(self.running, key=self._key, reverse=True):
+            if not need_slot and need_blocks <= 0:
+                break
+            used = len(pool.block_tables[r.seq_id])
+            if self.classes[r.slo].priority <= priority:
+                break
+            if used > free:
+                continue
+            victims.append(r)
+            free -= used
+            need_slot = False
+            need_blocks -= r.kv_blocks
+        return victims if not need_slot and need_blocks <= 0 else []
+
+    def _preempt(self, req: Request) -> None:
+        req.swap = self.rt.swap_out_seq(req.seq_id, {"prefilled": req.prefilled})
+        req.seq_id = -1
+        self.reserved_blocks -= req.kv_blocks
+        self.running.remove(req)
+        self.waiting.append(req)
+        self.waiting.sort(key=lambda r: r.arrival)
+        self.preemptions += 1
+
+    def _prefill_order(self) -> Iterator[Request]:
+        # Checked as each request comes up: an earlier prefill in this iteration may have spent the last token.
+        for req in sorted(super()._prefill_order(), key=self._key):
+            if self._has_tokens(req):
+                yield req
+
+    def _decode_set(self, reqs: list[Request]) -> list[Request]:
+        # Debits the buckets up front, so prefill this iteration only sees what decode leaves.
+        picked = []
+        for req in sorted(reqs, key=self._key):
+            if len(picked) == self.decode_limit:
+                break
+            if self.classes[req.slo].token_rate:
+                if self.buckets[req.slo] < 1.0:
+                    continue
+                self.buckets[req.slo] -= 1.0
+            picked.append(req)
+        return picked
+
+    def _emit(self, req: Request, token: np.ndarray, now: float) -> None:
+        # Token 0 comes out of prefill; decode tokens were paid for in _decode_set.
+        if not req.tokens and self.classes[req.slo].token_rate:
+            self.buckets[req.slo] -= 1.0
+        super()._emit(req, token, now)
+
+    def report(self) -> dict:
+        report = super().report()
+        misses = {name: 0 for name in self.classes}
+        for r in self.finished.values():
+            misses[r.slo] += r.finish_time > self.t_start + r.deadline
+        per_class = {}
+        for name in self.classes:
+            reqs = [r for r in self.finished.values() if r.slo == name]
+            per_class[name] = {
+                **latency_report(reqs),
+                "deadline_misses": misses[name],
+                "deadline_miss_rate": misses[name] / len(reqs) if reqs else 0.0,
+            }
+        return {
+            **report,
+            "deadline_misses": sum(misses.values()),
+            "preemptions": self.preemptions,
+            "classes": per_class,
+        }
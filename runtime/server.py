@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, suppress
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+import numpy as np
+
+from runtime.api import BoardlessNpuRuntime
+from runtime.scheduler import ContinuousBatchScheduler, Request
+from runtime.stream import TokenEvent
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+@dataclass
+class ServerConfig:
+    host: str = "127.0.0.1"
+    # 0 -> any free port; the bound address ends up in InferenceServer.address.
+    port: int = 0
+    # Unix socket path; when set it replaces host/port.
+    path: str = ""
+    # How long an idle server holds the first request so the ones right behind it share its first step.
+    window_ms: float = 2.0
+    max_batch: int = 8
+    prefill_budget: int = 0
+    # Tokens a client may fall behind before its sequence stops decoding.
+    stream_buffer: int = 4
+    # Requests in flight; further generate calls wait for a slot.
+    max_inflight: int = 64
+
+
+@dataclass(eq=False)
+class _Stream:
+    prompt: np.ndarray
+    gen_len: int
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    req: Request | None = None
+    sent: int = 0
+
+
+class _StreamScheduler(ContinuousBatchScheduler):
+    # Sequences in `held` (their client is stream_buffer tokens behind) sit out decode.
+    def __init__(self, runtime: BoardlessNpuRuntime, max_batch: int, prefill_budget: int) -> None:
+        super().__init__(runtime, max_batch, prefill_budget)
+        self.held: set[int] = set()
+
+    def _decode_set(self, reqs: list[Request]) -> list[Request]:
+        return [r for r in reqs if r.req_id not in self.held]
+
+
+class InferenceServer:
+    """
+    Stdlib asyncio front end over one BoardlessNpuRuntime.
+    - HTTP/1.1 on localhost TCP or a Unix socket:
+      POST /generate {"prompt": [[...]], "gen_len": n} streams one NDJSON
+      line per token (chunked), GET /health reports queue depth.
+    - A single-worker executor owns the runtime and runs continuous
+      batching steps; requests arriving while the server is idle wait
+      `window_ms` so they are micro-batched into the same first step.
+    - Backpressure: a stream whose client is `stream_buffer` tokens behind
+      is held out of decode (its KV stays resident) until the client reads;
+      writes await drain(), so a slow socket holds its own sequence only.
+    """
+
+    def __init__(self, runtime: BoardlessNpuRuntime, config: ServerConfig | None = None) -> None:
+        self.rt = runtime
+        self.config = config or ServerConfig()
+        if self.config.stream_buffer < 1 or self.config.max_inflight < 1:
+            raise ValueError("stream_buffer and max_inflight must be >= 1")
+        self.sched = _StreamScheduler(runtime, self.config.max_batch, self.config.prefill_budget)
+        self.address: str | tuple[str, int] | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="npu-runtime")
+        self._pending: list[_Stream] = []
+        self._active: list[_Stream] = []
+        self._cancelled: list[_Stream] = []
+        self._server: asyncio.Server | None = None
+        self._loop_task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.config.max_inflight)
+        self.sched.start()
+        self._loop_task = asyncio.create_task(self._batch_loop())
+        if self.config.path:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.config.path)
+            self.address = self.config.path
+        else:
+            self._server = await asyncio.start_server(self._handle, self.config.host, self.config.port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._loop_task
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> InferenceServer:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    def report(self) -> dict:
+        self.sched.t_end = time.perf_counter()
+        return self.sched.report()
+
+    async def generate(self, prompt: np.ndarray, gen_len: int) -> AsyncIterator[TokenEvent]:
+        # In-process client: the same queueing, batching and backpressure as POST /generate.
+        if gen_len <= 0:
+            raise ValueError("gen_len must be > 0")
+        async with self._slots:
+            stream = _Stream(prompt, int(gen_len))
+            self._pending.append(stream)
+            self._wake.set()
+            try:
+                for _ in range(stream.gen_len):
+                    item = await stream.queue.get()
+                    # A consumed token may un-hold the sequence.
+                    self._wake.set()
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                if stream.req is None or not stream.req.done:
+                    self._cancelled.append(stream)
+                    self._wake.set()
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending and not self._active:
+                self._wake.clear()
+                await self._wake.wait()
+                await asyncio.sleep(self.config.window_ms / 1e3)
+            self._wake.clear()
+            self._drop_cancelled()
+            self._admit_pending()
+            if not self._active:
+                continue
+            buf = self.config.stream_buffer
+            self.sched.held = {s.req.req_id for s in self._active if s.queue.qsize() >= buf}
+            before = self._progress()
+            try:
+                await loop.run_in_executor(self._executor, self.sched.step)
+            except Exception as exc:
+                self._fail_active(exc)
+                continue
+            stalled = self._progress() == before
+            self._flush()
+            if stalled:
+                # Every sequence is held or waiting on KV blocks: sleep until a client reads, joins or leaves.
+                await self._wake.wait()
+
+    def _admit_pending(self) -> None:
+        now = time.perf_counter() - self.sched.t_start
+        for stream in self._pending:
+            try:
+                rid = self.sched.submit(stream.prompt, stream.gen_len, arrival=now)
+            except ValueError as exc:
+                stream.queue.put_nowait(exc)
+                continue
+            stream.req = next(r for r in self.sched.waiting if r.req_id == rid)
+            self._active.append(stream)
+        self._pending.clear()
+
+    def _drop_cancelled(self) -> None:
+        for stream in self._cancelled:
+            if stream in self._pending:
+                self._pending.remove(stream)
+            elif stream in self._active:
+                self.sched.cancel(stream.req.req_id)
+                self._active.remove(stream)
+        self._cancelled.clear()
+
+    def _progress(self) -> int:
+        return sum(len(s.req.tokens) + s.req.prefilled for s in self._active)
+
+    def _flush(self) -> None:
+        perf = self.rt.poll()
+        for stream in list(self._active):
+            req = stream.req
+            for i in range(stream.sent, len(req.tokens)):
+                stream.queue.put_nowait(TokenEvent(i, req.tokens[i], req.token_times[i], perf))
+            stream.sent = len(req.tokens)
+            if req.done:
+                self._active.remove(stream)
+
+    def _fail_active(self, exc: Exception) -> None:
+        for stream in self._active:
+            self.sched.cancel(stream.req.req_id)
+            stream.queue.put_nowait(exc)
+        self._active.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, target, body = await _read_request(reader)
+            if method == "GET" and target == "/health":
+                health = {
+                    "pending": len(self._pending),
+                    "active": len(self._active),
+                    "held": len(self.sched.held),
+                    "done_tokens": int(self.rt.poll()["done_tokens"]),
+                }
+                await _respond(writer, 200, health)
+            elif method == "POST" and target == "/generate":
+                await self._generate_http(body, writer)
+            else:
+                await _respond(writer, 404, {"error": f"no route for {method} {target}"})
+        # Only errors raised before a status line get here; _generate_http reports later ones in the body.
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as exc:
+            with suppress(ConnectionError):
+                await _respond(writer, 400, {"error": str(exc) or "bad request"})
+        except ConnectionError:
+            pass
+        except Exception as exc:  # noqa: BLE001
+            with suppress(ConnectionError):
+                await _respond(writer, 500, {"error": f"{type(exc).__name__}: {exc}"})
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _generate_http(self, body: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            req = json.loads(body)
+            prompt = np.asarray(req["prompt"], dtype=np.int16)
+            gen_len = int(req["gen_len"])
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"bad generate request: {exc}") from exc
+        async with aclosing(self.generate(prompt, gen_len)) as events:
+            # The first token (or the validation error) decides the status line.
+            first = await anext(events)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+            )
+            event = first
+            try:
+                while event is not None:
+                    _write_chunk(writer, {"index": event.index, "token": np.asarray(event.token).tolist()})
+                    await writer.drain()
+                    event = await anext(events, None)
+            except ConnectionError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                # The 200 is already out: the error becomes the stream's last line.
+                _write_chunk(writer, {"error": f"{type(exc).__name__}: {exc}"})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    parts = head[0].split(" ")
+    if len(parts) != 3:
+        raise ValueError("malformed request line")
+    headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(":") for h in head[1:] if h)}
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return parts[0], parts[1], body
+
+
+def _write_chunk(writer: asyncio.StreamWriter, payload: dict) -> None:
+    line = json.dumps(payload).encode() + b"\n"
+    writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+
+
+async def stream_generate(
+    prompt: np.ndarray, gen_len: int, host: str = "127.0.0.1", port: int = 0, path: str = ""
+) -> AsyncIterator[dict]:
+    # Minimal client for POST /generate: yields {"index", "token"} per streamed line.
+    # Raises ValueError on 4xx, RuntimeError on 5xx or an error line in the stream.
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps({"prompt": np.asarray(prompt).tolist(), "gen_len": int(gen_len)}).encode()
+        writer.write(
+            f"POST /generate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = head[0].split(" ")[1]
+        if status != "200":
+            raise (ValueError if status.startswith("4") else RuntimeError)(json.loads(await reader.read())["error"])
+        while size := int((await reader.readuntil(b"\r\n"))[:-2], 16):
+            line = json.loads((await reader.readexactly(size + 2))[:-2])
+            if "error" in line:
+                raise RuntimeError(line["error"])
+            yield line
+        await reader.readuntil(b"\r\n")
+    finally:
+        writer.close()
+        with suppress(ConnectionError):
+            await writer.wait_closed()
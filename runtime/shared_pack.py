@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+from dataclasses import fields
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from runtime.model import DecoderLayer, PackedModel, TokenEmbedding
+
+# Segment offsets are rounded up to this so every view starts cache-line aligned.
+_ALIGN = 64
+# Applied to spawned workers only: one BLAS thread per process, the pool supplies the parallelism.
+_BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+class _ShmRef(int):
+    # Index of an array in SharedPack.spec["layout"].
+    pass
+
+
+class SharedPack:
+    """
+    A packed model copied once into one multiprocessing.shared_memory segment.
+    - `spec` is a small picklable description: meta, requant tuples and
+      (offset, shape, dtype) for every weight array; arrays referenced twice
+      (fused QKV, tied embedding) are stored once.
+    - attach() rebuilds the PackedModel in another process as read-only
+      zero-copy views; only per-process scratch (LM head buffer) is private.
+    """
+
+    def __init__(self, model: PackedModel) -> None:
+        arrays: list[np.ndarray] = []
+        index: dict[int, int] = {}
+
+        def ref(a):
+            if not isinstance(a, np.ndarray):
+                return a
+            if id(a) not in index:
+                index[id(a)] = len(arrays)
+                arrays.append(a)
+            return _ShmRef(index[id(a)])
+
+        head = model.embedding
+        self.spec = {
+            "meta": model.meta,
+            "act_frac_bits": model.act_frac_bits,
+            "ffn_dim": model.ffn_dim,
+            "weights": {name: ref(a) for name, a in model.weights.items()},
+            "layers": [{f.name: ref(getattr(layer, f.name)) for f in fields(DecoderLayer)} for layer in model.layers],
+            "embedding": None
+            if head is None
+            else (ref(head.table), head.embed_requant, head.logit_scale, head.chunk),
+        }
+        layout, offset = [], 0
+        for a in arrays:
+            layout.append((offset, a.shape, a.dtype.str))
+            offset += -(-a.nbytes // _ALIGN) * _ALIGN
+        self.nbytes = offset
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        for a, (off, shape, dtype) in zip(arrays, layout):
+            np.ndarray(shape, dtype, buffer=self.shm.buf, offset=off)[...] = a
+        self.spec["layout"] = layout
+        self.spec["name"] = self.shm.name
+
+    @staticmethod
+    def attach(spec: dict) -> tuple[shared_memory.SharedMemory, PackedModel]:
+        # Keep the returned segment open for as long as the model is in use.
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        views = []
+        for off, shape, dtype in spec["layout"]:
+            view = np.ndarray(shape, dtype, buffer=shm.buf, offset=off)
+            view.flags.writeable = False
+            views.append(view)
+
+        def deref(v):
+            return views[v] if isinstance(v, _ShmRef) else v
+
+        embedding = None
+        if spec["embedding"] is not None:
+            table, embed_requant, logit_scale, chunk = spec["embedding"]
+            embedding = TokenEmbedding(deref(table), embed_requant, logit_scale, chunk)
+        model = PackedModel(
+            spec["meta"],
+            {name: deref(v) for name, v in spec["weights"].items()},
+            [DecoderLayer(**{k: deref(v) for k, v in layer.items()}) for layer in spec["layers"]],
+            act_frac_bits=spec["act_frac_bits"],
+            ffn_dim=spec["ffn_dim"],
+            embedding=embedding,
+        )
+        return shm, model
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def start_single_threaded(procs: list) -> None:
+    # Spawned children inherit the environment at start(); restore the parent's afterwards.
+    saved = {k: os.environ.get(k) for k in _BLAS_ENV}
+    os.environ.update({k: "1" for k in _BLAS_ENV})
+    try:
+        for proc in procs:
+            proc.start()
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class TokenEvent:
+    """
+    One token yielded by run_stream().
+    - token: int16 hidden row [D], or the sampled id for packs with a vocabulary.
+    - timestamp: time.perf_counter() seconds when the token was ready.
+    - perf: poll() snapshot taken right after the token's counters were updated.
+    """
+
+    index: int
+    token: np.ndarray | int
+    timestamp: float
+    perf: dict
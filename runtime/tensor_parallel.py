@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from runtime.model import PackedModel
+from runtime.np_kernels import gelu_int16, gemm_int16a_packed_acc32, requantize_fixed_int16
+from runtime.shared_pack import _ALIGN, SharedPack, start_single_threaded
+
+TP_OPS = ("qkv", "out", "ffn")
+
+
+def check_tp_layout(meta: dict, kv_dim: int) -> dict:
+    # meta["tensor_parallel"] as written by sw/pack_weights.py --tp-shards.
+    layout = meta.get("tensor_parallel")
+    if not layout:
+        raise ValueError("pack has no tensor_parallel layout (sw/pack_weights.py --tp-shards)")
+    shards, dim = int(layout["shards"]), int(meta["dim"])
+    widths = {"qkv_cols": dim + 2 * kv_dim, "o_rows": dim, "ffn_cols": int(meta["ffn_dim"])}
+    for key, width in widths.items():
+        b = layout[key]
+        if len(b) != shards + 1 or b[0] != 0 or b[-1] != width or any(lo >= hi for lo, hi in zip(b, b[1:])):
+            raise ValueError(f"tensor_parallel {key} must split [0, {width}) into {shards} non-empty ranges")
+    return layout
+
+
+def _act_offsets(max_rows: int, dim: int, qkv_width: int, shards: int) -> tuple[int, int, int]:
+    # (qkv offset, partial offset, total bytes), each buffer starting on an _ALIGN boundary.
+    def up(n: int) -> int:
+        return -(-n // _ALIGN) * _ALIGN
+
+    qkv_off = up(max_rows * dim * 2)
+    partial_off = up(qkv_off + max_rows * qkv_width * 4)
+    return qkv_off, partial_off, partial_off + shards * max_rows * dim * 4
+
+
+def _act_views(buf, max_rows: int, dim: int, qkv_width: int, shards: int) -> tuple[np.ndarray, ...]:
+    # x: GEMM input rows; qkv: column shards land side by side (all-gather); partial: one slot per shard (reduce).
+    qkv_off, partial_off, _ = _act_offsets(max_rows, dim, qkv_width, shards)
+    x = np.ndarray((max_rows, dim), np.int16, buffer=buf)
+    qkv = np.ndarray((max_rows, qkv_width), np.int32, buffer=buf, offset=qkv_off)
+    partial = np.ndarray((shards, max_rows, dim), np.int32, buffer=buf, offset=partial_off)
+    return x, qkv, partial
+
+
+def _shard_main(rank: int, spec: dict, layout: dict, act_name: str, dims: tuple[int, ...], conn) -> None:
+    shm, model = SharedPack.attach(spec)
+    act = shared_memory.SharedMemory(name=act_name)
+    x, qkv, partial = _act_views(act.buf, *dims)
+    q0, q1 = layout["qkv_cols"][rank : rank + 2]
+    o0, o1 = layout["o_rows"][rank : rank + 2]
+    f0, f1 = layout["ffn_cols"][rank : rank + 2]
+    # Row shards are zero-copy views of the shared weights; column shards are copied once to be contiguous.
+    w_qkv = [np.ascontiguousarray(layer.w_qkv[:, q0:q1]) for layer in model.layers]
+    w_o = [layer.w_o[o0:o1] for layer in model.layers]
+    w_up = [np.ascontiguousarray(layer.w_up[:, f0:f1]) for layer in model.layers]
+    w_down = [layer.w_down[f0:f1] for layer in model.layers]
+    conn.send("ready")
+    while (msg := conn.recv()) is not None:
+        op, li, rows = msg
+        t0 = time.perf_counter()
+        try:
+            if op == "qkv":
+                qkv[:rows, q0:q1] = gemm_int16a_packed_acc32(x[:rows], w_qkv[li])
+            elif op == "out":
+                partial[rank, :rows] = gemm_int16a_packed_acc32(x[:rows, o0:o1], w_o[li])
+            else:
+                layer = model.layers[li]
+                h = requantize_fixed_int16(gemm_int16a_packed_acc32(x[:rows], w_up[li]), *layer.up_requant)
+                h = gelu_int16(h, model.act_frac_bits)
+                partial[rank, :rows] = gemm_int16a_packed_acc32(h, w_down[li])
+        except Exception as exc:  # noqa: BLE001
+            conn.send(f"{type(exc).__name__}: {exc}")
+            continue
+        conn.send(time.perf_counter() - t0)
+
+
+def _shutdown(conns, procs, pack: SharedPack, act: shared_memory.SharedMemory) -> None:
+    for conn in conns:
+        try:
+            conn.send(None)
+        except OSError:
+            pass
+    for proc in procs:
+        if proc.pid is None:
+            continue
+        proc.join(timeout=10)
+        if proc.is_alive():
+            proc.terminate()
+    pack.close()
+    act.close()
+    act.unlink()
+
+
+class TensorParallelGroup:
+    """
+    Shards a stacked model's GEMMs across local processes, following the
+    layout in the pack's meta["tensor_parallel"].
+    - QKV: column shards; each writes its columns of one shared output
+      buffer, so the all-gather is the buffer itself.
+    - Out-projection: row shards over the attention output; partial sums
+      are reduced here.
+    - FFN: w_up column shards fused with the matching w_down row shards
+      (requant + GELU are per column), so the whole FFN is one reduce.
+    - int32-wrapped partials sum to the same wrapped total, so outputs are
+      bit-exact against the single-process plan.
+    - report() splits every op's wall time into the slowest shard's compute
+      and the exchange (dispatch, copies, reduce) around it.
+    """
+
+    def __init__(self, model: PackedModel, kv_dim: int, max_rows: int) -> None:
+        if not model.stacked:
+            raise ValueError("tensor parallel needs a stacked pack")
+        layout = check_tp_layout(model.meta, kv_dim)
+        self.shards = int(layout["shards"])
+        self.max_rows = int(max_rows)
+        dim = int(model.meta["dim"])
+        self.dims = (self.max_rows, dim, dim + 2 * kv_dim, self.shards)
+        self.pack = SharedPack(model)
+        try:
+            self.act = shared_memory.SharedMemory(create=True, size=_act_offsets(*self.dims)[2])
+        except BaseException:
+            self.pack.close()
+            raise
+        self.x, self.qkv_buf, self.partial = _act_views(self.act.buf, *self.dims)
+        self.conns: list = []
+        self.procs: list = []
+        # Registered before any shard starts, so a failed start cannot leak the segments or the children.
+        self._finalizer = weakref.finalize(self, _shutdown, self.conns, self.procs, self.pack, self.act)
+        try:
+            ctx = mp.get_context("spawn")
+            pipes = [ctx.Pipe() for _ in range(self.shards)]
+            self.conns.extend(parent for parent, _ in pipes)
+            self.procs.extend(
+                ctx.Process(
+                    target=_shard_main,
+                    args=(rank, self.pack.spec, layout, self.act.name, self.dims, child),
+                    daemon=True,
+                )
+                for rank, (_, child) in enumerate(pipes)
+            )
+            start_single_threaded(self.procs)
+            for _, child in pipes:
+                # Only the shard holds its end, so a dead shard shows up as EOFError here.
+                child.close()
+            self._recv_all()
+        except BaseException:
+            self.close()
+            raise
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.calls = {op: 0 for op in TP_OPS}
+        self.wall_sec = {op: 0.0 for op in TP_OPS}
+        self.critical_sec = {op: 0.0 for op in TP_OPS}
+        self.shard_sec = [{op: 0.0 for op in TP_OPS} for _ in range(self.shards)]
+
+    def _recv(self, conn):
+        try:
+            msg = conn.recv()
+        except EOFError:
+            raise RuntimeError("tensor-parallel shard exited") from None
+        if isinstance(msg, str) and msg != "ready":
+            raise RuntimeError(f"tensor-parallel shard failed: {msg}")
+        return msg
+
+    def _recv_all(self) -> list:
+        # Every shard's reply is read before raising, so the pipes stay in step for the next op.
+        replies, error = [], None
+        for conn in self.conns:
+            try:
+                replies.append(self._recv(conn))
+            except RuntimeError as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+        return replies
+
+    def _run(self, op: str, li: int, a: np.ndarray) -> int:
+        rows = int(a.shape[0])
+        if rows > self.max_rows:
+            raise ValueError(f"tensor-parallel GEMM of {rows} rows exceeds max_rows={self.max_rows}")
+        t0 = time.perf_counter()
+        self.x[:rows] = a
+        for conn in self.conns:
+            conn.send((op, li, rows))
+        sec = self._recv_all()
+        self.wall_sec[op] += time.perf_counter() - t0
+        self.critical_sec[op] += max(sec)
+        self.calls[op] += 1
+        for stats, s in zip(self.shard_sec, sec):
+            stats[op] += s
+        return rows
+
+    def _reduce(self, op: str, rows: int) -> np.ndarray:
+        # Sum of the shards' int32-wrapped partials, wrapped again: equal to the unsharded int32 GEMM.
+        t0 = time.perf_counter()
+        out = self.partial[:, :rows].sum(axis=0, dtype=np.int64).astype(np.int32)
+        self.wall_sec[op] += time.perf_counter() - t0
+        return out
+
+    def qkv(self, li: int, a: np.ndarray) -> np.ndarray:
+        # int16 [M, D] -> int32-wrapped [M, D + 2 Dkv], gathered from the column shards.
+        rows = self._run("qkv", li, a)
+        t0 = time.perf_counter()
+        out = self.qkv_buf[:rows].copy()
+        self.wall_sec["qkv"] += time.perf_counter() - t0
+        return out
+
+    def out_proj(self, li: int, ctx: np.ndarray) -> np.ndarray:
+        return self._reduce("out", self._run("out", li, ctx))
+
+    def ffn(self, li: int, x_norm: np.ndarray) -> np.ndarray:
+        # The pre-requant W_down sums of GELU(W_up x): int32-wrapped [M, D].
+        return self._reduce("ffn", self._run("ffn", li, x_norm))
+
+    def report(self) -> dict:
+        ops = {
+            op: {
+                "calls": self.calls[op],
+                "wall_sec": self.wall_sec[op],
+                "critical_compute_sec": self.critical_sec[op],
+                "exchange_sec": max(0.0, self.wall_sec[op] - self.critical_sec[op]),
+            }
+            for op in TP_OPS
+        }
+        wall = sum(self.wall_sec.values())
+        critical = sum(self.critical_sec.values())
+        return {
+            "shards": self.shards,
+            "ops": ops,
+            "shard_compute_sec": [sum(s.values()) for s in self.shard_sec],
+            "shard_op_sec": self.shard_sec,
+            "wall_sec": wall,
+            "exchange_sec": max(0.0, wall - critical),
+            "exchange_fraction": max(0.0, wall - critical) / wall if wall > 0 else 0.0,
+        }
+
+    def close(self) -> None:
+        # The buffer views must go before the segment can be closed.
+        self.x = self.qkv_buf = self.partial = None
+        self._finalizer()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import queue
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.shared_pack import SharedPack, start_single_threaded
+
+
+def process_memory_kb() -> dict[str, int]:
+    # Linux smaps_rollup: Pss splits shared pages across the processes mapping them; {} elsewhere.
+    try:
+        text = Path("/proc/self/smaps_rollup").read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    kb = {line.split(":")[0]: int(line.split()[1]) for line in text.splitlines()[1:] if line.endswith("kB")}
+    return {
+        "rss_kb": kb.get("Rss", 0),
+        "pss_kb": kb.get("Pss", 0),
+        "shared_kb": kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0),
+        "private_kb": kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0),
+    }
+
+
+def _worker_main(idx: int, config: RuntimeConfig, spec: dict, cpu: int | None, inbox, outbox) -> None:
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    shm, model = SharedPack.attach(spec)
+    rt = BoardlessNpuRuntime(config)
+    rt.init()
+    rt.load_model(model)
+    outbox.put(("ready", idx, None, None))
+    while (msg := inbox.get()) is not None:
+        kind, job = msg[:2]
+        if kind == "mem":
+            outbox.put((job, idx, process_memory_kb(), None))
+            continue
+        try:
+            outbox.put((job, idx, rt.run(*msg[2:]), None))
+        except Exception as exc:  # noqa: BLE001
+            outbox.put((job, idx, None, f"{type(exc).__name__}: {exc}"))
+    del rt, model
+    shm.close()
+
+
+def _shutdown(inboxes, procs, pack: SharedPack) -> None:
+    for inbox in inboxes:
+        inbox.put(None)
+    for proc in procs:
+        if proc.pid is None:
+            continue
+        proc.join(timeout=10)
+        if proc.is_alive():
+            proc.terminate()
+    pack.close()
+
+
+class RuntimeWorkerPool:
+    """
+    N BoardlessNpuRuntime processes over one shared copy of the weights.
+    - The parent loads and packs the pack once into a SharedPack; spawned
+      workers attach read-only views, so weight memory does not grow with N.
+    - submit() goes to the least-loaded worker by outstanding token work
+      (prompt rows + gen_len); map() keeps `depth` jobs per worker in flight
+      and refills as results return, so mixed lengths still balance.
+    - pin_cpus pins worker i to CPU cpus[i % len(cpus)] (Linux
+      sched_setaffinity; ignored where unavailable).
+    """
+
+    def __init__(
+        self,
+        config: RuntimeConfig,
+        pack_dir: Path | str,
+        num_workers: int = 0,
+        pin_cpus: bool | list[int] = False,
+    ) -> None:
+        if config.backend != "numpy":
+            raise ValueError("the worker pool runs the numpy backend")
+        parent = BoardlessNpuRuntime(config)
+        parent.init()
+        parent.load(pack_dir)
+        self.pack = SharedPack(parent.model)
+        del parent
+        self.num_workers = max(1, int(num_workers) or os.cpu_count() or 1)
+        cpus = None
+        if pin_cpus:
+            if pin_cpus is True:
+                cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [None]
+            else:
+                cpus = list(pin_cpus)
+        self.cpus = [cpus[i % len(cpus)] if cpus else None for i in range(self.num_workers)]
+        ctx = mp.get_context("spawn")
+        self._outbox = ctx.Queue()
+        self._inboxes = [ctx.Queue() for _ in range(self.num_workers)]
+        self.pending_work = [0] * self.num_workers
+        self.jobs_done = [0] * self.num_workers
+        self._jobs: dict[int, tuple[int, int]] = {}
+        self._results: dict[int, tuple[object, str | None]] = {}
+        self._next_job = 0
+        self.procs = [
+            ctx.Process(
+                target=_worker_main,
+                args=(i, config, self.pack.spec, self.cpus[i], self._inboxes[i], self._outbox),
+                daemon=True,
+            )
+            for i in range(self.num_workers)
+        ]
+        self._finalizer = weakref.finalize(self, _shutdown, self._inboxes, self.procs, self.pack)
+        try:
+            start_single_threaded(self.procs)
+            for _ in range(self.num_workers):
+                kind, idx, _, _ = self._recv()
+                if kind != "ready":
+                    raise RuntimeError(f"worker {idx} failed to start")
+        except BaseException:
+            # The started workers and the shared segment must not outlive a failed pool.
+            self.close()
+            raise
+
+    def _recv(self) -> tuple:
+        while True:
+            try:
+                return self._outbox.get(timeout=1.0)
+            except queue.Empty:
+                dead = [i for i, p in enumerate(self.procs) if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"runtime worker {dead[0]} exited with code {self.procs[dead[0]].exitcode}")
+
+    def submit(self, prompt: np.ndarray, gen_len: int) -> int:
+        work = int(prompt.shape[0]) + int(gen_len)
+        idx = min(range(self.num_workers), key=lambda i: (self.pending_work[i], i))
+        job = self._next_job
+        self._next_job += 1
+        self._jobs[job] = (idx, work)
+        self.pending_work[idx] += work
+        self._inboxes[idx].put(("run", job, prompt, gen_len))
+        return job
+
+    def result(self, job: int) -> np.ndarray:
+        while job not in self._results:
+            self._collect()
+        out, err = self._results.pop(job)
+        if err is not None:
+            raise RuntimeError(err)
+        return out
+
+    def _collect(self) -> int:
+        job, idx, out, err = self._recv()
+        _, work = self._jobs.pop(job)
+        self.pending_work[idx] -= work
+        self.jobs_done[idx] += work > 0
+        self._results[job] = (out, err)
+        return job
+
+    def map(self, reqs: list[tuple[np.ndarray, int]], depth: int = 2) -> list[np.ndarray]:
+        # Outputs in request order.
+        todo = list(enumerate(reqs))[::-1]
+        order: dict[int, int] = {}
+        outs: list[np.ndarray | None] = [None] * len(reqs)
+        while todo or order:
+            while todo and len(self._jobs) < depth * self.num_workers:
+                i, (prompt, gen_len) = todo.pop()
+                order[self.submit(prompt, gen_len)] = i
+            job = self._collect()
+            if job in order:
+                outs[order.pop(job)] = self.result(job)
+        return outs
+
+    def memory(self) -> list[dict[str, int]]:
+        # process_memory_kb() of every worker.
+        jobs = []
+        for idx, inbox in enumerate(self._inboxes):
+            job = self._next_job
+            self._next_job += 1
+            self._jobs[job] = (idx, 0)
+            inbox.put(("mem", job))
+            jobs.append(job)
+        return [self.result(job) for job in jobs]
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> RuntimeWorkerPool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
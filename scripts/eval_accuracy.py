@@ -14,6 +14,7 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from runtime.np_kernels import KVCache, attention_decode_step
 from tests.golden.golden_attention import scaled_dot_product_attention, softmax_approx, softmax_exact
 from tests.golden.golden_ops import clamp_int8, clamp_int16
 
@@ -25,6 +26,8 @@ class AccuracyMetrics:
     attention_mae: float
     attention_max_abs: float
     quant_gemm_rel_l2: float
+    kv_int16_attention_rel_mae: float
+    kv_int8_attention_rel_mae: float
 
 
 def _softmax_metrics(rng: np.random.Generator, cases: int, dim: int) -> tuple[float, float]:
@@ -73,17 +76,39 @@ def _quant_gemm_metric(rng: np.random.Generator, cases: int, m: int, k: int, n:
     return float(np.mean(rel_l2))
 
 
+def _kv_storage_metric(rng: np.random.Generator, cases: int, seq: int, dim: int, kv_dtype: str) -> float:
+    # Decode attention over a reduced-precision KV cache vs the float32 cache.
+    rel = []
+    for _ in range(cases):
+        q = rng.normal(size=(dim,)).astype(np.float32)
+        k = rng.normal(size=(seq, dim)).astype(np.float32)
+        v = rng.normal(scale=1000.0, size=(seq, dim)).astype(np.float32)
+        ref_cache = KVCache(max_seq=seq, dim=dim)
+        q_cache = KVCache(max_seq=seq, dim=dim, kv_dtype=kv_dtype)
+        ref_cache.extend(k, v)
+        q_cache.extend(k, v)
+        ref = attention_decode_step(q, *ref_cache.get())
+        out = attention_decode_step(q, *q_cache.get(), *q_cache.get_scales())
+        # Normalize by the value magnitude: random prefixes average toward zero.
+        rel.append(float(np.mean(np.abs(out - ref)) / (np.mean(np.abs(v)) + 1e-9)))
+    return float(np.mean(rel))
+
+
 def run_eval(seed: int, cases: int) -> AccuracyMetrics:
     rng = np.random.default_rng(seed)
     softmax_mae, softmax_max_abs = _softmax_metrics(rng, cases=cases, dim=16)
     attention_mae, attention_max_abs = _attention_metrics(rng, cases=cases, seq=16, dim=16)
     quant_gemm_rel_l2 = _quant_gemm_metric(rng, cases=cases, m=8, k=16, n=8)
+    kv_int16 = _kv_storage_metric(rng, cases=cases, seq=64, dim=16, kv_dtype="int16")
+    kv_int8 = _kv_storage_metric(rng, cases=cases, seq=64, dim=16, kv_dtype="int8")
     return AccuracyMetrics(
         softmax_mae=softmax_mae,
         softmax_max_abs=softmax_max_abs,
         attention_mae=attention_mae,
         attention_max_abs=attention_max_abs,
         quant_gemm_rel_l2=quant_gemm_rel_l2,
+        kv_int16_attention_rel_mae=kv_int16,
+        kv_int8_attention_rel_mae=kv_int8,
     )
 
 
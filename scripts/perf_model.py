@@ -13,6 +13,8 @@ class PerfInput:
     pe_mac_per_cycle: int
     clock_mhz: float
     efficiency: float
+    # Tied-embedding LM head (hidden x vocab per token); 0 leaves it out.
+    vocab: int = 0
 
 
 @dataclass
@@ -25,7 +27,7 @@ class PerfOutput:
 
 def estimate(inp: PerfInput) -> PerfOutput:
     # Approximation used in docs/spec.md.
-    mac_per_token = inp.layers * ((12 * (inp.hidden**2)) + (2 * inp.hidden * inp.seq))
+    mac_per_token = inp.layers * ((12 * (inp.hidden**2)) + (2 * inp.hidden * inp.seq)) + inp.hidden * inp.vocab
     peak_mac_per_sec = inp.pe_mac_per_cycle * inp.clock_mhz * 1e6
     ideal_tokens_per_sec = peak_mac_per_sec / mac_per_token
     effective_tokens_per_sec = ideal_tokens_per_sec * inp.efficiency
@@ -46,6 +48,7 @@ def main() -> int:
     parser.add_argument("--pe-mac-per-cycle", type=int, default=256)
     parser.add_argument("--clock-mhz", type=float, default=200.0)
     parser.add_argument("--efficiency", type=float, default=0.15)
+    parser.add_argument("--vocab", type=int, default=0, help="LM head vocabulary size (0 = decoder stack only)")
     args = parser.parse_args()
 
     inp = PerfInput(
@@ -55,6 +58,7 @@ def main() -> int:
         pe_mac_per_cycle=args.pe_mac_per_cycle,
         clock_mhz=args.clock_mhz,
         efficiency=args.efficiency,
+        vocab=args.vocab,
     )
     out = estimate(inp)
 
@@ -23,25 +23,33 @@ def _ensure_flow_assets() -> None:
     subprocess.run(["python", "scripts/run_sw_hw_flow.py"], cwd=ROOT, check=True)
 
 
-def _measure_cpu_runtime(prompt_len: int, gen_len: int, warmup: int, repeats: int) -> tuple[float, float]:
-    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=256))
+def _measure_cpu_runtime(
+    prompt_len: int, gen_len: int, warmup: int, repeats: int, batch_size: int = 1, softmax_mode: str = "exact"
+) -> tuple[float, float]:
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=256, softmax_mode=softmax_mode))
     rt.init()
     rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
 
     prompt = np.ones((prompt_len, 16), dtype=np.int16)
 
+    def _once() -> None:
+        if batch_size > 1:
+            _ = rt.run_batch([prompt] * batch_size, gen_len=gen_len)
+        else:
+            _ = rt.run(prompt_tokens=prompt, gen_len=gen_len)
+
     for _ in range(warmup):
-        _ = rt.run(prompt_tokens=prompt, gen_len=gen_len)
+        _once()
 
     times: list[float] = []
     for _ in range(repeats):
         t0 = time.perf_counter()
-        _ = rt.run(prompt_tokens=prompt, gen_len=gen_len)
+        _once()
         t1 = time.perf_counter()
         times.append(t1 - t0)
 
     avg_s = float(np.mean(times))
-    throughput = gen_len / avg_s
+    throughput = (batch_size * gen_len) / avg_s
     latency_ms = (avg_s / gen_len) * 1000.0
     return latency_ms, throughput
 
@@ -53,6 +61,10 @@ def main() -> int:
     parser.add_argument("--gen-len", type=int, default=32)
     parser.add_argument("--warmup", type=int, default=1)
     parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1, help="Sequences decoded together via run_batch")
+    parser.add_argument(
+        "--softmax-mode", choices=["exact", "lut"], default="exact", help="lut = hardware piecewise exp table"
+    )
     parser.add_argument("--cpu-power-w", type=float, default=65.0, help="Assumed CPU package power for energy/token estimate")
     args = parser.parse_args()
 
@@ -64,6 +76,8 @@ def main() -> int:
         gen_len=args.gen_len,
         warmup=args.warmup,
         repeats=args.repeats,
+        batch_size=args.batch_size,
+        softmax_mode=args.softmax_mode,
     )
     energy_per_token = args.cpu_power_w / throughput if throughput > 0 else float("nan")
 
@@ -75,6 +89,7 @@ def main() -> int:
             pe_mac_per_cycle=256,
             clock_mhz=200.0,
             efficiency=0.15,
+            vocab=50257,
         )
     )
     fpga_tps = perf.effective_tokens_per_sec
@@ -116,7 +131,7 @@ def main() -> int:
                 "numpy_runtime_api",
                 args.prompt_len,
                 args.gen_len,
-                1,
+                args.batch_size,
                 f"{latency_ms:.6f}",
                 f"{throughput:.6f}",
                 f"{args.cpu_power_w:.2f}",
@@ -161,6 +176,8 @@ def main() -> int:
                 f"- gen_len: {args.gen_len}",
                 f"- warmup: {args.warmup}",
                 f"- repeats: {args.repeats}",
+                f"- batch_size: {args.batch_size}",
+                f"- softmax_mode: {args.softmax_mode}",
             ]
         )
         + "\n",
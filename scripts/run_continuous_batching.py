@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.scheduler import ContinuousBatchScheduler, SloClass, SloScheduler, latency_percentiles, latency_report
+
+
+def _runtime(args: argparse.Namespace) -> BoardlessNpuRuntime:
+    rt = BoardlessNpuRuntime(
+        RuntimeConfig(
+            dim=16,
+            max_seq=256,
+            kv_layout="paged",
+            kv_block_size=16,
+            kv_num_blocks=args.kv_num_blocks,
+            prefill_chunk=args.prefill_chunk,
+        )
+    )
+    rt.init()
+    rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+    return rt
+
+
+def _run_sequential(
+    rt: BoardlessNpuRuntime, reqs: list[tuple[np.ndarray, int, float]]
+) -> tuple[list[np.ndarray], dict]:
+    # One run_stream() at a time in arrival order; the same TTFT/ITL bookkeeping as the scheduler.
+    outs, ttft, itl = [], [], []
+    t_start = time.perf_counter()
+    for prompt, gen_len, arrival in reqs:
+        arrival_time = t_start + arrival
+        if arrival_time > time.perf_counter():
+            time.sleep(arrival_time - time.perf_counter())
+        events = list(rt.run_stream(prompt, gen_len))
+        outs.append(np.stack([e.token for e in events]))
+        ttft.append((events[0].timestamp - arrival_time) * 1e3)
+        itl += [(b.timestamp - a.timestamp) * 1e3 for a, b in zip(events, events[1:])]
+    elapsed = time.perf_counter() - t_start
+    tokens = sum(int(o.shape[0]) for o in outs)
+    report = {
+        "requests": len(reqs),
+        "tokens": tokens,
+        "elapsed_sec": elapsed,
+        "throughput_tps": tokens / elapsed if elapsed > 0 else 0.0,
+        "ttft_ms": latency_percentiles(ttft),
+        "itl_ms": latency_percentiles(itl),
+    }
+    return outs, report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare one-at-a-time runs with continuous batching.")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--prefill-chunk", type=int, default=32)
+    parser.add_argument("--kv-num-blocks", type=int, default=0, help="0 -> max_seq / block size per batch slot")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="Poisson arrivals per second; 0 = all at t=0")
+    parser.add_argument("--chat-every", type=int, default=4, help="Every Nth request is interactive (SLO class chat)")
+    parser.add_argument("--chat-deadline-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=ROOT / "results" / "continuous_batching_result.json")
+    args = parser.parse_args()
+
+    subprocess.run(["python", "scripts/run_sw_hw_flow.py"], cwd=ROOT, check=True)
+    if not args.kv_num_blocks:
+        args.kv_num_blocks = args.max_batch * 256 // 16
+
+    rng = np.random.default_rng(args.seed)
+    gaps = np.zeros(args.requests)
+    if args.arrival_rate > 0:
+        gaps = rng.exponential(1.0 / args.arrival_rate, size=args.requests)
+    arrivals = np.cumsum(gaps) - gaps[0]
+    reqs = [
+        (
+            rng.integers(-64, 64, size=(int(rng.integers(4, 97)), 16)).astype(np.int16),
+            int(rng.integers(8, 97)),
+            float(arrivals[i]),
+        )
+        for i in range(args.requests)
+    ]
+
+    seq_outs, sequential = _run_sequential(_runtime(args), reqs)
+
+    sched = ContinuousBatchScheduler(_runtime(args), max_batch=args.max_batch)
+    for prompt, gen_len, arrival in reqs:
+        sched.submit(prompt, gen_len, arrival)
+    cont_outs = sched.run()
+    continuous = sched.report()
+    chat = {i for i in range(args.requests) if i % args.chat_every == 0}
+    continuous["classes"] = {
+        name: latency_report([r for r in sched.finished.values() if (r.req_id in chat) == (name == "chat")])
+        for name in ("chat", "batch")
+    }
+
+    # Same traffic with chat ahead of batch work, EDF inside each class.
+    classes = [SloClass("chat", priority=0, deadline=args.chat_deadline_ms / 1e3), SloClass("batch", priority=1)]
+    slo_sched = SloScheduler(_runtime(args), classes, max_batch=args.max_batch)
+    for i, (prompt, gen_len, arrival) in enumerate(reqs):
+        slo_sched.submit(prompt, gen_len, arrival, slo="chat" if i in chat else "batch")
+    slo_outs = slo_sched.run()
+
+    result = {
+        "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "requests": args.requests,
+        "max_batch": args.max_batch,
+        "prefill_chunk": args.prefill_chunk,
+        "arrival_rate": args.arrival_rate,
+        "outputs_match": all(
+            np.array_equal(seq_outs[i], cont_outs[i]) and np.array_equal(seq_outs[i], slo_outs[i])
+            for i in range(args.requests)
+        ),
+        "sequential": sequential,
+        "continuous": continuous,
+        "slo": slo_sched.report(),
+        "throughput_speedup": continuous["throughput_tps"] / sequential["throughput_tps"],
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(
+        f"continuous batching: {continuous['throughput_tps']:.1f} tok/s vs sequential "
+        f"{sequential['throughput_tps']:.1f} tok/s ({result['throughput_speedup']:.2f}x) -> {args.out}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import json
 import subprocess
 import sys
@@ -18,12 +19,31 @@ from runtime.api import BoardlessNpuRuntime, RuntimeConfig
 
 
 def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the NumPy runtime on a distilgpt2-scale decoder stack.")
+    parser.add_argument("--layers", type=int, default=6, help="Decoder layers; matches perf_model.py --layers")
+    parser.add_argument("--vocab", type=int, default=50257, help="Tied embedding/LM head size (GPT-2 vocabulary)")
+    args = parser.parse_args()
+
     dim = 768
-    asset = ROOT / "sw" / "artifacts" / "distilgpt2_proxy"
-    packed = ROOT / "sw" / "artifacts" / "distilgpt2_proxy_packed"
+    # Full decoder blocks (QKV, out-proj, 4x FFN) so per-token work matches perf_model's 12*hidden^2 per layer.
+    asset = ROOT / "sw" / "artifacts" / f"distilgpt2_proxy_l{args.layers}"
+    packed = ROOT / "sw" / "artifacts" / f"distilgpt2_proxy_l{args.layers}_packed"
 
     subprocess.run(
-        ["python", "sw/create_tiny_decoder_assets.py", "--dim", str(dim), "--seed", "42", "--outdir", str(asset)],
+        [
+            "python",
+            "sw/create_tiny_decoder_assets.py",
+            "--dim",
+            str(dim),
+            "--seed",
+            "42",
+            "--layers",
+            str(args.layers),
+            "--vocab-size",
+            str(args.vocab),
+            "--outdir",
+            str(asset),
+        ],
         cwd=ROOT,
         check=True,
     )
@@ -37,7 +57,8 @@ def main() -> int:
     rt.init()
     rt.load(packed)
 
-    prompt = np.ones((8, dim), dtype=np.int16)
+    # Token ids in, sampled token ids out: embedding lookup and LM head are part of the timed run.
+    prompt = np.arange(8, dtype=np.int64)
     t0 = time.perf_counter()
     out = rt.run(prompt_tokens=prompt, gen_len=2)
     t1 = time.perf_counter()
@@ -47,6 +68,8 @@ def main() -> int:
     result = {
         "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
         "dim": dim,
+        "num_layers": args.layers,
+        "vocab_size": args.vocab,
         "prompt_shape": list(prompt.shape),
         "output_shape": list(out.shape),
         "elapsed_sec": elapsed,
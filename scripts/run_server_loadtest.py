@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.scheduler import latency_percentiles
+from runtime.server import InferenceServer, ServerConfig, stream_generate
+
+
+def _runtime(args: argparse.Namespace) -> BoardlessNpuRuntime:
+    rt = BoardlessNpuRuntime(
+        RuntimeConfig(dim=16, max_seq=256, kv_layout="paged", kv_block_size=16, prefill_chunk=args.prefill_chunk)
+    )
+    rt.init()
+    rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+    return rt
+
+
+async def _client(
+    where: dict, prompt: np.ndarray, gen_len: int, delay: float, gate: asyncio.Semaphore, read_delay: float
+) -> tuple[np.ndarray, list[float]]:
+    # Returns the tokens and [send, first token, ..., last token] perf_counter stamps.
+    await asyncio.sleep(delay)
+    async with gate:
+        stamps = [time.perf_counter()]
+        tokens = []
+        async for line in stream_generate(prompt, gen_len, **where):
+            stamps.append(time.perf_counter())
+            tokens.append(line["token"])
+            if read_delay:
+                await asyncio.sleep(read_delay)
+    return np.asarray(tokens, dtype=np.int16), stamps
+
+
+async def _loadtest(args: argparse.Namespace, reqs: list[tuple[np.ndarray, int, float]]) -> dict:
+    cfg = ServerConfig(
+        port=args.port,
+        path=args.unix,
+        window_ms=args.window_ms,
+        max_batch=args.max_batch,
+        stream_buffer=args.stream_buffer,
+    )
+    async with InferenceServer(_runtime(args), cfg) as srv:
+        if args.serve:
+            print(f"serving on {srv.address}", flush=True)
+            await srv.serve_forever()
+        where = {"path": srv.address} if args.unix else {"host": srv.address[0], "port": srv.address[1]}
+        gate = asyncio.Semaphore(args.concurrency)
+        # Every Nth client reads slowly; backpressure holds only its own sequence.
+        t0 = time.perf_counter()
+        slow = args.slow_read_ms / 1e3
+        results = await asyncio.gather(
+            *[
+                _client(where, p, g, a, gate, slow if args.slow_every and i % args.slow_every == 0 else 0.0)
+                for i, (p, g, a) in enumerate(reqs)
+            ]
+        )
+        elapsed = time.perf_counter() - t0
+        server = srv.report()
+    tokens = sum(int(out.shape[0]) for out, _ in results)
+    client = {
+        "requests": len(reqs),
+        "tokens": tokens,
+        "elapsed_sec": elapsed,
+        "throughput_tps": tokens / elapsed if elapsed > 0 else 0.0,
+        "ttft_ms": latency_percentiles([(s[1] - s[0]) * 1e3 for _, s in results]),
+        "itl_ms": latency_percentiles([(b - a) * 1e3 for _, s in results for a, b in zip(s[1:], s[2:])]),
+    }
+    return {"outputs": [out for out, _ in results], "client": client, "server": server}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive the asyncio inference server with concurrent local clients.")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--prefill-chunk", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--stream-buffer", type=int, default=4)
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="Poisson arrivals per second; 0 = all at t=0")
+    parser.add_argument("--slow-every", type=int, default=0, help="Every Nth client sleeps between reads")
+    parser.add_argument("--slow-read-ms", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--unix", default="", help="Serve on this Unix socket path instead of localhost TCP")
+    parser.add_argument("--serve", action="store_true", help="Only serve, for an external load generator")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=ROOT / "results" / "server_loadtest_result.json")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    gaps = np.zeros(args.requests)
+    if args.arrival_rate > 0:
+        gaps = rng.exponential(1.0 / args.arrival_rate, size=args.requests)
+    arrivals = np.cumsum(gaps) - gaps[0]
+    reqs = [
+        (
+            rng.integers(-64, 64, size=(int(rng.integers(4, 97)), 16)).astype(np.int16),
+            int(rng.integers(8, 97)),
+            float(arrivals[i]),
+        )
+        for i in range(args.requests)
+    ]
+
+    run = asyncio.run(_loadtest(args, reqs))
+    ref = _runtime(args)
+    result = {
+        "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "transport": "unix" if args.unix else "tcp",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "max_batch": args.max_batch,
+        "window_ms": args.window_ms,
+        "stream_buffer": args.stream_buffer,
+        "outputs_match": all(np.array_equal(ref.run(p, g), out) for (p, g, _), out in zip(reqs, run["outputs"])),
+        "client": run["client"],
+        "server": run["server"],
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    c = result["client"]
+    print(
+        f"server loadtest: {c['throughput_tps']:.1f} tok/s, TTFT p50 {c['ttft_ms']['p50']:.2f} ms "
+        f"(outputs_match={result['outputs_match']}) -> {args.out}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
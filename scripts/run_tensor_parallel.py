@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Single-process vs tensor-parallel decode on a stacked proxy model.")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--prompt-len", type=int, default=16)
+    parser.add_argument("--gen-len", type=int, default=16)
+    parser.add_argument("--out", type=Path, default=ROOT / "results" / "tensor_parallel_result.json")
+    args = parser.parse_args()
+
+    asset = ROOT / "sw" / "artifacts" / f"tp_proxy_d{args.dim}_l{args.layers}"
+    packed = ROOT / "sw" / "artifacts" / f"tp_proxy_d{args.dim}_l{args.layers}_tp{args.shards}_packed"
+    subprocess.run(
+        [
+            "python",
+            "sw/create_tiny_decoder_assets.py",
+            "--dim",
+            str(args.dim),
+            "--layers",
+            str(args.layers),
+            "--outdir",
+            str(asset),
+        ],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(
+        ["python", "sw/pack_weights.py", "--indir", str(asset), "--outdir", str(packed)]
+        + ["--tp-shards", str(args.shards)],
+        cwd=ROOT,
+        check=True,
+    )
+
+    prompt = np.random.default_rng(0).integers(-64, 64, size=(args.prompt_len, args.dim)).astype(np.int16)
+    runs = {}
+    outs = {}
+    for mode, tp in (("single", False), ("tensor_parallel", True)):
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=args.dim, max_seq=256, tensor_parallel=tp))
+        rt.init()
+        rt.load(packed)
+        rt.run(prompt, 2)  # warm-up: first-touch page faults in the shards
+        if rt.tp is not None:
+            rt.tp.reset_stats()
+        t0 = time.perf_counter()
+        outs[mode] = rt.run(prompt, args.gen_len)
+        elapsed = time.perf_counter() - t0
+        runs[mode] = {"elapsed_sec": elapsed, "tokens_per_sec": args.gen_len / elapsed if elapsed > 0 else 0.0}
+        if rt.tp is not None:
+            runs[mode]["tp"] = rt.tp.report()
+            rt.tp.close()
+
+    result = {
+        "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "dim": args.dim,
+        "layers": args.layers,
+        "shards": args.shards,
+        "prompt_len": args.prompt_len,
+        "gen_len": args.gen_len,
+        "outputs_match": bool(np.array_equal(outs["single"], outs["tensor_parallel"])),
+        "runs": runs,
+        "speedup": runs["single"]["elapsed_sec"] / runs["tensor_parallel"]["elapsed_sec"],
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    tp = runs["tensor_parallel"]["tp"]
+    print(
+        f"tensor parallel x{args.shards}: {result['speedup']:.2f}x vs single process, "
+        f"exchange {100 * tp['exchange_fraction']:.1f}% of sharded GEMM time "
+        f"(outputs_match={result['outputs_match']}) -> {args.out}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
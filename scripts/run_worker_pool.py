@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.worker_pool import RuntimeWorkerPool
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Throughput and memory of N runtime workers over shared weights.")
+    parser.add_argument("--pack", type=Path, default=ROOT / "sw/artifacts/distilgpt2_proxy_packed")
+    parser.add_argument("--workers", default="", help="Comma-separated worker counts; default 1,2,4,... up to the CPUs")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--pin-cpus", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=ROOT / "results" / "worker_pool_result.json")
+    args = parser.parse_args()
+
+    dim = int(json.loads((args.pack / "meta.json").read_text(encoding="utf-8"))["dim"])
+    cfg = RuntimeConfig(dim=dim, max_seq=128)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else []
+    n = 1
+    while not counts and n <= cpus:
+        counts.append(n)
+        n *= 2
+    counts = counts or [1]
+    if counts[-1] != cpus and not args.workers:
+        counts.append(cpus)
+
+    rng = np.random.default_rng(args.seed)
+    reqs = [
+        (rng.integers(-64, 64, size=(int(rng.integers(4, 33)), dim)).astype(np.int16), int(rng.integers(8, 33)))
+        for _ in range(args.requests)
+    ]
+    ref = BoardlessNpuRuntime(cfg)
+    ref.init()
+    ref.load(args.pack)
+    expected = [ref.run(p, g) for p, g in reqs]
+    del ref
+    tokens = sum(g for _, g in reqs)
+
+    runs = []
+    for workers in counts:
+        with RuntimeWorkerPool(cfg, args.pack, num_workers=workers, pin_cpus=args.pin_cpus) as pool:
+            pool.map(reqs[: workers])  # warm-up: first-touch page faults and BLAS init
+            t0 = time.perf_counter()
+            outs = pool.map(reqs)
+            elapsed = time.perf_counter() - t0
+            mem = pool.memory()
+            runs.append(
+                {
+                    "workers": workers,
+                    "elapsed_sec": elapsed,
+                    "throughput_tps": tokens / elapsed if elapsed > 0 else 0.0,
+                    "outputs_match": all(np.array_equal(a, b) for a, b in zip(outs, expected)),
+                    "jobs_per_worker": pool.jobs_done,
+                    "shared_weight_bytes": pool.pack.nbytes,
+                    # Pss counts the shared segment once across all workers.
+                    "workers_pss_kb": sum(m.get("pss_kb", 0) for m in mem),
+                    "workers_rss_kb": sum(m.get("rss_kb", 0) for m in mem),
+                    "private_copy_weight_kb": workers * pool.pack.nbytes // 1024,
+                }
+            )
+    base = runs[0]["throughput_tps"]
+    for run in runs:
+        run["speedup"] = run["throughput_tps"] / base if base > 0 else 0.0
+
+    result = {
+        "timestamp_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "pack": str(args.pack.relative_to(ROOT) if args.pack.is_relative_to(ROOT) else args.pack),
+        "cpus": cpus,
+        "requests": args.requests,
+        "tokens": tokens,
+        "runs": runs,
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    for run in runs:
+        print(
+            f"workers={run['workers']}: {run['throughput_tps']:.1f} tok/s ({run['speedup']:.2f}x), "
+            f"worker Pss {run['workers_pss_kb'] / 1024:.1f} MiB, match={run['outputs_match']}"
+        )
+    print(f"-> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -16,20 +16,90 @@ def quantize_int8(w: np.ndarray) -> tuple[np.ndarray, float]:
     return q, dequant_scale
 
 
+def write_stacked_layers(
+    rng: np.random.Generator, outdir: Path, dim: int, kv_dim: int, layers: int, ffn_dim: int
+) -> list[dict]:
+    # Pre-norm decoder layers; weights ~ N(0, 1/fan_in) keep the int16 residual stream in range.
+    # Each GEMM stage requantizes with its own weight's dequant scale.
+    shapes = {
+        "w_q": ((dim, dim), None),
+        "w_k": ((dim, kv_dim), None),
+        "w_v": ((dim, kv_dim), "attn"),
+        "w_o": ((dim, dim), "out"),
+        "w_up": ((dim, ffn_dim), "up"),
+        "w_down": ((ffn_dim, dim), "down"),
+    }
+    entries = []
+    for i in range(layers):
+        stages = {}
+        for name, (shape, stage) in shapes.items():
+            w_f = rng.normal(loc=0.0, scale=1.0 / np.sqrt(shape[0]), size=shape).astype(np.float32)
+            w_i8, dequant_scale = quantize_int8(w_f)
+            np.save(outdir / f"layer{i}_{name}_int8.npy", w_i8)
+            if stage is not None:
+                stages[stage] = {"dequant_scale": float(dequant_scale)}
+        entries.append(stages)
+    return entries
+
+
+def write_embedding(rng: np.random.Generator, outdir: Path, vocab: int, dim: int, frac_bits: int) -> dict:
+    # Tied token table [V, D]: embed() requantizes int8 rows into Q(frac_bits) activations and the LM head
+    # turns exact int dot products against the same rows into real-valued logits.
+    e_i8, s_e = quantize_int8(rng.standard_normal(size=(vocab, dim), dtype=np.float32))
+    np.save(outdir / "embedding_int8.npy", e_i8)
+    return {
+        "vocab_size": vocab,
+        "embed": {"dequant_scale": float(s_e * 2**frac_bits)},
+        "logit_scale": float(s_e / 2**frac_bits),
+    }
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Create tiny decoder weights for boardless SW-HW flow.")
     parser.add_argument("--dim", type=int, default=16)
     parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--num-heads", type=int, default=1)
+    parser.add_argument("--num-kv-heads", type=int, default=0, help="0 -> same as --num-heads; fewer -> GQA/MQA")
+    parser.add_argument("--layers", type=int, default=0, help="0 -> legacy single attention-only layer")
+    parser.add_argument("--ffn-mult", type=int, default=4)
+    parser.add_argument("--act-frac-bits", type=int, default=6, help="Q-format of int16 activations in stacked packs")
+    parser.add_argument("--vocab-size", type=int, default=0, help="Tied embedding/LM head rows (stacked packs only)")
     parser.add_argument("--outdir", type=Path, default=Path("sw/artifacts/tiny_decoder"))
     args = parser.parse_args()
 
+    num_kv_heads = args.num_kv_heads or args.num_heads
+    if args.dim % args.num_heads or args.num_heads % num_kv_heads:
+        raise ValueError("dim must divide into num_heads, and num_heads into num_kv_heads")
+    if args.vocab_size and args.layers <= 0:
+        raise ValueError("--vocab-size requires --layers > 0")
+    kv_dim = args.dim // args.num_heads * num_kv_heads
+
     rng = np.random.default_rng(args.seed)
     outdir = args.outdir
     outdir.mkdir(parents=True, exist_ok=True)
 
+    if args.layers > 0:
+        ffn_dim = args.ffn_mult * args.dim
+        meta = {
+            "dim": args.dim,
+            "seed": args.seed,
+            "num_heads": args.num_heads,
+            "num_kv_heads": num_kv_heads,
+            "num_layers": args.layers,
+            "ffn_dim": ffn_dim,
+            "act_frac_bits": args.act_frac_bits,
+            "layers": write_stacked_layers(rng, outdir, args.dim, kv_dim, args.layers, ffn_dim),
+            "format": "int8_weight_npy",
+        }
+        if args.vocab_size:
+            meta.update(write_embedding(rng, outdir, args.vocab_size, args.dim, args.act_frac_bits))
+        (outdir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        print(f"created {args.layers}-layer decoder assets at {outdir}")
+        return 0
+
     w_q_f = rng.normal(loc=0.0, scale=0.5, size=(args.dim, args.dim)).astype(np.float32)
-    w_k_f = rng.normal(loc=0.0, scale=0.5, size=(args.dim, args.dim)).astype(np.float32)
-    w_v_f = rng.normal(loc=0.0, scale=0.5, size=(args.dim, args.dim)).astype(np.float32)
+    w_k_f = rng.normal(loc=0.0, scale=0.5, size=(args.dim, kv_dim)).astype(np.float32)
+    w_v_f = rng.normal(loc=0.0, scale=0.5, size=(args.dim, kv_dim)).astype(np.float32)
 
     w_q_i8, s_q = quantize_int8(w_q_f)
     w_k_i8, s_k = quantize_int8(w_k_f)
@@ -45,6 +115,8 @@ def main() -> int:
     meta = {
         "dim": args.dim,
         "seed": args.seed,
+        "num_heads": args.num_heads,
+        "num_kv_heads": num_kv_heads,
         "dequant_scale": dequant_scale,
         "format": "int8_weight_npy",
     }
@@ -3,12 +3,19 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 from pathlib import Path
 
 import numpy as np
 import onnx
 from onnx import numpy_helper
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.np_kernels import requant_meta
+
 
 def _quant_int8(w: np.ndarray) -> tuple[np.ndarray, float]:
     max_abs = float(np.max(np.abs(w)))
@@ -42,6 +49,7 @@ def main() -> int:
 
     dequant_scale = float((s_q + s_k + s_v) / 3.0)
     meta = {"dim": int(w_q.shape[0]), "dequant_scale": dequant_scale, "source": str(args.onnx)}
+    meta.update(requant_meta(dequant_scale))
     (out / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
 
     packed = np.concatenate([w_q_i8.reshape(-1), w_k_i8.reshape(-1), w_v_i8.reshape(-1)])
@@ -3,15 +3,66 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 from pathlib import Path
 
 import numpy as np
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from runtime.np_kernels import requant_meta
+
+
+def _shard_bounds(width: int, shards: int) -> list[int]:
+    return [i * width // shards for i in range(shards + 1)]
+
+
+def _tensor_parallel_layout(meta: dict, kv_dim: int, shards: int) -> dict:
+    # Column shards of the fused QKV and w_up, row shards of w_o and w_down; w_down rows follow the w_up columns.
+    dim, ffn_dim = int(meta["dim"]), int(meta["ffn_dim"])
+    if not 1 <= shards <= min(dim, ffn_dim):
+        raise ValueError(f"tp shards must be in [1, {min(dim, ffn_dim)}]")
+    return {
+        "shards": shards,
+        "qkv_cols": _shard_bounds(dim + 2 * kv_dim, shards),
+        "o_rows": _shard_bounds(dim, shards),
+        "ffn_cols": _shard_bounds(ffn_dim, shards),
+    }
+
+
+def _pack_stacked(meta: dict, indir: Path, outdir: Path, tp_shards: int = 0) -> int:
+    # Per-layer files keep their names; the flat binary holds them layer by layer.
+    parts = []
+    for i, stages in enumerate(meta["layers"]):
+        for stage in stages.values():
+            stage.update(requant_meta(float(stage["dequant_scale"])))
+        for name in ("w_q", "w_k", "w_v", "w_o", "w_up", "w_down"):
+            w = np.load(indir / f"layer{i}_{name}_int8.npy")
+            np.save(outdir / f"layer{i}_{name}_int8.npy", w)
+            parts.append(w.reshape(-1).astype(np.int8))
+    if "vocab_size" in meta:
+        meta["embed"].update(requant_meta(float(meta["embed"]["dequant_scale"])))
+        table = np.load(indir / "embedding_int8.npy")
+        np.save(outdir / "embedding_int8.npy", table)
+        parts.append(table.reshape(-1).astype(np.int8))
+    if tp_shards:
+        kv_dim = np.load(indir / "layer0_w_k_int8.npy").shape[1]
+        meta["tensor_parallel"] = _tensor_parallel_layout(meta, kv_dim, tp_shards)
+    packed = np.concatenate(parts)
+    (outdir / "weights_int8.bin").write_bytes(packed.tobytes())
+    (outdir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    print(f"packed {packed.size} int8 values ({meta['num_layers']} layers) into {outdir / 'weights_int8.bin'}")
+    return 0
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Pack int8 weights into a flat binary file.")
     parser.add_argument("--indir", type=Path, default=Path("sw/artifacts/tiny_decoder"))
     parser.add_argument("--outdir", type=Path, default=Path("sw/artifacts/tiny_decoder_packed"))
+    parser.add_argument("--tp-shards", type=int, default=0, help="Record a tensor-parallel layout (stacked packs)")
     args = parser.parse_args()
 
     indir = args.indir
@@ -19,6 +70,11 @@ def main() -> int:
     outdir.mkdir(parents=True, exist_ok=True)
 
     meta = json.loads((indir / "meta.json").read_text(encoding="utf-8"))
+    if "num_layers" in meta:
+        return _pack_stacked(meta, indir, outdir, args.tp_shards)
+    if args.tp_shards:
+        raise ValueError("--tp-shards needs a stacked pack (QKV + out-projection + FFN per layer)")
+    meta.update(requant_meta(float(meta["dequant_scale"])))
     w_q = np.load(indir / "w_q_int8.npy")
     w_k = np.load(indir / "w_k_int8.npy")
     w_v = np.load(indir / "w_v_int8.npy")
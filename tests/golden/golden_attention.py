@@ -10,14 +10,18 @@ def softmax_exact(x: np.ndarray, axis: int = -1) -> np.ndarray:
     return exp / denom
 
 
+_EXP_LUT_X = np.linspace(-8.0, 0.0, 257, dtype=np.float32)
+_EXP_LUT_Y = np.exp(_EXP_LUT_X)
+
+
 def exp_approx_piecewise(x: np.ndarray) -> np.ndarray:
     """
     LUT-based linear interpolation for exp(x) on [-8, 0].
     For x > 0 clamp to 0, for x < -8 clamp to -8.
     """
     x_clip = np.clip(x, -8.0, 0.0)
-    lut_x = np.linspace(-8.0, 0.0, 257, dtype=np.float32)
-    lut_y = np.exp(lut_x)
+    lut_x = _EXP_LUT_X
+    lut_y = _EXP_LUT_Y
     pos = ((x_clip + 8.0) / 8.0) * (len(lut_x) - 1)
     idx0 = np.floor(pos).astype(np.int32)
     idx1 = np.clip(idx0 + 1, 0, len(lut_x) - 1)
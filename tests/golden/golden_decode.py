@@ -4,7 +4,7 @@ import numpy as np
 
 from tests.golden.golden_attention import scaled_dot_product_attention
 from tests.golden.golden_kvcache import KVCache
-from tests.golden.golden_ops import gemm_int8w_int16a_acc32, requantize_to_int16
+from tests.golden.golden_ops import gemm_int8w_int16a_acc32, requantize_fixed_point_int16, requantize_to_int16
 
 
 def decode_step_reference(
@@ -15,10 +15,13 @@ def decode_step_reference(
     cache: KVCache,
     scale_num: int = 1,
     scale_den: int = 1,
+    requant: tuple[int, int, str] | None = None,
 ) -> np.ndarray:
     """
     Single-token decode reference for one head group collapsed to [D].
     This is a lightweight MVP function for boardless tests.
+    requant = (multiplier, shift, rounding) selects the fixed-point
+    requantization the runtime and RTL use instead of scale_num/scale_den.
     """
     if x_t_int16.ndim != 1:
         raise ValueError("x_t_int16 must be 1D")
@@ -43,4 +46,6 @@ def decode_step_reference(
         use_approx_softmax=True,
     )
     out_int32 = np.round(out).astype(np.int32)
+    if requant is not None:
+        return requantize_fixed_point_int16(out_int32, *requant).reshape(-1)
     return requantize_to_int16(out_int32, scale_num=scale_num, scale_den=scale_den).reshape(-1)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import math
+
 import numpy as np
 
 
@@ -51,5 +53,80 @@ def requantize_to_int16(
     return clamp_int16(shifted)
 
 
+def requantize_fixed_point_int16(
+    x_int32: np.ndarray, multiplier: int, shift: int, rounding: str = "half_up"
+) -> np.ndarray:
+    """
+    Hardware requantization reference:
+    y = sat16(round(x * multiplier / 2**shift))
+    Evaluated with Python integers, so there is no overflow or float rounding.
+    """
+    if shift <= 0:
+        raise ValueError("shift must be positive")
+    half = 1 << (shift - 1)
+
+    def one(v: int) -> int:
+        q, r = divmod(int(v) * multiplier, 1 << shift)
+        if rounding == "half_up":
+            q += int(r >= half)
+        elif rounding == "half_even":
+            q += int(r > half or (r == half and q % 2 == 1))
+        elif rounding != "floor":
+            raise ValueError(f"unsupported rounding: {rounding}")
+        return q
+
+    flat = [one(v) for v in np.asarray(x_int32).reshape(-1)]
+    return clamp_int16(np.array(flat, dtype=np.int64).reshape(np.shape(x_int32)))
+
+
 def relu_int16(x_int16: np.ndarray) -> np.ndarray:
     return np.maximum(x_int16, 0).astype(np.int16)
+
+
+def layer_norm_fixed_int16(x_int16: np.ndarray, frac_bits: int, rsqrt_bits: int = 30) -> np.ndarray:
+    """
+    Integer LayerNorm reference (no affine), per row with Python integers:
+    xc = D*x - sum(x); var = sum(xc^2) // D; var is shifted by an even amount
+    into [2**(rsqrt_bits-3), 2**(rsqrt_bits-1)) and inv = isqrt(2**(2*rsqrt_bits) // var);
+    y = sat16(round(xc * inv / 2**(rsqrt_bits + shift/2 - frac_bits))).
+    """
+    rows = np.asarray(x_int16).reshape(-1, np.shape(x_int16)[-1])
+    out = []
+    for row in rows:
+        xs = [int(v) for v in row]
+        d = len(xs)
+        total = sum(xs)
+        xc = [v * d - total for v in xs]
+        var = max(sum(c * c for c in xc) // d, 1)
+        shift = var.bit_length() - (rsqrt_bits - 1)
+        shift += shift & 1
+        var_n = var >> shift if shift >= 0 else var << -shift
+        inv = math.isqrt((1 << (2 * rsqrt_bits)) // var_n)
+        t = rsqrt_bits + shift // 2 - frac_bits
+        out.append([(c * inv + (1 << (t - 1))) >> t for c in xc])
+    return clamp_int16(np.array(out, dtype=np.int64).reshape(np.shape(x_int16)))
+
+
+def gelu_lut_int16(x_int16: np.ndarray, frac_bits: int, lut_range: int = 4, step_bits: int = 3) -> np.ndarray:
+    """
+    Piecewise-linear GELU reference on Q(frac_bits) int16, the integer
+    analogue of exp_approx_piecewise: breakpoints every 2**-step_bits on
+    [-lut_range, lut_range], identity above the range.
+    """
+    size = 2 * lut_range * (1 << step_bits) + 1
+    xs = [-lut_range + i / (1 << step_bits) for i in range(size)]
+    table = [round(v * 0.5 * (1.0 + math.erf(v / math.sqrt(2.0))) * (1 << frac_bits)) for v in xs]
+    s = frac_bits - step_bits
+    lo = lut_range << frac_bits
+
+    def one(v: int) -> int:
+        if v > lo:
+            return v
+        u = min(max(v, -lo), lo) + lo
+        idx = u >> s
+        frac = u & ((1 << s) - 1)
+        nxt = table[min(idx + 1, size - 1)]
+        return table[idx] + (((nxt - table[idx]) * frac + ((1 << s) >> 1)) >> s)
+
+    flat = [one(int(v)) for v in np.asarray(x_int16).reshape(-1)]
+    return clamp_int16(np.array(flat, dtype=np.int64).reshape(np.shape(x_int16)))
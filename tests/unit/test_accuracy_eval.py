@@ -34,3 +34,4 @@ def test_accuracy_eval_script_and_thresholds():
     assert data["attention_mae"] < 0.20
     assert data["attention_max_abs"] < 1.00
     assert data["quant_gemm_rel_l2"] < 0.20
+    assert data["kv_int16_attention_rel_mae"] < data["kv_int8_attention_rel_mae"] < 0.05
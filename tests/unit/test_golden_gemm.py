@@ -7,6 +7,7 @@ from tests.golden.golden_ops import (
     clamp_int8,
     clamp_int16,
     gemm_int8w_int16a_acc32,
+    requantize_fixed_point_int16,
     requantize_to_int16,
 )
 
@@ -50,3 +51,12 @@ def test_requantize_to_int16_range():
     assert y.dtype == np.int16
     assert np.max(y) <= 32767
     assert np.min(y) >= -32768
+
+
+def test_requantize_fixed_point_roundings():
+    # multiplier / 2**shift = 1/4: 6/4 = 1.5, 10/4 = 2.5, -6/4 = -1.5
+    x = np.array([6, 10, -6, 5], dtype=np.int32)
+    np.testing.assert_array_equal(requantize_fixed_point_int16(x, 1, 2, "half_up"), [2, 3, -1, 1])
+    np.testing.assert_array_equal(requantize_fixed_point_int16(x, 1, 2, "half_even"), [2, 2, -2, 1])
+    np.testing.assert_array_equal(requantize_fixed_point_int16(x, 1, 2, "floor"), [1, 2, -2, 1])
+    assert requantize_fixed_point_int16(np.array([2**31 - 1]), 1 << 30, 31)[0] == 32767
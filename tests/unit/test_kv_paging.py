@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.kv_paging import BlockAllocator, PagedKVCache
+from runtime.kv_swap import KvSwapSpace
+from runtime.np_kernels import KVCache
+
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_block_allocator_exhaust_and_reclaim():
+    alloc = BlockAllocator(2)
+    a = alloc.alloc()
+    b = alloc.alloc()
+    assert (a, b) == (0, 1)
+    with pytest.raises(ValueError):
+        alloc.alloc()
+    alloc.free([a, b])
+    assert alloc.num_free == 2
+
+
+def test_paged_cache_matches_contiguous_across_blocks():
+    rng = np.random.default_rng(0)
+    paged = PagedKVCache(num_blocks=8, block_size=3, dim=4)
+    ref = KVCache(max_seq=16, dim=4)
+    s0 = paged.add_seq()
+    s1 = paged.add_seq()
+
+    rows = rng.normal(size=(7, 4)).astype(np.float32)
+    paged.extend(s0, rows[:5], rows[:5] * 2)
+    ref.extend(rows[:5], rows[:5] * 2)
+    paged.extend(s1, rows[:2], rows[:2])
+    for r in rows[5:]:
+        paged.append(s0, r, r * 2)
+        ref.append(r, r * 2)
+
+    k, v = paged.get(s0)
+    np.testing.assert_array_equal(k, ref.get()[0])
+    np.testing.assert_array_equal(v, ref.get()[1])
+    assert len(paged.block_tables[s0]) == 3
+
+    k_b, _, lengths = paged.get_batch([s0, s1])
+    assert list(lengths) == [7, 2]
+    np.testing.assert_array_equal(k_b[0, :7], ref.get()[0])
+    np.testing.assert_array_equal(k_b[1, :2], rows[:2])
+
+    paged.free_seq(s0)
+    paged.free_seq(s1)
+    assert paged.blocks_used == 0
+    assert paged.peak_blocks_used == 4
+
+
+def test_runtime_paged_layout_matches_contiguous_and_reclaims():
+    pack_dir = ROOT / "sw/artifacts/tiny_decoder_packed"
+    rng = np.random.default_rng(1)
+    prompts = [rng.integers(-50, 50, size=(n, 16)).astype(np.int16) for n in (3, 9, 1)]
+
+    rt_c = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64))
+    rt_c.init()
+    rt_c.load(pack_dir)
+    rt_p = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, kv_layout="paged", kv_block_size=4, kv_num_blocks=16))
+    rt_p.init()
+    rt_p.load(pack_dir)
+
+    np.testing.assert_array_equal(rt_p.run_batch(prompts, gen_len=5), rt_c.run_batch(prompts, gen_len=5))
+    np.testing.assert_array_equal(rt_p.run(prompts[1], gen_len=5), rt_c.run(prompts[1], gen_len=5))
+    assert rt_p.kv_pool.blocks_used == 0
+    assert rt_p.poll()["kv_bytes_reserved"] < rt_c.poll()["kv_bytes_reserved"]
+
+
+@pytest.mark.parametrize("tier", ["host", "mmap"])
+def test_kv_swap_roundtrip_is_exact(tier: str, tmp_path: Path):
+    pool = PagedKVCache(num_blocks=4, block_size=2, dim=4)
+    swap = KvSwapSpace(pool, num_slots=3, tier=tier, path=tmp_path / "spill.bin" if tier == "mmap" else None)
+    rng = np.random.default_rng(3)
+    s0, s1 = pool.add_seq(), pool.add_seq()
+    rows = rng.normal(size=(5, 4)).astype(np.float32)
+    pool.extend(s0, rows, rows * 3)
+    pool.extend(s1, rows[:1], rows[:1])
+    k_ref, v_ref = (a.copy() for a in pool.get(s0))
+
+    handle = swap.swap_out(s0, {"prefilled": 5})
+    assert pool.blocks_used == 1 and swap.resident_bytes == 3 * pool.bytes_per_block
+    with pytest.raises(ValueError, match="exhausted"):
+        swap.swap_out(s1, {})
+    s2 = pool.add_seq()
+    pool.extend(s2, rows[:4], rows[:4])
+    with pytest.raises(ValueError, match="kv overflow"):
+        swap.swap_in(handle)
+    pool.free_seq(s2)
+
+    seq_id, entry = swap.swap_in(handle)
+    assert entry.state == {"prefilled": 5}
+    np.testing.assert_array_equal(pool.get(seq_id)[0], k_ref)
+    np.testing.assert_array_equal(pool.get(seq_id)[1], v_ref)
+    assert swap.swap_outs == swap.swap_ins == 1
+    assert swap.in_bytes == swap.out_bytes == swap.peak_bytes == 3 * pool.bytes_per_block
+    assert swap.resident_bytes == 0
@@ -17,3 +17,9 @@ def test_perf_model_reference_case():
     assert int(out.mac_per_token) == 44826624
     assert 100.0 < out.effective_tokens_per_sec < 250.0
     assert out.cycles_per_token_effective > 0
+
+
+def test_perf_model_counts_lm_head():
+    base = PerfInput(layers=6, hidden=768, seq=256, pe_mac_per_cycle=256, clock_mhz=200.0, efficiency=0.15)
+    head = PerfInput(**{**base.__dict__, "vocab": 50257})
+    assert int(estimate(head).mac_per_token) == 44826624 + 768 * 50257
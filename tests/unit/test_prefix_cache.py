@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.prefix_cache import PrefixCache
+
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_prefix_cache_longest_block_prefix_and_lru_eviction():
+    rng = np.random.default_rng(0)
+    tokens = rng.integers(-100, 100, size=(10, 4)).astype(np.int16)
+    k = rng.normal(size=(10, 4)).astype(np.float32)
+    block_bytes = 2 * 4 * 4 * 4
+
+    pc = PrefixCache(block_tokens=4, budget_bytes=2 * block_bytes)
+    pc.insert(tokens, k, k)
+    assert len(pc.entries) == 2
+
+    n, k_pre, _ = pc.lookup(tokens)
+    assert n == 8
+    np.testing.assert_array_equal(k_pre, k[:8])
+    assert (pc.hits, pc.misses) == (2, 0)
+
+    # Same second block after a different first block must not hit.
+    other = tokens.copy()
+    other[0, 0] += 1
+    assert pc.lookup(other)[0] == 0
+    assert pc.misses == 2
+
+    # A third distinct block evicts the least recently used one.
+    pc.insert(other[:4], k[:4], k[:4])
+    assert pc.evictions == 1
+    assert pc.bytes_used <= pc.budget_bytes
+
+
+def test_prefix_cache_evicts_chain_tails_before_their_prefix():
+    rng = np.random.default_rng(1)
+    a, b = (rng.integers(-100, 100, size=(12, 4)).astype(np.int16) for _ in range(2))
+    k = rng.normal(size=(12, 4)).astype(np.float32)
+    block_bytes = 2 * 4 * 4 * 4
+
+    pc = PrefixCache(block_tokens=4, budget_bytes=4 * block_bytes)
+    pc.insert(a, k, k)
+    assert pc.lookup(a)[0] == 12
+    # Two blocks of b need one of a's: the tail goes, so a's remaining blocks still chain from its head.
+    pc.insert(b[:8], k[:8], k[:8])
+    assert pc.evictions == 1
+    assert pc.lookup(a)[0] == 8 and pc.lookup(b)[0] == 8
+    assert len(pc.entries) == 4 and pc.bytes_used == 4 * block_bytes
+
+    # A chain longer than the budget keeps its head and never evicts its own blocks.
+    long = rng.integers(-100, 100, size=(24, 4)).astype(np.int16)
+    pc.insert(long, np.zeros((24, 4), np.float32), np.zeros((24, 4), np.float32))
+    assert pc.lookup(long)[0] == 16 and len(pc.entries) == 4
+
+
+def test_runtime_prefix_cache_reuses_shared_prompt_prefix():
+    pack_dir = ROOT / "sw/artifacts/tiny_decoder_packed"
+    rng = np.random.default_rng(1)
+    system = rng.integers(-50, 50, size=(32, 16)).astype(np.int16)
+    prompts = [np.concatenate([system, rng.integers(-50, 50, size=(n, 16)).astype(np.int16)]) for n in (3, 5)]
+
+    rt_ref = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64))
+    rt_ref.init()
+    rt_ref.load(pack_dir)
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, prefix_cache_bytes=1 << 20, prefix_block_tokens=8))
+    rt.init()
+    rt.load(pack_dir)
+
+    for prompt in prompts:
+        np.testing.assert_array_equal(rt.run(prompt, gen_len=4), rt_ref.run(prompt, gen_len=4))
+    st = rt.poll()
+    assert st["prefix_hits"] == 4
+    assert st["prefix_misses"] == 4
+    # Only the 5-row uncached suffix was prefilled on the second request (8 cycles/row at dim 16).
+    assert st["prefill_cycles"] == (5 - 1) * 8
+
+    out_b = rt.run_batch(prompts, gen_len=4)
+    np.testing.assert_array_equal(out_b, rt_ref.run_batch(prompts, gen_len=4))
+    assert rt.poll()["prefix_hits"] == 4 + 8
@@ -88,3 +88,69 @@ def test_runtime_rtl_backend_error_status():
     st = rt.poll()
     assert st["status"] == STATUS_ERROR
     assert int(st["last_error_code"]) != 0
+
+
+def test_runtime_ring_kv_generates_past_max_seq_at_constant_cost():
+    _prepare_assets()
+    pack_dir = ROOT / "sw" / "artifacts" / "tiny_decoder_packed"
+    prompt = np.ones((6, 16), dtype=np.int16)
+
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=16, backend="rtl", kv_window=8, kv_sink=2))
+    rt.init()
+    rt.load(pack_dir)
+    out = rt.run(prompt_tokens=prompt, gen_len=40)
+    short = rt.run(prompt_tokens=prompt, gen_len=20)
+    st = rt.poll()
+
+    assert out.shape == (40, 16)
+    assert st["status"] == STATUS_DONE
+    assert rt._rtl_backend.cache.length == 10
+    np.testing.assert_array_equal(short, out[:20])
+    # Once the window is full every token is charged the same effective seq_len.
+    rt.run(prompt_tokens=prompt, gen_len=30)
+    extra_cycles = int(rt.poll()["perf_cycles"]) - int(st["perf_cycles"])
+    assert extra_cycles == 10 * rt._rtl_backend._estimate_token_cycles(10)[0]
+
+
+def test_runtime_rtl_backend_tiled_attention_uses_cfg_k_tile():
+    _prepare_assets()
+    pack_dir = ROOT / "sw" / "artifacts" / "tiny_decoder_packed"
+    prompt = np.ones((6, 16), dtype=np.int16)
+
+    outs = {}
+    for backend in ("numpy", "rtl"):
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=128, backend=backend, attention_kernel="tiled", cfg_k_tile=4))
+        rt.init()
+        rt.load(pack_dir)
+        outs[backend] = rt.run(prompt_tokens=prompt, gen_len=4)
+        assert rt.poll()["attn_tiles_per_token"] == [0, 2, 2, 3]
+
+    np.testing.assert_array_equal(outs["numpy"], outs["rtl"])
+
+
+def test_rtl_cycle_model_charges_full_decoder_layers(tmp_path: Path):
+    raw, packed = tmp_path / "stack", tmp_path / "stack_packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--layers", "2", "--outdir", str(raw)], cwd=ROOT, check=True
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=128, backend="rtl"))
+    rt.init()
+    rt.load(packed)
+    backend = rt._rtl_backend
+    # QKV + out-proj + 4x FFN is the 12 * hidden^2 per layer that perf_model.py counts.
+    assert backend.num_layers == 2
+    assert backend._layer_gemm_macs() == 12 * 16 * 16
+
+    rt_legacy = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=128, backend="rtl"))
+    rt_legacy.init()
+    rt_legacy.load(ROOT / "sw" / "artifacts" / "tiny_decoder_packed")
+    assert rt_legacy._rtl_backend._layer_gemm_macs() == 3 * 16 * 16
+    prompt = np.ones((4, 16), dtype=np.int16)
+    rt.run(prompt_tokens=prompt, gen_len=4)
+    rt_legacy.run(prompt_tokens=prompt, gen_len=4)
+    assert rt.poll()["perf_cycles"] > rt_legacy.poll()["perf_cycles"]
+    # LayerNorm and GELU are charged as their own op costs; attention-only packs have neither.
+    assert rt.poll()["norm_cycles"] > 0 and rt.poll()["act_cycles"] > 0
+    assert rt_legacy.poll()["norm_cycles"] == rt_legacy.poll()["act_cycles"] == 0
@@ -2,12 +2,14 @@ from __future__ import annotations
 
 import json
 import subprocess
+import threading
 from pathlib import Path
 
 import numpy as np
+import pytest
 
 from runtime.api import BoardlessNpuRuntime, RuntimeConfig
-from runtime.register_map import STATUS_DONE
+from runtime.register_map import CTRL_RESET, REG_CONTROL, STATUS_BUSY, STATUS_DONE
 
 
 ROOT = Path(__file__).resolve().parents[2]
@@ -44,6 +46,295 @@ def test_runtime_direct_api_smoke():
     assert out.shape == (4, 16)
     assert status["status"] == STATUS_DONE
     assert status["done_tokens"] == 4
+    # Prompt rows are prefilled into the cache; the last one yields token 0.
+    assert rt.cache.length == 3 + 4 - 1
+    assert status["prefill_cycles"] > 0
+
+    # Repeated runs start a fresh sequence instead of growing the cache.
+    out_again = rt.run(prompt_tokens=prompt, gen_len=4)
+    np.testing.assert_array_equal(out, out_again)
+    assert rt.cache.length == 3 + 4 - 1
+
+
+
+@pytest.mark.parametrize("backend,attention_kernel", [("numpy", "full"), ("numpy", "tiled"), ("rtl", "tiled")])
+def test_run_stream_yields_tokens_live_and_matches_run(backend: str, attention_kernel: str):
+    cfg = RuntimeConfig(dim=16, max_seq=64, backend=backend, attention_kernel=attention_kernel, attention_tile=2)
+    rt = BoardlessNpuRuntime(cfg)
+    rt.init()
+    rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+    prompt = np.random.default_rng(6).integers(-50, 50, size=(5, 16)).astype(np.int16)
+    out = rt.run(prompt_tokens=prompt, gen_len=5)
+    final = rt.poll()
+
+    events = []
+    for event in rt.run_stream(prompt_tokens=prompt, gen_len=5):
+        # Registers are live while the generator is suspended.
+        assert rt.poll()["done_tokens"] == event.index + 1
+        events.append(event)
+    np.testing.assert_array_equal(np.stack([e.token for e in events]), out)
+    assert [e.perf["done_tokens"] for e in events] == [1, 2, 3, 4, 5]
+    assert all(a.timestamp <= b.timestamp for a, b in zip(events, events[1:]))
+    assert [e.perf["perf_cycles"] for e in events] == sorted({e.perf["perf_cycles"] for e in events})
+    assert rt.poll()["status"] == STATUS_DONE
+    for key in ("perf_cycles", "attn_tiles", "attn_tiles_per_token", "prefill_cycles"):
+        assert rt.poll()[key] == final[key]
+
+
+def test_runtime_run_batch_matches_single_runs():
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64))
+    rt.init()
+    rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+
+    rng = np.random.default_rng(0)
+    prompts = [rng.integers(-50, 50, size=(n, 16)).astype(np.int16) for n in (3, 5, 1)]
+    out = rt.run_batch(prompts, gen_len=4)
+    status = rt.poll()
+
+    assert out.shape == (3, 4, 16)
+    assert status["status"] == STATUS_DONE
+    assert status["batch_size"] == 3
+    assert status["done_tokens"] == 12
+    assert status["seq_done_tokens"] == [4, 4, 4]
+    assert list(rt.batch_cache.lengths) == [6, 8, 4]
+
+    for b, prompt in enumerate(prompts):
+        np.testing.assert_array_equal(out[b], rt.run(prompt_tokens=prompt, gen_len=4))
+
+
+def test_runtime_reduced_precision_kv_modes():
+    prompt = np.random.default_rng(1).integers(-50, 50, size=(6, 16)).astype(np.int16)
+    outs = {}
+    kv_bytes = {}
+    for kv_dtype in ("float32", "int16", "int8"):
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, kv_dtype=kv_dtype))
+        rt.init()
+        rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+        outs[kv_dtype] = rt.run(prompt_tokens=prompt, gen_len=4).astype(np.int32)
+        kv_bytes[kv_dtype] = rt.poll()["kv_bytes_reserved"]
+
+    assert kv_bytes["int8"] < kv_bytes["int16"] < kv_bytes["float32"]
+    scale = np.mean(np.abs(outs["float32"])) + 1.0
+    assert np.mean(np.abs(outs["int16"] - outs["float32"])) / scale < 0.01
+    assert np.mean(np.abs(outs["int8"] - outs["float32"])) / scale < 0.10
+
+
+def test_runtime_tiled_attention_matches_full_and_counts_tiles():
+    prompt = np.random.default_rng(2).integers(-50, 50, size=(5, 16)).astype(np.int16)
+    outs = {}
+    for kernel in ("full", "tiled"):
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, attention_kernel=kernel, attention_tile=4))
+        rt.init()
+        rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+        outs[kernel] = rt.run(prompt_tokens=prompt, gen_len=5).astype(np.int32)
+    status = rt.poll()
+
+    # Decode token i attends over 5 + i rows in tiles of 4.
+    assert status["attn_tiles_per_token"] == [0, 2, 2, 2, 3]
+    assert status["attn_tiles"] == 9
+    assert np.max(np.abs(outs["tiled"] - outs["full"])) <= 1
+
+
+@pytest.mark.parametrize("tile", [4, 16])
+def test_runtime_tiled_lut_attention_matches_full_lut(tile: int):
+    prompt = np.random.default_rng(0).integers(-50, 50, size=(40, 16)).astype(np.int16)
+    outs = {}
+    for kernel in ("full", "tiled"):
+        cfg = RuntimeConfig(dim=16, max_seq=128, attention_kernel=kernel, attention_tile=tile, softmax_mode="lut")
+        rt = BoardlessNpuRuntime(cfg)
+        rt.init()
+        rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+        outs[kernel] = rt.run(prompt_tokens=prompt, gen_len=32)
+    np.testing.assert_array_equal(outs["tiled"], outs["full"])
+
+
+def test_runtime_lut_softmax_mode_close_to_exact():
+    prompt = np.random.default_rng(3).integers(-50, 50, size=(6, 16)).astype(np.int16)
+    outs = {}
+    for backend in ("numpy", "rtl"):
+        for mode in ("exact", "lut"):
+            rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, backend=backend, softmax_mode=mode))
+            rt.init()
+            rt.load(ROOT / "sw/artifacts/tiny_decoder_packed")
+            outs[backend, mode] = rt.run(prompt_tokens=prompt, gen_len=4).astype(np.int32)
+
+    np.testing.assert_array_equal(outs["numpy", "lut"], outs["rtl", "lut"])
+    scale = np.mean(np.abs(outs["numpy", "exact"])) + 1.0
+    assert np.mean(np.abs(outs["numpy", "lut"] - outs["numpy", "exact"])) / scale < 0.05
+
+
+def _make_head_pack(tmp_path: Path, num_heads: int, num_kv_heads: int) -> Path:
+    raw, packed = tmp_path / f"h{num_heads}_kv{num_kv_heads}", tmp_path / f"h{num_heads}_kv{num_kv_heads}_packed"
+    subprocess.run(
+        [
+            "python",
+            "sw/create_tiny_decoder_assets.py",
+            "--outdir",
+            str(raw),
+            "--num-heads",
+            str(num_heads),
+            "--num-kv-heads",
+            str(num_kv_heads),
+        ],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    return packed
+
+
+def test_runtime_grouped_query_attention_shrinks_kv_and_matches_rtl(tmp_path: Path):
+    prompt = np.random.default_rng(4).integers(-50, 50, size=(5, 16)).astype(np.int16)
+    kv_bytes = {}
+    for kv_heads in (4, 2, 1):
+        pack = _make_head_pack(tmp_path, 4, kv_heads)
+        outs = {}
+        for backend in ("numpy", "rtl"):
+            rt = BoardlessNpuRuntime(
+                RuntimeConfig(dim=16, max_seq=64, backend=backend, num_heads=4, num_kv_heads=kv_heads)
+            )
+            rt.init()
+            rt.load(pack)
+            outs[backend] = rt.run(prompt_tokens=prompt, gen_len=4)
+            kv_bytes[backend, kv_heads] = rt.poll()["kv_bytes_reserved"]
+        np.testing.assert_array_equal(outs["numpy"], outs["rtl"])
+
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, num_heads=4, num_kv_heads=kv_heads))
+        rt.init()
+        rt.load(pack)
+        np.testing.assert_array_equal(rt.run_batch([prompt], gen_len=4)[0], outs["numpy"])
+
+    # KV width is D * num_kv_heads / num_heads.
+    assert kv_bytes["numpy", 4] == 2 * kv_bytes["numpy", 2] == 4 * kv_bytes["numpy", 1]
+    assert kv_bytes["rtl", 1] == kv_bytes["numpy", 1]
+
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, num_heads=2))
+    rt.init()
+    with pytest.raises(ValueError):
+        rt.load(pack)
+
+
+def test_rtl_cycle_model_counts_head_waves(tmp_path: Path):
+    pack = _make_head_pack(tmp_path, 4, 4)
+    prompt = np.ones((8, 16), dtype=np.int16)
+    cycles = {}
+    for lanes in (4, 2, 1):
+        rt = BoardlessNpuRuntime(
+            RuntimeConfig(dim=16, max_seq=64, backend="rtl", num_heads=4, attn_head_lanes=lanes)
+        )
+        rt.init()
+        rt.load(pack)
+        rt.run(prompt_tokens=prompt, gen_len=4)
+        cycles[lanes] = rt.poll()["perf_cycles"]
+    assert cycles[4] < cycles[2] < cycles[1]
+
+
+def test_runtime_stacked_decoder_layers_numpy_matches_rtl(tmp_path: Path):
+    raw, packed = tmp_path / "stack", tmp_path / "stack_packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--layers", "3", "--num-heads", "2", "--outdir", str(raw)],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    prompt = np.random.default_rng(5).integers(-200, 200, size=(5, 16)).astype(np.int16)
+
+    outs, status = {}, {}
+    for backend in ("numpy", "rtl"):
+        rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, backend=backend, num_heads=2))
+        rt.init()
+        rt.load(packed)
+        outs[backend] = rt.run(prompt_tokens=prompt, gen_len=4)
+        status[backend] = rt.poll()
+    np.testing.assert_array_equal(outs["numpy"], outs["rtl"])
+    assert status["numpy"]["done_tokens"] == 4
+    # One KV cache per layer.
+    single = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64)).poll()["kv_bytes_reserved"]
+    assert status["numpy"]["kv_bytes_reserved"] == 3 * single
+
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, num_heads=2))
+    rt.init()
+    rt.load(packed)
+    with pytest.raises(ValueError):
+        rt.run_batch([prompt], gen_len=2)
+
+
+def _make_vocab_pack(tmp_path: Path) -> Path:
+    raw, packed = tmp_path / "vocab", tmp_path / "vocab_packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--layers", "2", "--vocab-size", "300", "--outdir", str(raw)],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    return packed
+
+
+def test_runtime_vocab_pack_samples_token_ids_on_both_backends(tmp_path: Path):
+    packed = _make_vocab_pack(tmp_path)
+    prompt = np.array([3, 141, 59, 26], dtype=np.int64)
+
+    for sampling in ({}, {"temperature": 0.9, "top_k": 40, "top_p": 0.9, "seed": 7}):
+        outs, status = {}, {}
+        for backend in ("numpy", "rtl"):
+            rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, backend=backend, lm_head_chunk=64, **sampling))
+            rt.init()
+            rt.load(packed)
+            outs[backend] = rt.run(prompt_tokens=prompt, gen_len=6)
+            status[backend] = rt.poll()
+            rt.init()
+            assert [e.token for e in rt.run_stream(prompt, 6)] == outs[backend].tolist()
+        np.testing.assert_array_equal(outs["numpy"], outs["rtl"])
+        assert outs["numpy"].shape == (6,) and 0 <= outs["numpy"].min() and outs["numpy"].max() < 300
+    assert status["numpy"]["vocab_size"] == status["rtl"]["vocab_size"] == 300
+    assert status["numpy"]["lm_head_bytes_reserved"] == 64 * 16 * 8
+    assert status["rtl"]["lm_head_cycles"] > 0
+
+    with pytest.raises(ValueError):
+        BoardlessNpuRuntime(RuntimeConfig(top_p=0.0))
+
+
+@pytest.mark.parametrize("backend", ["numpy", "rtl"])
+def test_submit_runs_in_background_and_reset_cancels(tmp_path: Path, backend: str):
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64, backend=backend))
+    rt.init()
+    rt.load(_make_vocab_pack(tmp_path))
+    prompt = np.array([5, 6, 7], dtype=np.int64)
+    expected = rt.run(prompt, gen_len=8)
+
+    rt.submit(prompt, gen_len=8)
+    np.testing.assert_array_equal(rt.wait(timeout=30), expected)
+    assert rt.poll()["status"] == STATUS_DONE
+
+    # Hold the worker inside token 3's sampler to observe it mid-run.
+    plan = rt._rtl_backend.plan if backend == "rtl" else rt.plan
+    greedy, reached, gate, calls = plan.sampler, threading.Event(), threading.Event(), []
+
+    def held(logits: np.ndarray) -> np.ndarray:
+        calls.append(1)
+        if len(calls) == 4:
+            reached.set()
+            gate.wait()
+        return greedy(logits)
+
+    plan.sampler = held
+    rt.submit(prompt, gen_len=8)
+    assert reached.wait(timeout=30)
+    status = rt.poll()
+    assert status["status"] == STATUS_BUSY and status["done_tokens"] == 3
+    with pytest.raises(ValueError):
+        rt.run(prompt, gen_len=2)
+
+    threading.Timer(0.05, gate.set).start()
+    rt.mmio_write(REG_CONTROL, CTRL_RESET)
+    # The in-flight token finishes, then the job stops without decoding the rest.
+    assert len(calls) == 4
+    assert rt.poll()["status"] == 0 and rt.poll()["done_tokens"] == 0
+    assert rt.wait() is None
+
+    plan.sampler = greedy
+    rt.submit(prompt, gen_len=8)
+    np.testing.assert_array_equal(rt.wait(timeout=30), expected)
 
 
 def test_sw_hw_flow_script_generates_json():
@@ -0,0 +1,473 @@
+from __future__ import annotations
+
+import json
+import math
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.np_kernels import (
+    DecodeWorkspace,
+    KVCache,
+    attention_decode_batch,
+    attention_decode_step,
+    attention_heads,
+    attention_decode_tiled,
+    attention_prefill,
+    exp_lut,
+    blas_gemm_is_exact,
+    fuse_qkv_weights,
+    gemm_int8w_int16a_acc32_f64,
+    gelu_int16,
+    gemm_int16a_packed_acc32,
+    isqrt_int64,
+    kv_width,
+    layer_norm_int16,
+    lm_head_logits,
+    pack_gemm_weight,
+    prefill_into_cache,
+    quantize_multiplier,
+    requant_params_from_meta,
+    requantize_fixed_int16,
+    sample_tokens,
+    softmax,
+    split_qkv,
+)
+from tests.golden.golden_attention import exp_approx_piecewise, scaled_dot_product_attention, softmax_approx
+from tests.golden.golden_kvcache import KVCache as GoldenKVCache
+from tests.golden.golden_ops import (
+    clamp_int8,
+    clamp_int16,
+    gelu_lut_int16,
+    gemm_int8w_int16a_acc32,
+    layer_norm_fixed_int16,
+    requantize_fixed_point_int16,
+)
+
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.mark.parametrize("m,dim,seed", [(1, 16, 0), (1, 64, 1), (4, 32, 2)])
+def test_fused_qkv_matches_separate_golden_gemms(m: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    x = clamp_int16(rng.integers(-32768, 32768, size=(m, dim)))
+    w_q, w_k, w_v = (clamp_int8(rng.integers(-128, 128, size=(dim, dim))) for _ in range(3))
+
+    w_qkv = pack_gemm_weight(fuse_qkv_weights(w_q, w_k, w_v))
+    q, k, v = split_qkv(gemm_int16a_packed_acc32(x, w_qkv), dim)
+
+    np.testing.assert_array_equal(q, gemm_int8w_int16a_acc32(x, w_q))
+    np.testing.assert_array_equal(k, gemm_int8w_int16a_acc32(x, w_k))
+    np.testing.assert_array_equal(v, gemm_int8w_int16a_acc32(x, w_v))
+
+
+def test_fuse_qkv_shape_mismatch_raises():
+    with pytest.raises(ValueError):
+        fuse_qkv_weights(np.zeros((4, 4), np.int8), np.zeros((4, 4), np.int8), np.zeros((4, 8), np.int8))
+
+
+@pytest.mark.parametrize("m,k,n,seed", [(1, 768, 2304, 0), (8, 64, 32, 1), (3, 17, 5, 2)])
+def test_blas_gemm_bit_exact_vs_golden(m: int, k: int, n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    a = clamp_int16(rng.integers(-32768, 32768, size=(m, k)))
+    b = clamp_int8(rng.integers(-128, 128, size=(k, n)))
+    b_packed = pack_gemm_weight(b)
+
+    assert b_packed.dtype == np.float64
+    np.testing.assert_array_equal(gemm_int16a_packed_acc32(a, b_packed), gemm_int8w_int16a_acc32(a, b))
+
+
+def test_blas_gemm_matches_int32_wraparound():
+    # 1024 * (-32768 * -128) = 2**32 overflows int32 accumulation; both paths must wrap alike.
+    a = np.full((2, 1024), -32768, dtype=np.int16)
+    b = np.full((1024, 3), -128, dtype=np.int8)
+    b[0, 1] = 127
+    out = gemm_int8w_int16a_acc32_f64(a, b.astype(np.float64))
+    np.testing.assert_array_equal(out, gemm_int8w_int16a_acc32(a, b))
+
+
+def test_packed_gemm_falls_back_when_bound_exceeded():
+    assert blas_gemm_is_exact(768, 2**15, 2**7)
+    assert not blas_gemm_is_exact(4, 2**31, 2**22)
+
+    a = np.array([[2**31 - 1, -(2**31)]], dtype=np.int32)
+    b = np.array([[2**21], [3]], dtype=np.int32)
+    out = gemm_int16a_packed_acc32(a, b.astype(np.float64))
+    np.testing.assert_array_equal(out, a @ b)
+
+
+def test_pack_gemm_weight_kernel_selection():
+    b = np.ones((8, 4), dtype=np.int8)
+    assert pack_gemm_weight(b, kernel="int32").dtype == np.int32
+    assert pack_gemm_weight(b, kernel="f64").dtype == np.float64
+    with pytest.raises(ValueError):
+        pack_gemm_weight(b, kernel="bogus")
+
+
+def test_attention_prefill_matches_golden_causal_attention():
+    rng = np.random.default_rng(3)
+    q, k, v = (rng.normal(size=(6, 8)).astype(np.float32) for _ in range(3))
+    expected, _ = scaled_dot_product_attention(q, k, v, causal=True, use_approx_softmax=False)
+    np.testing.assert_allclose(attention_prefill(q, k, v, start_pos=0), expected, rtol=1e-5, atol=1e-5)
+    # A later chunk only sees its own causal prefix.
+    np.testing.assert_allclose(attention_prefill(q[4:], k, v, start_pos=4), expected[4:], rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 256])
+def test_prefill_into_cache_matches_token_by_token_decode(chunk: int):
+    rng = np.random.default_rng(4)
+    dim = 16
+    x = clamp_int16(rng.integers(-64, 64, size=(7, dim)))
+    w_qkv = pack_gemm_weight(clamp_int8(rng.integers(-128, 128, size=(dim, 3 * dim))))
+
+    ref_cache = KVCache(max_seq=16, dim=dim)
+    for row in x:
+        q, k, v = split_qkv(gemm_int16a_packed_acc32(row.reshape(1, -1), w_qkv).reshape(-1).astype(np.float32), dim)
+        ref_cache.append(k, v)
+        y_ref = attention_decode_step(q, *ref_cache.get())
+
+    cache = KVCache(max_seq=16, dim=dim)
+    y = prefill_into_cache(x, w_qkv, cache, chunk=chunk)
+
+    assert cache.length == 7
+    np.testing.assert_array_equal(cache.get()[0], ref_cache.get()[0])
+    np.testing.assert_allclose(y, y_ref, rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize("num_heads,num_kv_heads", [(4, 4), (4, 2), (4, 1)])
+def test_multi_head_decode_matches_per_head_golden(num_heads: int, num_kv_heads: int):
+    rng = np.random.default_rng(5)
+    dim, t = 16, 6
+    hd = dim // num_heads
+    kv_dim = kv_width(dim, num_heads, num_kv_heads)
+    q = rng.normal(size=dim).astype(np.float32)
+    k_all, v_all = (rng.normal(size=(t, kv_dim)).astype(np.float32) for _ in range(2))
+
+    # Golden layout [T, Hkv, hd]; query head h reads KV head h // group.
+    golden = GoldenKVCache(max_seq=t, num_heads=num_kv_heads, head_dim=hd)
+    for row in range(t):
+        golden.append(k_all[row].reshape(num_kv_heads, hd), v_all[row].reshape(num_kv_heads, hd))
+    k_h, v_h = golden.get_prefix()
+    group = num_heads // num_kv_heads
+    expected = np.concatenate(
+        [
+            scaled_dot_product_attention(
+                q[h * hd : (h + 1) * hd].reshape(1, hd),
+                k_h[:, h // group],
+                v_h[:, h // group],
+                causal=False,
+                use_approx_softmax=False,
+            )[0][0]
+            for h in range(num_heads)
+        ]
+    )
+
+    y = attention_decode_step(q, k_all, v_all, num_heads=num_heads, num_kv_heads=num_kv_heads)
+    np.testing.assert_allclose(y, expected, rtol=1e-5, atol=1e-5)
+    # The causal prefill kernel agrees with decode on the last row.
+    y_pre = attention_prefill(
+        q.reshape(1, dim),
+        k_all,
+        v_all,
+        start_pos=t - 1,
+        num_heads=num_heads,
+        num_kv_heads=num_kv_heads,
+    )
+    np.testing.assert_allclose(y_pre[0], expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("softmax_lut", [False, True])
+def test_batched_gqa_decode_matches_per_sequence_heads(softmax_lut: bool):
+    rng = np.random.default_rng(15)
+    dim, num_heads, num_kv_heads, t = 32, 4, 2, 11
+    lengths = np.array([11, 3, 7])
+    q = rng.normal(size=(3, dim)).astype(np.float32)
+    kv_dim = kv_width(dim, num_heads, num_kv_heads)
+    k_all, v_all = (rng.normal(size=(3, t, kv_dim)).astype(np.float32) for _ in range(2))
+    # Rows past a sequence's length are stale and must not leak in.
+    k_all[1, 3:] = v_all[1, 3:] = 1e3
+
+    heads = (num_heads, num_kv_heads)
+    y = attention_decode_batch(q, k_all, v_all, lengths, softmax_lut, *heads)
+    for b, n in enumerate(lengths):
+        ref = attention_heads(q[b : b + 1], k_all[b, :n], v_all[b, :n], *heads, softmax_lut=softmax_lut)
+        np.testing.assert_allclose(y[b], ref[0], rtol=1e-5, atol=1e-6)
+
+
+def test_kv_width_rejects_uneven_head_split():
+    assert kv_width(16, 4, 1) == 4
+    with pytest.raises(ValueError):
+        kv_width(16, 3, 1)
+    with pytest.raises(ValueError):
+        kv_width(16, 4, 3)
+
+
+def test_kvcache_extend_overflow_raises():
+    cache = KVCache(max_seq=4, dim=2)
+    cache.extend(np.zeros((3, 2), np.float32), np.zeros((3, 2), np.float32))
+    with pytest.raises(ValueError):
+        cache.extend(np.zeros((2, 2), np.float32), np.zeros((2, 2), np.float32))
+
+
+@pytest.mark.parametrize("kv_dtype,rtol", [("int16", 1e-3), ("int8", 5e-2)])
+def test_quantized_kv_decode_attention_close_to_float(kv_dtype: str, rtol: float):
+    rng = np.random.default_rng(5)
+    q = rng.normal(size=(32,)).astype(np.float32)
+    k = rng.normal(size=(100, 32)).astype(np.float32)
+    v = rng.normal(scale=100.0, size=(100, 32)).astype(np.float32)
+    ref_cache = KVCache(max_seq=128, dim=32)
+    cache = KVCache(max_seq=128, dim=32, kv_dtype=kv_dtype)
+    ref_cache.extend(k, v)
+    cache.extend(k[:60], v[:60])
+    for i in range(60, 100):
+        cache.append(k[i], v[i])
+
+    assert cache.get()[0].dtype == np.dtype(kv_dtype)
+    assert cache.nbytes < ref_cache.nbytes
+    ref = attention_decode_step(q, *ref_cache.get())
+    out = attention_decode_step(q, *cache.get(), *cache.get_scales(), tile=16)
+    assert np.mean(np.abs(out - ref)) < rtol * np.mean(np.abs(v))
+
+
+def test_quantized_kv_decode_attention_has_no_full_prefix_float_copy():
+    rng = np.random.default_rng(6)
+    t, d = 4096, 64
+    cache = KVCache(max_seq=t, dim=d, kv_dtype="int16")
+    cache.extend(rng.normal(size=(t, d)).astype(np.float32), rng.normal(size=(t, d)).astype(np.float32))
+    q = rng.normal(size=(d,)).astype(np.float32)
+
+    tracemalloc.start()
+    attention_decode_step(q, *cache.get(), *cache.get_scales())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < (t * d * 4) // 8
+
+
+def _window_reference(x: np.ndarray, w_qkv: np.ndarray, dim: int, window: int, sink: int) -> list[np.ndarray]:
+    # Full-length cache with an explicit sliding-window mask per position.
+    k_rows, v_rows, outs = [], [], []
+    for p, row in enumerate(x):
+        q, k, v = split_qkv(gemm_int16a_packed_acc32(row.reshape(1, -1), w_qkv).reshape(-1).astype(np.float32), dim)
+        k_rows.append(k)
+        v_rows.append(v)
+        keep = [i for i in range(p + 1) if i < sink or i > p - window]
+        outs.append(attention_decode_step(q, np.stack(k_rows)[keep], np.stack(v_rows)[keep]))
+    return outs
+
+
+@pytest.mark.parametrize("window,sink,chunk", [(4, 0, 3), (4, 2, 5), (3, 1, 1)])
+def test_ring_kv_cache_matches_sliding_window_reference(window: int, sink: int, chunk: int):
+    rng = np.random.default_rng(7)
+    dim = 8
+    x = clamp_int16(rng.integers(-64, 64, size=(13, dim)))
+    w_qkv = pack_gemm_weight(clamp_int8(rng.integers(-128, 128, size=(dim, 3 * dim))))
+    ref = _window_reference(x, w_qkv, dim, window, sink)
+
+    cache = KVCache(max_seq=4, dim=dim, window=window, sink=sink)
+    y = prefill_into_cache(x[:9], w_qkv, cache, chunk=chunk)
+    np.testing.assert_allclose(y, ref[8], rtol=1e-4, atol=1e-2)
+    for p in range(9, 13):
+        q, k, v = split_qkv(gemm_int16a_packed_acc32(x[p : p + 1], w_qkv).reshape(-1).astype(np.float32), dim)
+        cache.append(k, v)
+        np.testing.assert_allclose(attention_decode_step(q, *cache.get()), ref[p], rtol=1e-4, atol=1e-2)
+
+    assert cache.length == sink + window
+    assert sorted(cache.pos[: cache.length]) == list(range(sink)) + list(range(13 - window, 13))
+
+
+@pytest.mark.parametrize("kv_dtype,t,tile", [("float32", 100, 16), ("float32", 5, 16), ("int8", 97, 8)])
+def test_tiled_online_softmax_matches_full_attention(kv_dtype: str, t: int, tile: int):
+    rng = np.random.default_rng(8)
+    cache = KVCache(max_seq=128, dim=16, kv_dtype=kv_dtype)
+    cache.extend(rng.normal(size=(t, 16)).astype(np.float32), rng.normal(size=(t, 16)).astype(np.float32))
+    q = rng.normal(scale=4.0, size=(16,)).astype(np.float32)
+
+    out, n_tiles = attention_decode_tiled(q, *cache.get(), tile, *cache.get_scales())
+    assert n_tiles == -(-t // tile)
+    np.testing.assert_allclose(out, attention_decode_step(q, *cache.get(), *cache.get_scales()), rtol=1e-5, atol=1e-5)
+
+
+def test_tiled_attention_scratch_bounded_by_tile():
+    rng = np.random.default_rng(9)
+    t, d = 4096, 64
+    k = rng.normal(size=(t, d)).astype(np.float32)
+    v = rng.normal(size=(t, d)).astype(np.float32)
+    q = rng.normal(size=(d,)).astype(np.float32)
+
+    tracemalloc.start()
+    attention_decode_tiled(q, k, v, 64)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < (t * d * 4) // 8
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_lut_softmax_bit_exact_with_golden_approx(dtype: type):
+    rng = np.random.default_rng(10)
+    x = (rng.normal(scale=4.0, size=(8, 37))).astype(dtype)
+    x[0, :3] = [0.0, -8.0, -100.0]
+    np.testing.assert_array_equal(exp_lut(x), exp_approx_piecewise(x))
+    np.testing.assert_array_equal(softmax(x, axis=-1, lut=True), softmax_approx(x, axis=-1))
+
+
+def test_lut_softmax_masked_entries_get_zero_probability():
+    x = np.array([[1.0, -np.inf, 0.5]], dtype=np.float32)
+    prob = softmax(x, axis=-1, lut=True)
+    assert prob[0, 1] == 0.0
+    np.testing.assert_allclose(prob[0, [0, 2]], softmax_approx(x[:, [0, 2]], axis=-1)[0])
+
+
+def test_lut_decode_attention_matches_golden_approx():
+    rng = np.random.default_rng(11)
+    q = rng.normal(size=(1, 16)).astype(np.float32)
+    k, v = (rng.normal(size=(9, 16)).astype(np.float32) for _ in range(2))
+    expected, _ = scaled_dot_product_attention(q, k, v, causal=False, use_approx_softmax=True)
+    out = attention_decode_step(q[0], k, v, softmax_lut=True)
+    np.testing.assert_allclose(out, expected[0], rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("kernel", ["f64", "int32"])
+def test_workspace_decode_step_is_exact_and_allocation_free(kernel: str):
+    rng = np.random.default_rng(12)
+    dim, steps = 512, 24
+    w_int8 = clamp_int8(rng.integers(-128, 128, size=(dim, 3 * dim)))
+    w_int8[:, 0] = -128
+    w_qkv = pack_gemm_weight(w_int8, kernel=kernel)
+    ws = DecodeWorkspace(dim, max_seq=steps, acc_dtype=w_qkv.dtype)
+    cache = KVCache(max_seq=steps, dim=dim)
+    out = np.zeros((steps, dim), dtype=np.int16)
+    out[0] = -32768
+
+    def step(i: int) -> None:
+        q, k, v = ws.project_qkv(out[i - 1], w_qkv)
+        cache.append(k, v)
+        y = attention_decode_step(q, *cache.get(), out=ws.y, score_out=ws.score)
+        np.rint(y, out=ws.y)
+        requantize_fixed_int16(ws.y, 1 << 30, 50, out=out[i], tmp=ws.y_i64)
+
+    # Column 0 sums to 512 * 2**22 = 2**31, so the int32 wrap must match the golden.
+    expected = gemm_int8w_int16a_acc32(out[:1], w_int8)[0].astype(np.float32)
+    np.testing.assert_array_equal(np.concatenate(ws.project_qkv(out[0], w_qkv)), expected)
+    step(1)
+    tracemalloc.start()
+    for i in range(2, steps):
+        step(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The allocating path creates several [3D] rows per token.
+    assert peak < 3 * dim * 4
+
+
+@pytest.mark.parametrize("attention_kernel", ["full", "tiled"])
+def test_runtime_decode_loop_peak_does_not_grow_with_gen_len(tmp_path: Path, attention_kernel: str):
+    dim, raw, packed = 256, tmp_path / "raw", tmp_path / "packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--dim", str(dim), "--outdir", str(raw)], cwd=ROOT, check=True
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=dim, max_seq=160, attention_kernel=attention_kernel))
+    rt.init()
+    rt.load(packed)
+    # One prompt row keeps prefill's transient peak below the decode loop's.
+    prompt = np.random.default_rng(14).integers(-60, 60, size=(1, dim)).astype(np.int16)
+    rt.run(prompt, 128)
+    peaks = {}
+    for n in (8, 128):
+        tracemalloc.start()
+        rt.run(prompt, n)
+        peaks[n] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # Only the results grow: the [n, D] int16 output plus a row view and counters per token.
+    assert peaks[128] - peaks[8] < 120 * (dim * 2 + 256)
+
+
+@pytest.mark.parametrize("rounding", ["half_up", "half_even", "floor"])
+@pytest.mark.parametrize("scale", [0.012196987319806118, 1.0 / 1024.0, 3.7])
+def test_fixed_point_requant_bit_exact_with_golden(rounding: str, scale: float):
+    rng = np.random.default_rng(13)
+    x = rng.integers(-(2**31), 2**31, size=4096).astype(np.int32)
+    x[:4] = [-(2**31), 2**31 - 1, 0, -1]
+    multiplier, shift = quantize_multiplier(scale)
+    assert abs(multiplier * 2.0**-shift - scale) <= scale * 2.0**-30
+
+    out = requantize_fixed_int16(x, multiplier, shift, rounding)
+    np.testing.assert_array_equal(out, requantize_fixed_point_int16(x, multiplier, shift, rounding))
+    # Float rint input (the attention output path) gives the same words.
+    np.testing.assert_array_equal(requantize_fixed_int16(x.astype(np.float64), multiplier, shift, rounding), out)
+
+
+def test_packed_requant_fields_round_trip_through_runtime_quantizer(tmp_path: Path):
+    raw, packed = tmp_path / "raw", tmp_path / "packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--layers", "2", "--vocab-size", "40", "--outdir", str(raw)],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    meta = json.loads((packed / "meta.json").read_text(encoding="utf-8"))
+    stages = [stage for layer in meta["layers"] for stage in layer.values()] + [meta["embed"]]
+    for stage in stages:
+        assert requant_params_from_meta(stage) == (*quantize_multiplier(stage["dequant_scale"]), "half_up")
+
+
+@pytest.mark.parametrize("dim,scale", [(16, 1), (16, 300), (64, 32767), (768, 40)])
+def test_integer_layer_norm_bit_exact_with_golden_and_close_to_float(dim: int, scale: float):
+    rng = np.random.default_rng(dim + int(scale))
+    x = clamp_int16(np.rint(rng.normal(size=(6, dim)) * scale))
+    y = layer_norm_int16(x, 6)
+    np.testing.assert_array_equal(y, layer_norm_fixed_int16(x, 6))
+
+    xf = x.astype(np.float64)
+    xc = xf - xf.mean(axis=-1, keepdims=True)
+    ref = xc / np.sqrt(np.mean(xc * xc, axis=-1, keepdims=True)) * 64
+    assert np.max(np.abs(y - ref)) <= 1.0
+    # Constant rows normalize to zero instead of dividing by zero.
+    np.testing.assert_array_equal(layer_norm_int16(np.full((1, dim), 7, np.int16), 6), 0)
+
+
+@pytest.mark.parametrize("frac_bits", [3, 6, 10])
+def test_gelu_lut_bit_exact_with_golden_and_close_to_erf(frac_bits: int):
+    x = np.arange(-32768, 32768, 7).astype(np.int16)
+    y = gelu_int16(x, frac_bits)
+    np.testing.assert_array_equal(y, gelu_lut_int16(x, frac_bits))
+
+    v = x / float(1 << frac_bits)
+    ref = v * 0.5 * (1.0 + np.vectorize(math.erf)(v / math.sqrt(2.0))) * (1 << frac_bits)
+    # Chord error of a 1/8-step table, in output LSBs.
+    assert np.max(np.abs(y - ref)) <= max(1.5, 0.01 * (1 << frac_bits))
+
+
+def test_isqrt_int64_matches_math_isqrt():
+    n = np.concatenate([[0, 1, 2, 3, 4], np.random.default_rng(9).integers(0, 2**62, size=2000)])
+    np.testing.assert_array_equal(isqrt_int64(n), [math.isqrt(int(v)) for v in n])
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64, 4096])
+def test_chunked_lm_head_matches_int_golden(chunk: int):
+    rng = np.random.default_rng(chunk)
+    table = clamp_int8(rng.integers(-128, 128, size=(100, 16)))
+    h = clamp_int16(rng.integers(-32768, 32768, size=(3, 16)))
+    logits = lm_head_logits(h, table, chunk)
+    np.testing.assert_array_equal(logits, gemm_int8w_int16a_acc32(h, table.T).astype(np.float64))
+
+
+def test_sampling_greedy_top_k_top_p_and_seeded():
+    logits = np.log(np.array([[0.05, 0.5, 0.3, 0.15], [0.4, 0.1, 0.1, 0.4]]))
+    np.testing.assert_array_equal(sample_tokens(logits), [1, 0])
+    np.testing.assert_array_equal(sample_tokens(logits, np.random.default_rng(0), 1.0, top_k=1), [1, 0])
+
+    draws = np.stack([sample_tokens(logits, np.random.default_rng(s), 1.0, top_k=2) for s in range(200)])
+    assert set(draws[:, 0]) == {1, 2} and set(draws[:, 1]) == {0, 3}
+    # Nucleus 0.75 over row 0 keeps {0.5, 0.3}; row 1 keeps {0.4, 0.4}.
+    draws = np.stack([sample_tokens(logits, np.random.default_rng(s), 1.0, top_p=0.75) for s in range(200)])
+    assert set(draws[:, 0]) == {1, 2} and set(draws[:, 1]) == {0, 3}
+
+    a = sample_tokens(logits, np.random.default_rng(5), 0.8, top_k=3, top_p=0.9)
+    np.testing.assert_array_equal(a, sample_tokens(logits, np.random.default_rng(5), 0.8, top_k=3, top_p=0.9))
+    with pytest.raises(ValueError):
+        sample_tokens(logits, None, 1.0)
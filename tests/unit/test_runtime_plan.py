@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import numpy as np
+
+from runtime.model import DecoderLayer
+from runtime.np_kernels import (
+    KVCache,
+    attention_decode_step,
+    gemm_int16a_packed_acc32,
+    pack_gemm_weight,
+    quantize_multiplier,
+    split_qkv,
+)
+from runtime.plan import DecodePlan, StackPlan
+from tests.golden.golden_ops import (
+    clamp_int8,
+    clamp_int16,
+    gelu_lut_int16,
+    gemm_int8w_int16a_acc32,
+    layer_norm_fixed_int16,
+    requantize_fixed_point_int16,
+)
+
+
+def _reference_decode(
+    x: np.ndarray, w_qkv: np.ndarray, dim: int, requant: tuple[int, int, str], gen_len: int
+) -> np.ndarray:
+    # Straight-line decode loop as the runtime ran it before plans existed.
+    cache = KVCache(max_seq=64, dim=dim)
+    y = np.zeros(dim, dtype=np.float32)
+    for row in x:
+        q, k, v = split_qkv(gemm_int16a_packed_acc32(row.reshape(1, -1), w_qkv)[0].astype(np.float32), dim)
+        cache.append(k, v)
+        y = attention_decode_step(q, *cache.get())
+    outputs = []
+    for i in range(gen_len):
+        if i > 0:
+            q, k, v = split_qkv(gemm_int16a_packed_acc32(x_t.reshape(1, -1), w_qkv)[0].astype(np.float32), dim)
+            cache.append(k, v)
+            y = attention_decode_step(q, *cache.get())
+        x_t = requantize_fixed_point_int16(np.round(y).astype(np.int32), *requant)
+        outputs.append(x_t)
+    return np.stack(outputs)
+
+
+def test_decode_plan_matches_straight_line_loop():
+    rng = np.random.default_rng(0)
+    dim = 16
+    x = clamp_int16(rng.integers(-64, 64, size=(5, dim)))
+    w_qkv = pack_gemm_weight(clamp_int8(rng.integers(-128, 128, size=(dim, 3 * dim))))
+    requant = (*quantize_multiplier(1.0 / 1000.0), "half_up")
+
+    plan = DecodePlan(w_qkv, requant, dim, kv_capacity=64)
+    cache = KVCache(max_seq=64, dim=dim)
+    out = plan.execute(cache, plan.prefill(x, cache), gen_len=6)
+
+    np.testing.assert_array_equal(out, _reference_decode(x, w_qkv, dim, requant, 6))
+    assert plan.kv_len.tolist() == [5, 6, 7, 8, 9, 10]
+    assert plan.tiles.tolist() == [0] * 6
+
+
+def test_decode_plan_binds_attention_variant_at_compile_time():
+    w_qkv = pack_gemm_weight(np.ones((8, 24), dtype=np.int8))
+    assert DecodePlan(w_qkv, (1, 1, "floor"), 8, 16).steps[2].__name__ == "_attend_full"
+    assert DecodePlan(w_qkv, (1, 1, "floor"), 8, 16, kv_quantized=True).steps[2].__name__ == "_attend_generic"
+    assert DecodePlan(w_qkv, (1, 1, "floor"), 8, 16, attention_kernel="tiled").steps[2].__name__ == "_attend_tiled"
+
+
+def _random_layer(rng: np.random.Generator, dim: int, ffn: int) -> tuple[dict, DecoderLayer]:
+    w = {
+        "qkv": clamp_int8(rng.integers(-128, 128, size=(dim, 3 * dim))),
+        "o": clamp_int8(rng.integers(-128, 128, size=(dim, dim))),
+        "up": clamp_int8(rng.integers(-128, 128, size=(dim, ffn))),
+        "down": clamp_int8(rng.integers(-128, 128, size=(ffn, dim))),
+    }
+    rq = {
+        name: (*quantize_multiplier(scale), "half_up")
+        for name, scale in (("attn", 1e-3), ("o", 1 / 1024), ("up", 1 / 1024), ("down", 1 / 2048))
+    }
+    layer = DecoderLayer(
+        pack_gemm_weight(w["qkv"]),
+        rq["attn"],
+        pack_gemm_weight(w["o"]),
+        rq["o"],
+        pack_gemm_weight(w["up"]),
+        rq["up"],
+        pack_gemm_weight(w["down"]),
+        rq["down"],
+    )
+    return {**w, **{f"rq_{k}": v for k, v in rq.items()}}, layer
+
+
+def _reference_stack(x: np.ndarray, refs: list[dict], dim: int, frac_bits: int, gen_len: int) -> np.ndarray:
+    # Token-at-a-time pre-norm stack on the golden GEMM, requant, LayerNorm and GELU ops.
+    caches = [KVCache(max_seq=64, dim=dim) for _ in refs]
+
+    def requant(acc: np.ndarray, params: tuple[int, int, str]) -> np.ndarray:
+        return requantize_fixed_point_int16(np.asarray(acc, dtype=np.int32), *params)
+
+    def token(row: np.ndarray) -> np.ndarray:
+        h = row.reshape(1, -1)
+        for w, cache in zip(refs, caches):
+            a = layer_norm_fixed_int16(h, frac_bits)
+            q, k, v = split_qkv(gemm_int8w_int16a_acc32(a, w["qkv"])[0].astype(np.float32), dim)
+            cache.append(k, v)
+            ctx = requant(np.round(attention_decode_step(q, *cache.get())), w["rq_attn"]).reshape(1, -1)
+            h = clamp_int16(h.astype(np.int32) + requant(gemm_int8w_int16a_acc32(ctx, w["o"]), w["rq_o"]))
+            up = requant(gemm_int8w_int16a_acc32(layer_norm_fixed_int16(h, frac_bits), w["up"]), w["rq_up"])
+            down = requant(gemm_int8w_int16a_acc32(gelu_lut_int16(up, frac_bits), w["down"]), w["rq_down"])
+            h = clamp_int16(h.astype(np.int32) + down)
+        return layer_norm_fixed_int16(h, frac_bits)[0]
+
+    for row in x:
+        x_t = token(row)
+    outputs = [x_t]
+    for _ in range(gen_len - 1):
+        outputs.append(token(outputs[-1]))
+    return np.stack(outputs)
+
+
+def test_stack_plan_matches_token_by_token_reference():
+    rng = np.random.default_rng(1)
+    dim, ffn, frac_bits = 16, 64, 6
+    refs, layers = zip(*(_random_layer(rng, dim, ffn) for _ in range(3)))
+    x = clamp_int16(rng.integers(-200, 200, size=(7, dim)))
+    ref = _reference_stack(x, list(refs), dim, frac_bits, 5)
+
+    # A chunk smaller than the prompt (7 = 3 + 3 + 1 rows) runs every layer per chunk.
+    for chunk in (256, 3):
+        plan = StackPlan(list(layers), dim, 64, act_frac_bits=frac_bits, prefill_chunk=chunk)
+        caches = [KVCache(max_seq=64, dim=dim) for _ in layers]
+        out = plan.execute(caches, plan.prefill(x, caches), gen_len=5)
+
+        np.testing.assert_array_equal(out, ref)
+        assert [c.length for c in caches] == [11, 11, 11]
+        assert plan.kv_len.tolist() == [7, 8, 9, 10, 11]
@@ -14,5 +14,8 @@ def test_scaleup_proxy_flow():
     assert p.exists()
     d = json.loads(p.read_text(encoding="utf-8"))
     assert d["dim"] == 768
-    assert d["output_shape"] == [2, 768]
+    assert d["num_layers"] == 6
+    assert d["vocab_size"] == 50257
+    assert d["output_shape"] == [2]
+    assert d["status"]["vocab_size"] == 50257
     assert d["status"]["done_tokens"] == 2
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.register_map import STATUS_DONE
+from runtime.scheduler import ContinuousBatchScheduler, SloClass, SloScheduler
+
+
+ROOT = Path(__file__).resolve().parents[2]
+PACK = ROOT / "sw/artifacts/tiny_decoder_packed"
+
+
+def _runtime(**kw) -> BoardlessNpuRuntime:
+    cfg = {"dim": 16, "max_seq": 64, "kv_layout": "paged", "kv_block_size": 4, "prefill_chunk": 4, **kw}
+    rt = BoardlessNpuRuntime(RuntimeConfig(**cfg))
+    rt.init()
+    rt.load(PACK)
+    return rt
+
+
+def _requests(n: int) -> list[tuple[np.ndarray, int]]:
+    rng = np.random.default_rng(11)
+    return [
+        (rng.integers(-50, 50, size=(int(rng.integers(1, 14)), 16)).astype(np.int16), int(rng.integers(1, 9)))
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize("max_batch,kv_num_blocks", [(3, 0), (8, 0), (8, 6)])
+def test_continuous_batching_matches_sequential_runs(max_batch: int, kv_num_blocks: int):
+    reqs = _requests(10)
+    ref = _runtime()
+    expected = [ref.run(prompt, gen_len) for prompt, gen_len in reqs]
+
+    rt = _runtime(kv_num_blocks=kv_num_blocks)
+    sched = ContinuousBatchScheduler(rt, max_batch=max_batch)
+    for i, (prompt, gen_len) in enumerate(reqs):
+        sched.submit(prompt, gen_len, arrival=0.002 * (i % 3))
+    out = sched.run()
+
+    for rid, tokens in enumerate(expected):
+        np.testing.assert_array_equal(out[rid], tokens)
+    assert max(sched.batch_sizes) <= max_batch
+    if not kv_num_blocks:
+        # Sequences join and leave the running batch between iterations.
+        assert len(set(sched.batch_sizes)) > 1
+    assert rt.kv_pool.blocks_used == 0 and not rt.kv_pool.block_tables
+    status = rt.poll()
+    assert status["status"] == STATUS_DONE
+    assert status["done_tokens"] == sum(g for _, g in reqs)
+
+    report = sched.report()
+    assert report["requests"] == 10 and report["tokens"] == sum(g for _, g in reqs)
+    assert report["throughput_tps"] > 0
+    assert 0 <= report["ttft_ms"]["p50"] <= report["ttft_ms"]["p99"]
+    assert 0 <= report["itl_ms"]["p50"] <= report["itl_ms"]["p99"]
+
+
+def test_step_api_cycle_counters_match_run():
+    prompt, gen_len = np.random.default_rng(4).integers(-50, 50, size=(10, 16)).astype(np.int16), 5
+    ref = _runtime()
+    ref.run(prompt, gen_len)
+    # prefill_chunk=4 feeds the prompt in three pieces; only the last row's cost moves to token 0.
+    rt = _runtime()
+    sched = ContinuousBatchScheduler(rt, max_batch=2)
+    sched.submit(prompt, gen_len)
+    sched.run()
+    for key in ("prefill_cycles", "perf_cycles", "done_tokens", "perf_tokens"):
+        assert rt.poll()[key] == ref.poll()[key], key
+
+
+def test_scheduler_rejects_unservable_setups():
+    with pytest.raises(ValueError):
+        ContinuousBatchScheduler(BoardlessNpuRuntime(RuntimeConfig(dim=16, max_seq=64)))
+    sched = ContinuousBatchScheduler(_runtime(kv_num_blocks=2))
+    with pytest.raises(ValueError):
+        sched.submit(np.ones((8, 16), dtype=np.int16), gen_len=4)
+
+
+def test_slo_scheduler_orders_by_priority_and_deadline():
+    reqs = _requests(6)
+    ref = _runtime()
+    expected = [ref.run(prompt, gen_len) for prompt, gen_len in reqs]
+    classes = [SloClass("chat", priority=0, deadline=10.0), SloClass("batch", priority=1)]
+
+    sched = SloScheduler(_runtime(), classes, max_batch=2, decode_limit=1)
+    for i, (prompt, gen_len) in enumerate(reqs):
+        # Batch jobs are submitted first, with no class: they fall to the lowest-priority one.
+        if i < 3:
+            sched.submit(prompt, gen_len)
+        else:
+            # Chat jobs carry descending deadlines.
+            sched.submit(prompt, gen_len, slo="chat", deadline=6.0 - i)
+    out = sched.run()
+
+    for rid, tokens in enumerate(expected):
+        np.testing.assert_array_equal(out[rid], tokens)
+    finish = {rid: r.finish_time for rid, r in sched.finished.items()}
+    # Chat before batch, and earliest deadline first inside the chat class.
+    assert finish[5] < finish[4] < finish[3] < min(finish[0], finish[1], finish[2])
+    assert max(sched.batch_sizes) == 1
+
+    report = sched.report()
+    assert report["deadline_misses"] == 0
+    assert report["classes"]["chat"]["requests"] == report["classes"]["batch"]["requests"] == 3
+    assert set(report["classes"]["batch"]["e2e_ms"]) == {"p50", "p90", "p99"}
+
+
+def test_slo_scheduler_rate_limits_class_and_counts_misses():
+    prompt = np.ones((3, 16), dtype=np.int16)
+    sched = SloScheduler(_runtime(), [SloClass("bulk", token_rate=200.0, burst=1, deadline=0.0)], max_batch=4)
+    for _ in range(2):
+        sched.submit(prompt, gen_len=10, slo="bulk")
+    t0 = time.perf_counter()
+    sched.run()
+    # 20 tokens from a 1-token bucket at 200 tokens/s.
+    assert time.perf_counter() - t0 >= 19 / 200.0
+    report = sched.report()
+    assert report["deadline_misses"] == 2 and report["classes"]["bulk"]["deadline_miss_rate"] == 1.0
+    with pytest.raises(ValueError):
+        sched.submit(prompt, gen_len=2, slo="chat")
+    with pytest.raises(ValueError, match="SLO class"):
+        SloScheduler(_runtime(), [])
+
+
+class _BucketProbe(SloScheduler):
+    low = 0.0
+
+    def step(self) -> None:
+        super().step()
+        self.low = min(self.low, *self.buckets.values())
+
+
+def test_slo_token_bucket_never_overdrawn_with_burst_below_gen_len():
+    reqs = [(np.full((1, 16), 7 * i, dtype=np.int16), 6) for i in range(4)]
+    ref = _runtime()
+    expected = [ref.run(prompt, gen_len) for prompt, gen_len in reqs]
+    # All four prefills finish in the first iteration; only one of them may take the single burst token.
+    sched = _BucketProbe(_runtime(), [SloClass("bulk", token_rate=400.0, burst=1)], max_batch=4)
+    for prompt, gen_len in reqs:
+        sched.submit(prompt, gen_len, slo="bulk")
+    t0 = time.perf_counter()
+    out = sched.run()
+    assert time.perf_counter() - t0 >= 23 / 400.0
+    assert sched.low >= 0.0
+    for i, exp in enumerate(expected):
+        np.testing.assert_array_equal(out[i], exp)
+
+
+@pytest.mark.parametrize("tier", ["host", "mmap"])
+def test_slo_scheduler_preempts_to_kv_swap_and_resumes_exactly(tier: str, tmp_path: Path):
+    rng = np.random.default_rng(5)
+    batch = [rng.integers(-50, 50, size=(8, 16)).astype(np.int16) for _ in range(2)]
+    chat = rng.integers(-50, 50, size=(4, 16)).astype(np.int16)
+    ref = _runtime()
+    expected = [ref.run(p, 8) for p in batch] + [ref.run(chat, 4)]
+
+    # Two batch requests reserve all 8 blocks, so the chat request only gets in by preempting one of them.
+    rt = _runtime(kv_num_blocks=8, kv_swap=tier, kv_swap_path=str(tmp_path / "spill.bin") if tier == "mmap" else "")
+    sched = SloScheduler(rt, [SloClass("chat", priority=0), SloClass("batch", priority=1)], max_batch=4)
+    for p in batch:
+        sched.submit(p, 8, slo="batch")
+    sched.start()
+    for _ in range(4):
+        sched.step()
+    sched.submit(chat, 4, slo="chat")
+    out = sched.run()
+
+    for rid, tokens in enumerate(expected):
+        np.testing.assert_array_equal(out[rid], tokens)
+    assert sched.report()["preemptions"] == 1
+    assert sched.finished[2].finish_time < sched.finished[1].finish_time
+    status = rt.poll()
+    assert status["swap_outs"] == status["swap_ins"] == 1
+    assert status["swap_in_bytes"] == status["swap_out_bytes"] > 0
+    assert status["swap_peak_bytes"] == status["swap_out_bytes"] and status["swap_out_ms"] > 0
+    assert rt.kv_swap.resident_bytes == 0 and status["status"] == STATUS_DONE
+    # Registers are device-wide: swapping a sequence in must not roll back tokens the others produced meanwhile.
+    assert status["done_tokens"] == sum(len(tokens) for tokens in expected)
+    with pytest.raises(ValueError):
+        _runtime(kv_swap="disk")
+
+
+def test_continuous_batching_script_generates_json():
+    subprocess.run(
+        ["python", "scripts/run_continuous_batching.py", "--requests", "12", "--max-batch", "4"], cwd=ROOT, check=True
+    )
+    d = json.loads((ROOT / "results" / "continuous_batching_result.json").read_text(encoding="utf-8"))
+    assert d["outputs_match"] is True
+    for mode in ("sequential", "continuous"):
+        assert d[mode]["requests"] == 12
+        assert set(d[mode]["ttft_ms"]) == {"p50", "p90", "p99"}
+    assert d["throughput_speedup"] > 0
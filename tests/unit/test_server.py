@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.server import InferenceServer, ServerConfig, stream_generate
+
+
+ROOT = Path(__file__).resolve().parents[2]
+PACK = ROOT / "sw/artifacts/tiny_decoder_packed"
+
+
+def _runtime() -> BoardlessNpuRuntime:
+    rt = BoardlessNpuRuntime(
+        RuntimeConfig(dim=16, max_seq=64, kv_layout="paged", kv_block_size=4, kv_num_blocks=64, prefill_chunk=4)
+    )
+    rt.init()
+    rt.load(PACK)
+    return rt
+
+
+def _prompts(n: int) -> list[np.ndarray]:
+    rng = np.random.default_rng(21)
+    return [rng.integers(-50, 50, size=(int(rng.integers(2, 10)), 16)).astype(np.int16) for _ in range(n)]
+
+
+def test_server_micro_batches_and_holds_slow_streams():
+    prompts = _prompts(4)
+    ref = _runtime()
+    expected = [ref.run(p, 12) for p in prompts]
+
+    async def scenario():
+        async with InferenceServer(_runtime(), ServerConfig(window_ms=20.0, max_batch=4, stream_buffer=2)) as srv:
+            streams = [srv.generate(p, 12) for p in prompts]
+            # All four arrive inside one window; then the first client stalls while the others drain.
+            first = await asyncio.gather(*[anext(s) for s in streams])
+            fast = [[e, *rest] for e, rest in zip(first[1:], await asyncio.gather(*map(_collect, streams[1:])))]
+            slow = first[:1]
+            held = srv.sched.finished.keys() == {1, 2, 3} and len(srv.sched.running[0].tokens) <= 3
+            slow += await _collect(streams[0])
+            return srv.report(), slow, fast, held
+
+    report, slow, fast, held = asyncio.run(scenario())
+    assert held
+    for tokens, events in zip(expected, [slow, *fast]):
+        np.testing.assert_array_equal(np.stack([e.token for e in events]), tokens)
+        assert [e.index for e in events] == list(range(12))
+    # The window put all four requests into the first step.
+    assert report["mean_decode_batch"] > 1 and report["requests"] == 4
+
+
+async def _collect(events) -> list:
+    return [e async for e in events]
+
+
+@pytest.mark.parametrize("transport", ["tcp", "unix"])
+def test_server_streams_ndjson_over_http(transport: str, tmp_path: Path):
+    prompt = _prompts(1)[0]
+    expected = _runtime().run(prompt, 5)
+    cfg = ServerConfig(path=str(tmp_path / "npu.sock") if transport == "unix" else "")
+
+    async def scenario():
+        async with InferenceServer(_runtime(), cfg) as srv:
+            where = {"path": srv.address} if transport == "unix" else dict(zip(("host", "port"), srv.address))
+            lines = [line async for line in stream_generate(prompt, 5, **where)]
+            with pytest.raises(ValueError, match="prompt shape"):
+                async for _ in stream_generate(np.ones((3, 8)), 5, **where):
+                    pass
+            if transport == "unix":
+                reader, writer = await asyncio.open_unix_connection(srv.address)
+            else:
+                reader, writer = await asyncio.open_connection(*srv.address)
+            writer.write(b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            health = json.loads((await reader.read()).split(b"\r\n\r\n", 1)[1])
+            writer.close()
+            return lines, health
+
+    lines, health = asyncio.run(scenario())
+    np.testing.assert_array_equal(np.array([line["token"] for line in lines], dtype=np.int16), expected)
+    assert health["active"] == 0 and health["done_tokens"] == 5
+
+
+def test_server_reports_runtime_failures_before_and_after_headers():
+    prompt = _prompts(1)[0]
+    expected = _runtime().run(prompt, 4)
+
+    async def scenario():
+        unhandled = []
+        asyncio.get_running_loop().set_exception_handler(lambda _, ctx: unhandled.append(ctx))
+        rt = _runtime()
+        decode, prefill = rt.decode_batch, rt.prefill_seq
+        calls = []
+
+        def flaky_decode(*args):
+            calls.append(1)
+            if len(calls) > 2:
+                raise RuntimeError("decode fault")
+            return decode(*args)
+
+        def failing_prefill(*args):
+            raise RuntimeError("prefill fault")
+
+        async with InferenceServer(rt, ServerConfig()) as srv:
+            where = dict(zip(("host", "port"), srv.address))
+            # Token 0 and two decoded tokens are streamed under a 200, then the error closes the body.
+            lines = []
+            rt.decode_batch = flaky_decode
+            with pytest.raises(RuntimeError, match="decode fault"):
+                async for line in stream_generate(prompt, 8, **where):
+                    lines.append(line)
+            # Nothing was sent yet, so the failure becomes a 500.
+            rt.decode_batch, rt.prefill_seq = decode, failing_prefill
+            with pytest.raises(RuntimeError, match="prefill fault"):
+                async for _ in stream_generate(prompt, 4, **where):
+                    pass
+            rt.prefill_seq = prefill
+            ok = [line async for line in stream_generate(prompt, 4, **where)]
+        return lines, ok, unhandled
+
+    lines, ok, unhandled = asyncio.run(scenario())
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    np.testing.assert_array_equal(np.array([line["token"] for line in ok], dtype=np.int16), expected)
+    assert unhandled == []
+
+
+def test_server_loadtest_script_generates_json():
+    subprocess.run(
+        ["python", "scripts/run_server_loadtest.py", "--requests", "8", "--concurrency", "4"], cwd=ROOT, check=True
+    )
+    d = json.loads((ROOT / "results" / "server_loadtest_result.json").read_text(encoding="utf-8"))
+    assert d["outputs_match"] is True
+    assert d["client"]["requests"] == 8 and d["client"]["throughput_tps"] > 0
+    assert set(d["client"]["ttft_ms"]) == {"p50", "p90", "p99"}
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import runtime.tensor_parallel as tp_mod
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.np_kernels import gemm_int16a_packed_acc32
+from runtime.tensor_parallel import TensorParallelGroup
+
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _stacked_pack(tmp_path: Path, shards: int, *extra: str) -> Path:
+    raw, packed = tmp_path / "stack", tmp_path / f"stack_tp{shards}"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--dim", "32", "--layers", "2", *extra, "--outdir", str(raw)],
+        cwd=ROOT,
+        check=True,
+    )
+    cmd = ["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)]
+    subprocess.run([*cmd, "--tp-shards", str(shards)] if shards else cmd, cwd=ROOT, check=True)
+    return packed
+
+
+def _run(pack: Path, prompt: np.ndarray, gen_len: int, tp: bool) -> tuple[np.ndarray, BoardlessNpuRuntime]:
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=32, max_seq=64, seed=5, temperature=0.9, tensor_parallel=tp))
+    rt.init()
+    rt.load(pack)
+    return rt.run(prompt, gen_len), rt
+
+
+@pytest.mark.parametrize("shards,vocab", [(2, False), (3, True)])
+def test_tensor_parallel_matches_single_process(tmp_path: Path, shards: int, vocab: bool):
+    pack = _stacked_pack(tmp_path, shards, *(["--vocab-size", "50"] if vocab else []))
+    layout = json.loads((pack / "meta.json").read_text(encoding="utf-8"))["tensor_parallel"]
+    assert layout["shards"] == shards and layout["qkv_cols"][-1] == 96 and layout["ffn_cols"][-1] == 128
+    rng = np.random.default_rng(2)
+    prompt = rng.integers(0, 50, size=7) if vocab else rng.integers(-60, 60, size=(7, 32)).astype(np.int16)
+
+    ref, _ = _run(pack, prompt, 6, tp=False)
+    out, rt = _run(pack, prompt, 6, tp=True)
+    try:
+        np.testing.assert_array_equal(out, ref)
+        assert rt.poll()["tp_shards"] == shards
+        report = rt.tp.report()
+        # Prefill plus five decode tokens through both layers.
+        assert all(report["ops"][op]["calls"] == 2 * 6 for op in ("out", "ffn"))
+        assert len(report["shard_compute_sec"]) == shards and min(report["shard_compute_sec"]) > 0
+        assert 0.0 <= report["exchange_fraction"] < 1.0
+    finally:
+        rt.tp.close()
+
+
+def test_tensor_parallel_windowed_prompt_longer_than_max_seq(tmp_path: Path):
+    pack = _stacked_pack(tmp_path, 2)
+    prompt = np.random.default_rng(8).integers(-60, 60, size=(40, 32)).astype(np.int16)
+    outs = []
+    for tp, chunk in ((False, 256), (True, 256), (True, 16)):
+        cfg = RuntimeConfig(dim=32, max_seq=16, kv_window=12, prefill_chunk=chunk, tensor_parallel=tp)
+        rt = BoardlessNpuRuntime(cfg)
+        rt.init()
+        rt.load(pack)
+        outs.append(rt.run(prompt, 5))
+        if tp:
+            assert rt.tp.max_rows == chunk
+            rt.tp.close()
+    for out in outs[1:]:
+        np.testing.assert_array_equal(out, outs[0])
+
+
+def test_tensor_parallel_buffers_aligned_and_pipes_recover_after_shard_error(tmp_path: Path):
+    pack = _stacked_pack(tmp_path, 3)
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=32, max_seq=64, tensor_parallel=True))
+    rt.init()
+    rt.load(pack)
+    group = rt.tp
+    try:
+        assert all(buf.ctypes.data % 64 == 0 for buf in (group.x, group.qkv_buf, group.partial))
+        a = np.random.default_rng(9).integers(-60, 60, size=(5, 32)).astype(np.int16)
+        # Every shard fails on a missing layer; all three replies are drained, so the next op is in step.
+        with pytest.raises(RuntimeError, match="shard failed"):
+            group.qkv(99, a)
+        np.testing.assert_array_equal(group.qkv(0, a), gemm_int16a_packed_acc32(a, rt.model.layers[0].w_qkv))
+    finally:
+        group.close()
+
+
+def test_tensor_parallel_failed_start_leaks_no_segments_or_shards(tmp_path: Path, monkeypatch):
+    shm_dir = Path("/dev/shm")
+    if not shm_dir.is_dir():
+        pytest.skip("needs Linux shared memory")
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=32, max_seq=64))
+    rt.init()
+    rt.load(_stacked_pack(tmp_path, 2))
+    before = set(os.listdir(shm_dir))
+
+    def start_one_then_fail(procs: list) -> None:
+        procs[0].start()
+        raise OSError("spawn failed")
+
+    monkeypatch.setattr(tp_mod, "start_single_threaded", start_one_then_fail)
+    with pytest.raises(OSError, match="spawn failed"):
+        TensorParallelGroup(rt.model, rt.kv_dim, 16)
+    assert mp.active_children() == []
+    assert set(os.listdir(shm_dir)) <= before
+
+
+def test_tensor_parallel_requires_a_sharded_stacked_pack(tmp_path: Path):
+    rt = BoardlessNpuRuntime(RuntimeConfig(dim=32, max_seq=64, tensor_parallel=True))
+    rt.init()
+    with pytest.raises(ValueError, match="tensor_parallel layout"):
+        rt.load(_stacked_pack(tmp_path, 0))
+    with pytest.raises(subprocess.CalledProcessError):
+        subprocess.run(
+            ["python", "sw/pack_weights.py", "--outdir", str(tmp_path / "legacy"), "--tp-shards", "2"],
+            cwd=ROOT,
+            check=True,
+        )
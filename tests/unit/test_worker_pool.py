@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from runtime.api import BoardlessNpuRuntime, RuntimeConfig
+from runtime.shared_pack import SharedPack
+from runtime.worker_pool import RuntimeWorkerPool
+
+
+ROOT = Path(__file__).resolve().parents[2]
+PACK = ROOT / "sw/artifacts/tiny_decoder_packed"
+
+
+def test_shared_pack_views_are_read_only_and_run_identically(tmp_path: Path):
+    raw, packed = tmp_path / "stack", tmp_path / "stack_packed"
+    subprocess.run(
+        ["python", "sw/create_tiny_decoder_assets.py", "--layers", "2", "--vocab-size", "40", "--outdir", str(raw)],
+        cwd=ROOT,
+        check=True,
+    )
+    subprocess.run(["python", "sw/pack_weights.py", "--indir", str(raw), "--outdir", str(packed)], cwd=ROOT, check=True)
+    cfg = RuntimeConfig(dim=16, max_seq=64, seed=3, temperature=0.8)
+    ref = BoardlessNpuRuntime(cfg)
+    ref.init()
+    ref.load(packed)
+
+    pack = SharedPack(ref.model)
+    try:
+        shm, model = SharedPack.attach(pack.spec)
+        rt = BoardlessNpuRuntime(cfg)
+        rt.init()
+        rt.load_model(model)
+        prompt = np.array([1, 5, 9], dtype=np.int64)
+        np.testing.assert_array_equal(rt.run(prompt, 6), ref.run(prompt, 6))
+        w = model.layers[1].w_up
+        assert not w.flags.writeable
+        assert np.shares_memory(w, np.ndarray(pack.nbytes, np.uint8, buffer=shm.buf))
+        # The tied table is stored once for both the weights dict and the embedding.
+        assert model.embedding.table is model.weights["embedding"]
+        del rt, model, w
+        shm.close()
+    finally:
+        pack.close()
+
+
+def test_worker_pool_matches_single_runtime_and_balances():
+    cfg = RuntimeConfig(dim=16, max_seq=64)
+    rng = np.random.default_rng(4)
+    reqs = [
+        (rng.integers(-50, 50, size=(int(rng.integers(1, 12)), 16)).astype(np.int16), int(rng.integers(1, 12)))
+        for _ in range(12)
+    ]
+    ref = BoardlessNpuRuntime(cfg)
+    ref.init()
+    ref.load(PACK)
+
+    with RuntimeWorkerPool(cfg, PACK, num_workers=2, pin_cpus=True) as pool:
+        outs = pool.map(reqs)
+        for (prompt, gen_len), out in zip(reqs, outs):
+            np.testing.assert_array_equal(out, ref.run(prompt, gen_len))
+        assert sum(pool.jobs_done) == 12 and min(pool.jobs_done) > 0
+        assert pool.pending_work == [0, 0]
+        with pytest.raises(RuntimeError, match="prompt shape"):
+            pool.result(pool.submit(np.ones((2, 8), dtype=np.int16), 3))
+        mem = pool.memory()
+        assert len(mem) == 2 and all(m.get("pss_kb", 1) > 0 for m in mem)
+
+
+def test_worker_pool_startup_failure_stops_workers_and_unlinks_weights():
+    shm_dir = Path("/dev/shm")
+    if not shm_dir.is_dir() or not hasattr(os, "sched_setaffinity"):
+        pytest.skip("needs Linux shared memory and CPU affinity")
+    before = set(os.listdir(shm_dir))
+    # Worker 1 cannot pin to a CPU that does not exist and exits; worker 0 starts normally.
+    with pytest.raises(RuntimeError, match="exited"):
+        RuntimeWorkerPool(RuntimeConfig(dim=16, max_seq=64), PACK, num_workers=2, pin_cpus=[0, 1 << 20])
+    assert mp.active_children() == []
+    assert set(os.listdir(shm_dir)) <= before
+
+
+def test_worker_pool_script_generates_json():
+    subprocess.run(
+        ["python", "scripts/run_worker_pool.py", "--pack", str(PACK), "--workers", "1,2", "--requests", "8"],
+        cwd=ROOT,
+        check=True,
+    )
+    d = json.loads((ROOT / "results" / "worker_pool_result.json").read_text(encoding="utf-8"))
+    assert [r["workers"] for r in d["runs"]] == [1, 2]
+    assert all(r["outputs_match"] and r["throughput_tps"] > 0 for r in d["runs"])
+    assert d["runs"][1]["shared_weight_bytes"] == d["runs"][0]["shared_weight_bytes"] > 0